@@ -0,0 +1,103 @@
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.utils import timezone
+
+
+##
+# functions
+
+def setup_django(**overrides: dict):
+    """configures an in-memory sqlite django project with the benchmark models installed
+
+    elasticsearch is never contacted unless a benchmark passes its own connection
+
+    :param overrides: additional django settings
+    """
+    if settings.configured:
+        return
+    options = {
+        'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        'INSTALLED_APPS': ['benchmarks'],
+        'USE_TZ': True,
+        'ES_CONNECTIONS': {'default': {'hosts': ['localhost:9200']}},
+        'ES_INDEX_NAME': 'benchmarks',
+        'ES_ENSURE_MAPPINGS': False,
+        'ES_REFRESH': False,
+    }
+    options.update(overrides)
+    settings.configure(**options)
+    django.setup()
+    _create_tables()
+
+
+def populate(count: int, tags_per_article: int=3, seed: int=0):
+    """creates `count` articles with related authors, publishers, categories and tags
+
+    :param count: the number of articles
+    :param tags_per_article: the number of tags attached to every article
+    :param seed: the random seed -- the same seed always creates the same rows
+    """
+    from .models import Article, Author, Category, Publisher, Tag
+
+    rand = random.Random(seed)
+    authors = Author.objects.bulk_create(
+        [Author(name='author {}'.format(i), email='author{}@example.com'.format(i)) for i in range(50)])
+    publishers = Publisher.objects.bulk_create(
+        [Publisher(name='publisher {}'.format(i), country='US') for i in range(10)])
+    categories = Category.objects.bulk_create(
+        [Category(name='category {}'.format(i), slug='category-{}'.format(i)) for i in range(20)])
+    Tag.objects.bulk_create([Tag(name='tag {}'.format(i)) for i in range(100)])
+
+    # bulk_create does not set pks on sqlite, so read them back
+    authors, publishers, categories = list(Author.objects.all()), list(Publisher.objects.all()), \
+        list(Category.objects.all())
+    tags = list(Tag.objects.all())
+
+    now = datetime(2015, 1, 1, tzinfo=timezone.utc)
+    Article.objects.bulk_create([Article(
+        title='article {}'.format(i),
+        subtitle='subtitle of article {}'.format(i),
+        slug='article-{}'.format(i),
+        body=' '.join('word{}'.format(rand.randint(0, 5000)) for _ in range(300)),
+        summary=' '.join('word{}'.format(rand.randint(0, 5000)) for _ in range(30)),
+        url='http://example.com/articles/{}'.format(i),
+        contact='editor@example.com',
+        ip_address='127.0.0.1',
+        word_count=rand.randint(100, 5000),
+        view_count=rand.randint(0, 100000),
+        comment_count=rand.randint(0, 500),
+        share_count=rand.randint(0, 10 ** 9),
+        rank=rand.randint(0, 100),
+        rating=rand.random() * 5,
+        price=Decimal('9.99'),
+        published=now - timedelta(minutes=i),
+        modified=now,
+        expires=date(2020, 1, 1),
+        language='en',
+        status='published',
+        author=rand.choice(authors),
+        publisher=rand.choice(publishers),
+        category=rand.choice(categories),
+    ) for i in range(count)])
+
+    through = Article.tags.through
+    through.objects.bulk_create([
+        through(article_id=pk, tag_id=tag.pk)
+        for pk in Article.objects.values_list('pk', flat=True)
+        for tag in rand.sample(tags, tags_per_article)
+    ])
+
+
+def _create_tables():
+    """creates the tables of the benchmark models
+    """
+    from django.db import connection
+    from .models import Article, Author, Category, Publisher, Tag
+
+    with connection.schema_editor() as editor:
+        for model in (Publisher, Author, Category, Tag, Article):
+            editor.create_model(model)
@@ -0,0 +1,70 @@
+from djelastic import fields
+from djelastic.indexers import ModelIndexer
+
+from .models import Article
+
+
+class ArticleIndexer(ModelIndexer):
+    """
+    indexes every column of the benchmark article and four of its relationships
+    """
+
+    __slots__ = ()
+
+    title = fields.StringField('title')
+    subtitle = fields.StringField('subtitle')
+    slug = fields.StringField('slug', index='not_analyzed')
+    body = fields.StringField('body')
+    summary = fields.StringField('summary')
+    url = fields.StringField('url', index='not_analyzed')
+    contact = fields.StringField('contact', index='not_analyzed')
+    ip_address = fields.StringField('ip_address', index='not_analyzed')
+    word_count = fields.IntegerField('word_count')
+    view_count = fields.IntegerField('view_count')
+    comment_count = fields.IntegerField('comment_count')
+    share_count = fields.IntegerField('share_count')
+    rank = fields.IntegerField('rank')
+    rating = fields.FloatField('rating')
+    price = fields.FloatField('price')
+    published = fields.DateField('published')
+    modified = fields.DateField('modified')
+    expires = fields.DateField('expires')
+    language = fields.StringField('language', index='not_analyzed')
+    status = fields.StringField('status', index='not_analyzed')
+    author = fields.StringField('author.name')
+    publisher = fields.StringField('publisher.name')
+    category = fields.StringField('category.name')
+    tags = fields.StringField('tags.name')
+
+    class Meta:
+        model = Article
+
+
+class PlainArticleIndexer(ModelIndexer):
+    """
+    indexes the columns of the benchmark article only
+    """
+
+    __slots__ = ()
+
+    title = fields.StringField('title')
+    body = fields.StringField('body')
+    word_count = fields.IntegerField('word_count')
+    rating = fields.FloatField('rating')
+    published = fields.DateField('published')
+
+    class Meta:
+        model = Article
+        doc_type = 'benchmarks.plainarticle'
+
+
+class FingerprintedArticleIndexer(ArticleIndexer):
+    """
+    indexes like `ArticleIndexer`, skipping unchanged documents with an in-process fingerprint store
+    """
+
+    __slots__ = ()
+
+    class Meta(ArticleIndexer.Meta):
+        doc_type = 'benchmarks.fingerprintedarticle'
+        fingerprint_store = True
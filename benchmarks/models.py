@@ -0,0 +1,62 @@
+from django.db import models
+
+
+class Publisher(models.Model):
+    name = models.CharField(max_length=100)
+    country = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'benchmarks'
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+
+    class Meta:
+        app_label = 'benchmarks'
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField()
+
+    class Meta:
+        app_label = 'benchmarks'
+
+
+class Tag(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'benchmarks'
+
+
+class Article(models.Model):
+    title = models.CharField(max_length=200)
+    subtitle = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200)
+    body = models.TextField()
+    summary = models.TextField()
+    url = models.URLField()
+    contact = models.EmailField()
+    ip_address = models.GenericIPAddressField()
+    word_count = models.IntegerField()
+    view_count = models.PositiveIntegerField()
+    comment_count = models.PositiveIntegerField()
+    share_count = models.BigIntegerField()
+    rank = models.SmallIntegerField()
+    rating = models.FloatField()
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    published = models.DateTimeField()
+    modified = models.DateTimeField()
+    expires = models.DateField()
+    language = models.CharField(max_length=5)
+    status = models.CharField(max_length=20)
+    author = models.ForeignKey(Author)
+    publisher = models.ForeignKey(Publisher)
+    category = models.ForeignKey(Category)
+    tags = models.ManyToManyField(Tag)
+
+    class Meta:
+        app_label = 'benchmarks'
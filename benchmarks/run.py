@@ -0,0 +1,331 @@
+"""
+benchmark suite of the indexing and searching hot paths -- runs against in-memory sqlite and an in-process
+elasticsearch stand-in (see `benchmarks.transport`), no network involved
+
+run with `python -m benchmarks.run [--count N] [--repeat N] [--output FILE] [--compare FILE] [name ...]`
+
+results are written as json ({'meta': {...}, 'results': {name: {'value', 'unit', 'better'}}}) so runs of two
+commits can be compared with `--compare`
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+from .environment import populate, setup_django
+
+
+##
+# constants
+
+SEARCH_SIZES = (10, 100, 1000)
+BULK_CHUNK_SIZE = 500
+SINGLE_INDEX_COUNT = 200
+
+
+##
+# benchmarks by name -- every one returns (value, unit, 'higher' or 'lower' is better)
+
+benchmarks = OrderedDict()
+
+
+def benchmark(name: str):
+    """registers a benchmark function
+
+    :param name: the benchmark name
+    :return: the decorator
+    """
+    def decorator(func):
+        benchmarks[name] = func
+        return func
+    return decorator
+
+
+def best_rate(func, count: int, repeat: int) -> float:
+    """runs `func` `repeat` times
+
+    :param func: the function, processing `count` items per call
+    :param count: the number of items processed per call
+    :param repeat: the number of calls
+    :return: the best items/second of all calls
+    """
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def median_latency(func, repeat: int) -> float:
+    """runs `func` `repeat` times
+
+    :param func: the function
+    :param repeat: the number of calls
+    :return: the median milliseconds per call
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+@benchmark('mapping.build')
+def bench_mapping(context: dict) -> (float, str, str):
+    indexer = context['indexer']
+    return best_rate(lambda: [indexer._make_mapping() for _ in range(1000)], 1000, context['repeat']), \
+        'mappings/s', 'higher'
+
+
+@benchmark('indexer.create')
+def bench_indexer_create(context: dict) -> (float, str, str):
+    indexer_class, instances = type(context['indexer']), context['instances']
+    return best_rate(lambda: [indexer_class(instance) for instance in instances], len(instances),
+                     context['repeat']), 'indexers/s', 'higher'
+
+
+@benchmark('document.plain')
+def bench_document_plain(context: dict) -> (float, str, str):
+    indexer, instances = context['plain_indexer'], context['instances']
+    return best_rate(lambda: [indexer._make_document(instance) for instance in instances], len(instances),
+                     context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('document.relations')
+def bench_document_relations(context: dict) -> (float, str, str):
+    indexer, instances = context['indexer'], context['instances']
+    return best_rate(lambda: [indexer._make_document(instance) for instance in instances], len(instances),
+                     context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('document.columnar')
+def bench_document_columnar(context: dict) -> (float, str, str):
+    indexer, instances = context['indexer'], context['instances']
+
+    def build():
+        for start in range(0, len(instances), BULK_CHUNK_SIZE):
+            indexer._make_documents(instances[start:start + BULK_CHUNK_SIZE])
+    return best_rate(build, len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.single')
+def bench_index_single(context: dict) -> (float, str, str):
+    indexer_class, instances = type(context['indexer']), context['instances'][:SINGLE_INDEX_COUNT]
+    return best_rate(lambda: [indexer_class(instance).index(refresh=False) for instance in instances],
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.bulk')
+def bench_index_bulk(context: dict) -> (float, str, str):
+    indexer, instances = context['indexer'], context['instances']
+    return best_rate(lambda: indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False),
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.bulk.bytes')
+def bench_index_bulk_bytes(context: dict) -> (float, str, str):
+    indexer, instances, server = context['indexer'], context['instances'], context['server']
+    server.reset()
+    indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False)
+    return server.bytes_sent / len(instances), 'bytes/doc', 'lower'
+
+
+@benchmark('index.bulk.fast')
+def bench_index_bulk_fast(context: dict) -> (float, str, str):
+    indexer, instances = context['fast_indexer'], context['instances']
+    return best_rate(lambda: indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False),
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.bulk.fast.bytes')
+def bench_index_bulk_fast_bytes(context: dict) -> (float, str, str):
+    indexer, instances = context['fast_indexer'], context['instances']
+    indexer.es.transport.server.reset()
+    indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False)
+    return indexer.es.transport.server.bytes_sent / len(instances), 'bytes/doc', 'lower'
+
+
+@benchmark('index.bulk.gzip')
+def bench_index_bulk_gzip(context: dict) -> (float, str, str):
+    indexer, instances = context['gzip_indexer'], context['instances']
+    return best_rate(lambda: indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False),
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.bulk.gzip.bytes')
+def bench_index_bulk_gzip_bytes(context: dict) -> (float, str, str):
+    indexer, instances = context['gzip_indexer'], context['instances']
+    indexer.es.transport.server.reset()
+    indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False)
+    return indexer.es.transport.server.bytes_sent / len(instances), 'bytes/doc', 'lower'
+
+
+@benchmark('index.single.unchanged')
+def bench_index_single_unchanged(context: dict) -> (float, str, str):
+    indexer_class, instances = type(context['fingerprinted_indexer']), context['instances'][:SINGLE_INDEX_COUNT]
+    for instance in instances:
+        indexer_class(instance).index(refresh=False)
+    return best_rate(lambda: [indexer_class(instance).index(refresh=False) for instance in instances],
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+@benchmark('index.bulk.unchanged')
+def bench_index_bulk_unchanged(context: dict) -> (float, str, str):
+    indexer, instances = context['fingerprinted_indexer'], context['instances']
+    indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False)
+    return best_rate(lambda: indexer.bulk_index(instances, chunk_size=BULK_CHUNK_SIZE, refresh=False),
+                     len(instances), context['repeat']), 'docs/s', 'higher'
+
+
+def make_search_benchmark(size: int, hydrate: bool):
+    """creates the search latency benchmark of one result size
+
+    :param size: the number of hits
+    :param hydrate: hydrate from the database or build source results
+    :return: the benchmark function
+    """
+    def bench_search(context: dict) -> (float, str, str):
+        from djelastic.searchers import ModelSearcher
+
+        indexer, server = context['indexer'], context['server']
+        documents = indexer._make_documents(context['instances'][:size])
+        server.hits = [{
+            '_index': indexer.index_name,
+            '_type': indexer.doc_type_name,
+            '_id': str(document[indexer.model_pk_name]),
+            '_score': 1.0,
+            '_source': document,
+        } for document in documents]
+        searcher = ModelSearcher(indexer)
+        try:
+            return median_latency(lambda: searcher.search('word', hydrate=hydrate), context['repeat']), \
+                'ms', 'lower'
+        finally:
+            server.hits = []
+    return bench_search
+
+
+for _size in SEARCH_SIZES:
+    benchmark('search.hydrate.{}'.format(_size))(make_search_benchmark(_size, True))
+    benchmark('search.source.{}'.format(_size))(make_search_benchmark(_size, False))
+
+
+##
+# functions
+
+def get_commit() -> str or None:
+    """gets the current git commit
+
+    :return: the commit hash, or None outside of a git checkout
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)\
+            .decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(names: [str], count: int, repeat: int) -> dict:
+    """runs benchmarks
+
+    :param names: the benchmarks to run -- all of them if empty
+    :param count: the number of articles
+    :param repeat: the number of passes per benchmark
+    :return: {'meta', 'results'}
+    """
+    setup_django()
+    populate(count)
+
+    from djelastic.connections import DEFAULT_COMPRESS_LEVEL, connections
+    from djelastic.serializers import FastJSONSerializer
+    from .indexers import ArticleIndexer, FingerprintedArticleIndexer, PlainArticleIndexer
+    from .models import Article
+    from .transport import make_client
+
+    es = make_client()
+    connections.add_connection('default', es)
+
+    # relations are loaded up front -- this measures document building, not the database
+    context = {
+        'repeat': repeat,
+        'server': es.transport.server,
+        'indexer': ArticleIndexer(),
+        'plain_indexer': PlainArticleIndexer(),
+        'fingerprinted_indexer': FingerprintedArticleIndexer(),
+        'instances': list(ArticleIndexer().get_queryset(Article.objects.all()).order_by('pk')),
+    }
+
+    # the same indexer writing through its own fake clients -- compact serializer, then gzip on top of it
+    context['fast_indexer'] = ArticleIndexer()
+    context['fast_indexer'].es = make_client(serializer=FastJSONSerializer())
+    context['gzip_indexer'] = ArticleIndexer()
+    context['gzip_indexer'].es = make_client(serializer=FastJSONSerializer(), compress_level=DEFAULT_COMPRESS_LEVEL)
+
+    results = OrderedDict()
+    for name, func in benchmarks.items():
+        if names and not any(name == selected or name.startswith(selected + '.') for selected in names):
+            continue
+        value, unit, better = func(context)
+        results[name] = {'value': value, 'unit': unit, 'better': better}
+        print('{:<24} {:>14.2f} {}'.format(name, value, unit))
+
+    return {
+        'meta': {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'count': count,
+            'repeat': repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict):
+    """prints the change of every benchmark against a baseline run
+
+    :param baseline: the results of the baseline run
+    :param current: the results of this run
+    """
+    print('\ncompared to {} ({})'.format(baseline['meta'].get('commit'), baseline['meta'].get('time')))
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None or not before['value']:
+            print('{:<24} {:>14}'.format(name, 'new'))
+            continue
+        change = (result['value'] - before['value']) / before['value'] * 100
+        improved = change > 0 if result['better'] == 'higher' else change < 0
+        verdict = 'unchanged' if change == 0 else 'better' if improved else 'worse'
+        print('{:<24} {:>+13.1f}% {}'.format(name, change, verdict))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('names', nargs='*', help='benchmarks (or name prefixes, e.g. `search`) to run')
+    parser.add_argument('--count', type=int, default=2000, help='number of articles')
+    parser.add_argument('--repeat', type=int, default=5, help='number of passes per benchmark')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--compare', help='compare the results to those of this json file')
+    args = parser.parse_args()
+
+    if args.count < max(SEARCH_SIZES):
+        parser.error('--count must be at least {}'.format(max(SEARCH_SIZES)))
+
+    results = run(args.names, args.count, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
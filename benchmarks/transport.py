@@ -0,0 +1,160 @@
+"""
+in-process elasticsearch stand-in -- records every request and answers with canned responses, so benchmarks run
+without a network while still paying for request serialization, compression and response parsing
+"""
+import gzip
+import json
+from urllib.parse import urlencode
+
+from elasticsearch import Elasticsearch, Transport
+from elasticsearch.connection import Connection
+
+
+##
+# objects
+
+class FakeServer(object):
+    """
+    answers elasticsearch requests -- every write succeeds, every search returns `hits`
+    """
+
+    def __init__(self, hits: [dict]=None):
+        """initializes a new server
+
+        :param hits: the raw hits every search answers with
+        """
+        self.hits = hits or []
+        self.requests = []
+
+    def reset(self):
+        """forgets the recorded requests
+        """
+        self.requests = []
+
+    @property
+    def bytes_sent(self) -> int:
+        """the total size of the recorded request bodies, as sent -- compressed bodies count compressed
+        """
+        return sum(len(body) for _, _, _, body in self.requests if body)
+
+    def handle(self, method: str, url: str, params: dict=None, body: bytes=None) -> (int, object):
+        """records a request and creates its response
+
+        :param method: the http method
+        :param url: the path
+        :param params: the query string parameters
+        :param body: the encoded request body, possibly gzip compressed
+        :return: (status, response document)
+        """
+        self.requests.append((method, url, params, body))
+        if body and body[:2] == b'\x1f\x8b':
+            body = gzip.decompress(body)
+        parts = [part for part in url.split('/') if part]
+
+        if method == 'HEAD':
+            return 200, None
+        if parts and parts[-1] == '_bulk':
+            return 200, self._bulk(body)
+        if parts and parts[-1] == '_msearch':
+            lines = [line for line in body.decode('utf-8').split('\n') if line]
+            return 200, {'responses': [self._search() for _ in range(len(lines) // 2)]}
+        if parts[-2:] == ['_search', 'scroll']:
+            return 200, {'_scroll_id': 'fake', 'hits': {'total': len(self.hits), 'hits': []}}
+        if parts and parts[-1] == '_search':
+            res = self._search()
+            if params and 'scroll' in params:
+                res['_scroll_id'] = 'fake'
+            return 200, res
+        if len(parts) == 3 and not parts[0].startswith('_') and not parts[1].startswith('_'):
+            document = {'_index': parts[0], '_type': parts[1], '_id': parts[2], '_version': 1}
+            if method == 'DELETE':
+                document['found'] = True
+            else:
+                document['created'] = True
+            return 200, document
+        return 200, {'acknowledged': True}
+
+    ##
+    # internal methods
+
+    def _search(self) -> dict:
+        """creates a search response
+
+        :return: the response with all canned hits
+        """
+        return {'took': 1, 'timed_out': False, 'hits': {'total': len(self.hits), 'max_score': 1.0,
+                                                        'hits': self.hits}}
+
+    @staticmethod
+    def _bulk(body: bytes) -> dict:
+        """creates the response of a bulk request -- one successful item per action
+
+        :param body: the ndjson request body
+        :return: the response
+        """
+        items = []
+        lines = iter(line for line in body.decode('utf-8').split('\n') if line)
+        for line in lines:
+            op_type, meta = next(iter(json.loads(line).items()))
+            if op_type != 'delete':
+                next(lines)
+            items.append({op_type: dict(meta, _version=1, status=200 if op_type == 'delete' else 201)})
+        return {'took': 1, 'errors': False, 'items': items}
+
+
+class FakeConnection(Connection):
+    """
+    elasticsearch connection answered by a `FakeServer` instead of the network -- compresses request bodies like
+    `djelastic.connections.GzipConnection` if given a `compress_level`
+    """
+
+    def __init__(self, host: str='localhost', port: int=9200, server: FakeServer=None, compress_level: int=None,
+                 **kwargs: dict):
+        super(FakeConnection, self).__init__(host, port, **kwargs)
+        self.server = server
+        self.compress_level = compress_level
+
+    def perform_request(self, method: str, url: str, params: dict=None, body: bytes=None, timeout: float=None,
+                        ignore: (int,)=()) -> (int, dict, str):
+        if body and self.compress_level is not None:
+            body = gzip.compress(body, self.compress_level)
+        if params:
+            url_with_params = '{}?{}'.format(url, urlencode(params))
+        else:
+            url_with_params = url
+        status, document = self.server.handle(method, url, params, body)
+        raw_data = '' if document is None else json.dumps(document)
+        if not (200 <= status < 300) and status not in ignore:
+            self.log_request_fail(method, url_with_params, body, 0, status)
+            self._raise_error(status, raw_data)
+        return status, {'content-type': 'application/json'}, raw_data
+
+
+class FakeTransport(Transport):
+    """
+    elasticsearch transport whose connections are answered by one shared `FakeServer`
+    """
+
+    def __init__(self, hosts: [dict]=None, server: FakeServer=None, **kwargs: dict):
+        """initializes a new transport
+
+        :param hosts: ignored beyond creating the (fake) connections
+        :param server: the server answering requests -- a new one by default, available as `self.server`
+        :param kwargs: additional transport arguments
+        """
+        self.server = server or FakeServer()
+        kwargs['connection_class'] = FakeConnection
+        super(FakeTransport, self).__init__(hosts or [{}], server=self.server, **kwargs)
+
+
+##
+# functions
+
+def make_client(server: FakeServer=None, **kwargs: dict) -> Elasticsearch:
+    """creates an elasticsearch client talking to a fake server
+
+    :param server: the server -- a new one by default, available as `client.transport.server`
+    :param kwargs: additional client arguments
+    :return: the client
+    """
+    return Elasticsearch(transport_class=FakeTransport, server=server, **kwargs)
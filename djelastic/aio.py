@@ -0,0 +1,500 @@
+"""
+asyncio variants of the indexers and searchers -- requires python 3.6+ (`iter_search` is an async generator)
+
+they share the Meta configuration, mapping and document logic of `ModelIndexer` and `ModelSearcher`, but talk to
+elasticsearch through an `AsyncTransport`. building documents and hydrating still use the (blocking) django orm:
+pass prefetched instances (see `ModelIndexer.get_queryset`) to the indexers, hydration runs in the default executor.
+"""
+import asyncio
+import logging
+import threading
+from urllib.parse import quote
+
+from django.db import connections as db_connections
+from django.db.models import Model
+from elasticsearch import Elasticsearch, TransportError
+
+from .aliases import INITIAL_INDEX_SUFFIX, get_cached_rebuild_indices, get_rebuild_alias, set_cached_rebuild_indices
+from .async_transport import DEFAULT_MAX_CONNECTIONS, DEFAULT_TIMEOUT, AsyncTransport
+from .bulk import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_BYTES, chunk_actions, is_failure
+from .cache import SearchCache, invalidate
+from .connections import DEFAULT_ALIAS, DEFAULT_COMPRESS_LEVEL, GzipConnection, get_connection_config
+from .indexers import ModelIndexer, iter_chunks
+from .instrumentation import PHASE_REQUEST, is_enabled, record
+from .results import SearchPage
+from .searchers import ModelSearcher, get_cache, get_params, get_response_hits, make_body
+from .serializers import get_serializer
+
+
+##
+# constants
+
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+##
+# async transports by connection name
+
+_async_connections = {}
+_async_connections_lock = threading.Lock()
+
+
+##
+# objects
+
+class AsyncModelIndexer(ModelIndexer):
+    """
+    django model indexer writing through an `AsyncTransport`
+
+    configured like a `ModelIndexer` -- `Meta.es` may be a connection name, a client (its hosts are reused) or an
+    `AsyncTransport`. the index is not created on init: await `ensure_index` or `sync_mapping` once at startup.
+    writes are never buffered nor skipped, `Meta.write_behind` is ignored -- they drop the fingerprints of their
+    documents from `Meta.fingerprint_store`, so later writes of the blocking indexers are not skipped.
+    """
+
+    __slots__ = ()
+
+    _registered = False
+
+    def __init__(self, instance: Model=None):
+        """initializes a new indexer
+
+        :param instance: an instance of a django model
+        """
+        self._es = None
+        self._index_name = None
+        self.instance = instance
+
+    ##
+    # callable methods
+
+    async def index(self, refresh: bool or str=None) -> dict:
+        """upserts the document into elasticsearch
+
+        :param refresh: the refresh policy -- see `ModelIndexer.index`
+        :return: {'_type', 'created', '_version', '_index', '_id'}
+        """
+        document = self._make_document()
+        if len(document):
+            doc_id = document[self.model_pk_name]
+            self._forget_fingerprints([doc_id])
+            index_names = await self._get_async_write_indices()
+            res = await self.es.perform_request('PUT', _make_path(self.index_name, self.doc_type_name, doc_id),
+                                                _make_params(self._get_refresh(refresh)), document)
+            for index_name in index_names[1:]:
+                await self.es.perform_request('PUT', _make_path(index_name, self.doc_type_name, doc_id), body=document)
+            invalidate(self.index_name, self.doc_type_name)
+            logging.debug('index result: %s', res)
+            return res
+        logging.debug('index result: None -- there is no document')
+        return {'_type': None, 'created': None, '_version': None, '_index': None, '_id': None}
+
+    async def delete(self, refresh: bool or str=None) -> dict:
+        """deletes the document from elasticsearch
+
+        :param refresh: the refresh policy -- see `ModelIndexer.index`
+        :return: {'found', '_type':, '_version''_index', '_id'}
+        """
+        document = self._make_document()
+        if len(document):
+            doc_id = document[self.model_pk_name]
+            self._forget_fingerprints([doc_id])
+            index_names = await self._get_async_write_indices()
+            res = await self.es.perform_request(
+                'DELETE', _make_path(self.index_name, self.doc_type_name, doc_id),
+                _make_params(self._get_refresh(refresh)))
+            for index_name in index_names[1:]:
+                await self.es.perform_request('DELETE', _make_path(index_name, self.doc_type_name, doc_id),
+                                              ignore=(404,))
+            invalidate(self.index_name, self.doc_type_name)
+            logging.debug('delete result: %s', res)
+            return res
+        logging.debug('delete result: None - there is no document')
+        return {'found': None, '_type': None, '_version': None, '_index': None, '_id': None}
+
+    async def ensure_index(self) -> bool:
+        """creates the index and puts the doc type mapping if either one is missing -- see `ModelIndexer.ensure_index`
+
+        :return: True if the index or the mapping had to be created
+        """
+        if self._is_bootstrapped():
+            return False
+        created = False
+        if not await self.es.perform_request('HEAD', _make_path(self.index_name)):
+            await self._create_async_index()
+            created = True
+        if not await self.es.perform_request('HEAD', _make_path(self.index_name, self.doc_type_name)):
+            await self.es.perform_request('PUT', _make_path(self.index_name, '_mapping', self.doc_type_name),
+                                          body=self.mapping)
+            created = True
+        self._set_bootstrapped()
+        return created
+
+    async def sync_mapping(self) -> dict:
+        """creates the index if it is missing and (re)puts the doc type mapping
+
+        :return: the put mapping result
+        """
+        if not await self.es.perform_request('HEAD', _make_path(self.index_name)):
+            await self._create_async_index()
+        res = await self.es.perform_request('PUT', _make_path(self.index_name, '_mapping', self.doc_type_name),
+                                            body=self.mapping)
+        logging.debug('put mapping result: %s', res)
+        self._set_bootstrapped()
+        return res
+
+    async def bulk_index(self, instances: [Model], chunk_size: int=DEFAULT_CHUNK_SIZE,
+                         max_bytes: int=DEFAULT_MAX_BYTES, max_in_flight: int=DEFAULT_MAX_IN_FLIGHT,
+                         refresh: bool or str=None) -> dict:
+        """upserts the documents of many instances through concurrent bulk requests
+
+        :param instances: an iterable of django model instances -- prefetched, documents are built in the event loop
+        :param chunk_size: the maximum number of documents per bulk request
+        :param max_bytes: the maximum body size in bytes per bulk request
+        :param max_in_flight: the maximum number of bulk requests sent at the same time
+        :param refresh: the refresh policy -- if set, the written indices are refreshed once after the last request
+        :return: {'success', 'failed', 'errors'} -- `errors` holds the failed bulk response items
+        """
+        index_names = await self._get_async_write_indices()
+
+        def actions():
+            for chunk in iter_chunks(instances, chunk_size):
+                documents = self._make_documents(chunk)
+                self._forget_fingerprints([document[self.model_pk_name] for document in documents])
+                for document in documents:
+                    for index_name in index_names:
+                        yield self._make_action('index', document[self.model_pk_name], index_name), document
+
+        res = await send_bulk(self.es, actions(), chunk_size, max_bytes, max_in_flight)
+        await self._refresh(index_names, refresh)
+        invalidate(self.index_name, self.doc_type_name)
+        return res
+
+    async def bulk_delete(self, pks, chunk_size: int=DEFAULT_CHUNK_SIZE, max_bytes: int=DEFAULT_MAX_BYTES,
+                          max_in_flight: int=DEFAULT_MAX_IN_FLIGHT, refresh: bool or str=None) -> dict:
+        """deletes the documents of many model pks through concurrent bulk requests
+
+        :param pks: an iterable of django model pks
+        :param chunk_size: the maximum number of deletes per bulk request
+        :param max_bytes: the maximum body size in bytes per bulk request
+        :param max_in_flight: the maximum number of bulk requests sent at the same time
+        :param refresh: the refresh policy -- if set, the written indices are refreshed once after the last request
+        :return: {'success', 'failed', 'errors'} -- `errors` holds the failed bulk response items
+        """
+        pks = list(pks)
+        self._forget_fingerprints(pks)
+        index_names = await self._get_async_write_indices()
+        actions = ((self._make_action('delete', pk, index_name), None) for pk in pks for index_name in index_names)
+        res = await send_bulk(self.es, actions, chunk_size, max_bytes, max_in_flight)
+        await self._refresh(index_names, refresh)
+        invalidate(self.index_name, self.doc_type_name)
+        return res
+
+    ##
+    # internal methods
+
+    @classmethod
+    def _get_es(cls) -> AsyncTransport:
+        """gets the shared async transport from meta or the connection registry
+
+        :return: the transport
+        :raise ConfigurationError: if there is no connection information
+        """
+        return get_async_connection(getattr(cls.Meta, 'es', None))
+
+    async def _create_async_index(self):
+        """creates the index -- or, for versioned indexers, the initial physical index behind the index alias
+        """
+        if self._is_versioned():
+            name = '{}{}'.format(self.index_name, INITIAL_INDEX_SUFFIX)
+            await self.es.perform_request('PUT', _make_path(name), body={'aliases': {self.index_name: {}}},
+                                          ignore=(400,))
+            logging.info('created index %s for alias %s', name, self.index_name)
+        else:
+            await self.es.perform_request('PUT', _make_path(self.index_name), ignore=(400,))
+
+    async def _get_async_write_indices(self) -> [str]:
+        """gets the indices every write goes to -- see `ModelIndexer._get_write_indices`
+
+        :return: the index names, `self.index_name` first
+        """
+        if not self._is_versioned():
+            return [self.index_name]
+        return [self.index_name] + [
+            name for name in await get_rebuild_indices(self.es, self.index_name) if name != self.index_name]
+
+    async def _refresh(self, index_names: [str], refresh: bool or str=None):
+        """refreshes the written indices once if the refresh policy asks for it
+
+        :param index_names: the written indices
+        :param refresh: the policy passed to the call, if any
+        """
+        if self._get_refresh(refresh):
+            await self.es.perform_request('POST', _make_path(','.join(index_names), '_refresh'))
+
+
+class AsyncModelSearcher(ModelSearcher):
+    """
+    model searcher reading through an `AsyncTransport` -- same queries, caching and results as `ModelSearcher`
+    """
+
+    def __init__(self, indexer: ModelIndexer, es: AsyncTransport or Elasticsearch or str=None,
+                 cache: bool or SearchCache=False):
+        """initializes a new searcher
+
+        :param indexer: an instance of ModelIndexer or AsyncModelIndexer
+        :param es: a transport, client or connection name to search with -- defaults to the indexer's connection
+        :param cache: cache `search` and `page` results -- True for the `ES_SEARCH_CACHE` cache, or a `SearchCache`
+        """
+        self.indexer = indexer
+        self.es = get_async_connection(indexer.es if es is None else es)
+        self.cache = get_cache(cache)
+
+    async def search(self, query: str, filters: dict=None, only_this_type: bool=True, hydrate: bool=True,
+                     only: [str] or dict=None, defer: [str] or dict=None, **kwargs: dict) -> list:
+        """performs a search -- see `ModelSearcher.search`
+
+        :return: a list of models with an additional `es_score` value added, or a list of `SourceResult`s
+        """
+        key = self._make_cache_key(only_this_type, 'search', query, filters, hydrate, only, defer)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        res = await self.es.perform_request('POST', self._get_search_path(only_this_type), get_params(hydrate), body)
+        return self._set_cached(key, await self._make_async_results(
+            get_response_hits(res), hydrate, only, defer))
+
+    async def iter_search(self, query: str, filters: dict=None, only_this_type: bool=True, batch_size: int=500,
+                          hydrate: bool=True, only: [str] or dict=None, defer: [str] or dict=None,
+                          scroll: str='5m'):
+        """streams all hits of a search through a scroll -- see `ModelSearcher.iter_search`
+
+        :return: an async generator of models with an additional `es_score` value added, or of `SourceResult`s
+        """
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        res = await self.es.perform_request('POST', self._get_search_path(only_this_type),
+                                            dict(get_params(hydrate), scroll=scroll, size=batch_size), body)
+        scroll_id = res.get('_scroll_id')
+        try:
+            while get_response_hits(res):
+                for result in await self._make_async_results(get_response_hits(res), hydrate, only, defer):
+                    yield result
+                res = await self.es.perform_request('POST', '/_search/scroll',
+                                                    dict(get_params(hydrate), scroll=scroll), scroll_id)
+                scroll_id = res.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id is not None:
+                await self.es.perform_request('DELETE', _make_path('_search', 'scroll', scroll_id), ignore=(404,))
+
+    async def page(self, query: str, filters: dict=None, only_this_type: bool=True, page: int=1, per_page: int=20,
+                   hydrate: bool=True, only: [str] or dict=None, defer: [str] or dict=None) -> SearchPage:
+        """performs a from/size paginated search -- see `ModelSearcher.page`
+
+        :return: the page, with its results and the total number of hits
+        :raise ValueError: if `per_page` is less than 1
+        """
+        if per_page < 1:
+            raise ValueError('per_page must be at least 1, got {}'.format(per_page))
+        key = self._make_cache_key(only_this_type, 'page', query, filters, page, per_page, hydrate, only, defer)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        body['from'] = (max(page, 1) - 1) * per_page
+        body['size'] = per_page
+        res = await self.es.perform_request('POST', self._get_search_path(only_this_type), get_params(hydrate), body)
+        results = await self._make_async_results(get_response_hits(res), hydrate, only, defer)
+        return self._set_cached(key, SearchPage(results, res['hits']['total'], max(page, 1), per_page))
+
+    ##
+    # internal methods
+
+    def _get_search_path(self, only_this_type: bool=True) -> str:
+        """gets the search endpoint
+
+        :param only_this_type: only search the indexer's doc type
+        :return: the url path
+        """
+        doc_type = self._get_doc_type(only_this_type)
+        if doc_type is None:
+            return _make_path(self.indexer.index_name, '_search')
+        return _make_path(self.indexer.index_name, doc_type, '_search')
+
+    async def _make_async_results(self, hits: [dict], hydrate: bool, only: [str] or dict=None,
+                                  defer: [str] or dict=None) -> list:
+        """turns raw elasticsearch hits into results -- hydration queries run in the default executor
+
+        :return: models with an additional `es_score` value added, or `SourceResult`s
+        """
+        if not hydrate:
+            return self._make_results(hits, hydrate, only, defer)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self._make_executor_results, hits, hydrate, only, defer)
+
+    def _make_executor_results(self, hits: [dict], hydrate: bool, only: [str] or dict=None,
+                               defer: [str] or dict=None) -> list:
+        """turns raw elasticsearch hits into results in an executor thread -- its database connections are closed
+        afterwards, nothing else ever closes the connections of executor threads
+
+        :return: models with an additional `es_score` value added, or `SourceResult`s
+        """
+        try:
+            return self._make_results(hits, hydrate, only, defer)
+        finally:
+            for connection in db_connections.all():
+                connection.close()
+
+
+##
+# functions
+
+def get_async_connection(es: AsyncTransport or Elasticsearch or str=None) -> AsyncTransport:
+    """gets a shared async transport
+
+    transports for connection names are created lazily from `ES_CONNECTIONS` (or the legacy settings, see
+    `ConnectionRegistry`) -- only the `hosts`, `timeout`, `maxsize`, `serializer`, `compress` and `compress_level`
+    keys are used
+
+    :param es: a transport (returned as is), a client (its hosts, serializer and compression are reused) or a
+        connection name -- defaults to the default connection
+    :return: the transport
+    :raise ConfigurationError: if there is no configuration for the connection name
+    """
+    if isinstance(es, AsyncTransport):
+        return es
+    key = DEFAULT_ALIAS if es is None else es
+    try:
+        return _async_connections[key]
+    except KeyError:
+        pass
+
+    with _async_connections_lock:
+        if key not in _async_connections:
+            if isinstance(es, Elasticsearch):
+                compress_level = None
+                if issubclass(es.transport.connection_class, GzipConnection):
+                    compress_level = es.transport.kwargs.get('compress_level', DEFAULT_COMPRESS_LEVEL)
+                transport = AsyncTransport(es.transport.hosts, serializer=es.transport.serializer,
+                                           on_request=_record_request, compress_level=compress_level)
+            else:
+                config = get_connection_config(key)
+                compress_level = None
+                if config.get('compress'):
+                    compress_level = config.get('compress_level', DEFAULT_COMPRESS_LEVEL)
+                transport = AsyncTransport(config.get('hosts'), config.get('maxsize', DEFAULT_MAX_CONNECTIONS),
+                                           config.get('timeout', DEFAULT_TIMEOUT),
+                                           serializer=get_serializer(config.get('serializer')),
+                                           on_request=_record_request, compress_level=compress_level)
+            logging.debug('created async transport for connection %s', key)
+            _async_connections[key] = transport
+        return _async_connections[key]
+
+
+async def get_rebuild_indices(es: AsyncTransport, alias: str) -> [str]:
+    """gets the physical indices currently being rebuilt for an alias -- see `aliases.get_rebuild_indices`
+
+    shares its cache with the blocking version
+
+    :param es: the transport
+    :param alias: the alias the indexers read and write through
+    :return: the index names, empty if no rebuild is running
+    """
+    indices = get_cached_rebuild_indices(alias)
+    if indices is not None:
+        return indices
+
+    res = await es.perform_request('GET', _make_path('_alias', get_rebuild_alias(alias)), ignore=(404,))
+    indices = [name for name, info in res.items() if isinstance(info, dict) and 'aliases' in info]
+    set_cached_rebuild_indices(alias, indices)
+    return indices
+
+
+async def send_bulk(es: AsyncTransport, actions, chunk_size: int=DEFAULT_CHUNK_SIZE,
+                    max_bytes: int=DEFAULT_MAX_BYTES, max_in_flight: int=DEFAULT_MAX_IN_FLIGHT,
+                    **kwargs: dict) -> dict:
+    """sends actions through the bulk endpoint in size bounded chunks, up to `max_in_flight` of them at a time
+
+    chunks are serialized lazily, so at most `max_in_flight` request bodies are held in memory. failures are
+    collected per item, like `bulk.send_bulk` (actions that cannot be serialized included) -- there is no refresh,
+    chunks may complete in any order.
+
+    :param es: the transport
+    :param actions: iterable of `(action, source)` pairs -- see `bulk.chunk_actions`
+    :param chunk_size: the maximum number of actions per request
+    :param max_bytes: the maximum body size in bytes per request
+    :param max_in_flight: the maximum number of concurrent requests
+    :param kwargs: additional bulk request parameters
+    :return: {'success', 'failed', 'errors'}
+    """
+    result = {'success': 0, 'failed': 0, 'errors': []}
+    slots = asyncio.Semaphore(max_in_flight)
+
+    async def send(body, chunk):
+        try:
+            res = await es.perform_request('POST', '/_bulk', kwargs or None, body)
+        except TransportError as e:
+            logging.error('bulk request of %s actions failed: %s', len(chunk), e)
+            result['failed'] += len(chunk)
+            for action in chunk:
+                op_type, meta = next(iter(action.items()))
+                result['errors'].append({op_type: dict(meta, error=str(e), status=e.status_code)})
+            return
+        finally:
+            slots.release()
+
+        for item in res.get('items', []):
+            op_type, info = next(iter(item.items()))
+            if is_failure(op_type, info):
+                result['failed'] += 1
+                result['errors'].append(item)
+            else:
+                result['success'] += 1
+
+    tasks = []
+    serialization_errors = []
+    for body, chunk in chunk_actions(es.serializer, actions, chunk_size, max_bytes, serialization_errors):
+        await slots.acquire()
+        tasks.append(asyncio.ensure_future(send(body, chunk)))
+    if tasks:
+        await asyncio.gather(*tasks)
+    result['failed'] += len(serialization_errors)
+    result['errors'] += serialization_errors
+
+    logging.debug('bulk result: %s succeeded, %s failed', result['success'], result['failed'])
+    return result
+
+
+def _record_request(method: str, url: str, status: int, duration: float, sent: int, received: int):
+    """reports a request of an async transport -- see `instrumentation.InstrumentedConnection`
+
+    :param method: the http method
+    :param url: the path, with the query string
+    :param status: the response status
+    :param duration: the duration in seconds
+    :param sent: the size of the request body
+    :param received: the size of the response body
+    """
+    if is_enabled(PHASE_REQUEST):
+        record(PHASE_REQUEST, duration, sender=AsyncTransport, method=method, url=url, status=status, sent=sent,
+               received=received)
+
+
+def _make_path(*parts: object) -> str:
+    """creates a url path from unescaped parts
+
+    :param parts: index names, doc types, ids, endpoints
+    :return: the path
+    """
+    return '/' + '/'.join(quote(str(part), safe=',') for part in parts)
+
+
+def _make_params(refresh: bool or str) -> dict or None:
+    """creates the query string parameters of a single document write
+
+    :param refresh: the resolved refresh policy
+    :return: the parameters, None if there are none
+    """
+    return {'refresh': refresh} if refresh else None
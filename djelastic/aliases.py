@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from elasticsearch import Elasticsearch
+
+
+##
+# constants
+
+REBUILD_ALIAS_SUFFIX = '_rebuilding'
+INITIAL_INDEX_SUFFIX = '_initial'
+DEFAULT_REBUILD_CHECK_INTERVAL = 5.0
+
+
+##
+# rebuild targets cache -- alias -> (expiry time, physical indices being rebuilt)
+
+_rebuild_indices = {}
+_rebuild_indices_lock = threading.Lock()
+
+
+##
+# functions
+
+def make_versioned_name(alias: str) -> str:
+    """creates a new physical index name for an alias
+
+    :param alias: the alias the indexers read and write through
+    :return: `<alias>_<utc timestamp>`, e.g. `articles_20150102030405`
+    """
+    return '{}_{}'.format(alias, time.strftime('%Y%m%d%H%M%S', time.gmtime()))
+
+
+def get_rebuild_alias(alias: str) -> str:
+    """gets the name of the alias that points at the indices being rebuilt for `alias`
+
+    :param alias: the alias the indexers read and write through
+    :return: the rebuild alias name
+    """
+    return '{}{}'.format(alias, REBUILD_ALIAS_SUFFIX)
+
+
+def get_rebuild_check_interval() -> float:
+    """gets the number of seconds a process caches the indices being rebuilt for an alias
+
+    :return: `ES_REBUILD_CHECK_INTERVAL` from django project settings or DEFAULT_REBUILD_CHECK_INTERVAL
+    """
+    return getattr(settings, 'ES_REBUILD_CHECK_INTERVAL', DEFAULT_REBUILD_CHECK_INTERVAL)
+
+
+def get_alias_indices(es: Elasticsearch, alias: str) -> [str]:
+    """gets the physical indices an alias points at
+
+    :param es: the elasticsearch client
+    :param alias: the alias name
+    :return: the index names, empty if the alias does not exist
+    """
+    res = es.indices.get_alias(name=alias, ignore=404)
+    return [name for name, info in res.items() if isinstance(info, dict) and 'aliases' in info]
+
+
+def get_rebuild_indices(es: Elasticsearch, alias: str) -> [str]:
+    """gets the physical indices currently being rebuilt for an alias -- writes must go to them as well
+
+    the answer is cached for `get_rebuild_check_interval()` seconds, which is why a rebuild waits that long between
+    adding the rebuild alias and starting to copy rows
+
+    :param es: the elasticsearch client
+    :param alias: the alias the indexers read and write through
+    :return: the index names, empty if no rebuild is running
+    """
+    indices = get_cached_rebuild_indices(alias)
+    if indices is not None:
+        return indices
+
+    indices = get_alias_indices(es, get_rebuild_alias(alias))
+    set_cached_rebuild_indices(alias, indices)
+    if indices:
+        logging.debug('rebuild of %s running, writing to %s as well', alias, indices)
+    return indices
+
+
+def get_cached_rebuild_indices(alias: str) -> [str] or None:
+    """reads the cached physical indices being rebuilt for an alias -- see `get_rebuild_indices`
+
+    :param alias: the alias the indexers read and write through
+    :return: the index names, or None if they are not cached or the entry expired
+    """
+    cached = _rebuild_indices.get(alias)
+    if cached is not None and cached[0] > time.time():
+        return cached[1]
+    return None
+
+
+def set_cached_rebuild_indices(alias: str, indices: [str]):
+    """caches the physical indices being rebuilt for an alias for `get_rebuild_check_interval()` seconds
+
+    :param alias: the alias the indexers read and write through
+    :param indices: the index names, empty if no rebuild is running
+    """
+    with _rebuild_indices_lock:
+        _rebuild_indices[alias] = (time.time() + get_rebuild_check_interval(), indices)
+
+
+def create_versioned_index(es: Elasticsearch, alias: str, body: dict=None, name: str=None, **kwargs: dict) -> str:
+    """creates a new physical index and points the alias at it in the same request
+
+    :param es: the elasticsearch client
+    :param alias: the alias the indexers read and write through
+    :param body: the index creation body (settings, mappings)
+    :param name: the physical index name -- defaults to `make_versioned_name(alias)`
+    :param kwargs: additional create index parameters
+    :return: the new index name
+    """
+    name = name or make_versioned_name(alias)
+    body = dict(body or {})
+    body['aliases'] = {alias: {}}
+    es.indices.create(name, body=body, **kwargs)
+    logging.info('created index %s for alias %s', name, alias)
+    return name
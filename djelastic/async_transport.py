@@ -0,0 +1,257 @@
+"""
+minimal asyncio http/1.1 transport for elasticsearch -- requires python 3.5+ (async/await)
+
+it only depends on the standard library and the elasticsearch client's serializer and exceptions, so it can be
+pointed at any local (fake) http server in tests
+"""
+import asyncio
+import gzip
+import itertools
+import time
+from urllib.parse import urlencode
+
+from elasticsearch.exceptions import HTTP_EXCEPTIONS, ConnectionError, TransportError
+from elasticsearch.serializer import JSONSerializer
+
+
+##
+# constants
+
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_TIMEOUT = 10.0
+
+
+##
+# errors of an idle keep-alive connection the server closed in the meantime -- the request is retried once on a new
+# connection
+
+STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError)
+
+
+##
+# objects
+
+class AsyncConnection(object):
+    """
+    one keep-alive http connection
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, method: str, host: str, url: str, body: bytes=None,
+                      encoding: str=None) -> (int, bytes, bool):
+        """sends a request and reads the response
+
+        :param method: the http method
+        :param host: the host header value
+        :param url: the path and query string
+        :param body: the request body
+        :param encoding: the content encoding of the body, e.g. gzip
+        :return: (status, response body, whether the connection can be reused)
+        """
+        headers = ['{} {} HTTP/1.1'.format(method, url), 'Host: {}'.format(host), 'Connection: keep-alive']
+        if body is not None:
+            headers += ['Content-Type: application/json', 'Content-Length: {}'.format(len(body))]
+            if encoding is not None:
+                headers.append('Content-Encoding: {}'.format(encoding))
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1'))
+        if body is not None:
+            self.writer.write(body)
+        await self.writer.drain()
+
+        # status line and headers
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed by server')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        # body
+        if method == 'HEAD' or status in (204, 304):
+            data = b''
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await self._read_chunked()
+        elif 'content-length' in response_headers:
+            data = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            data = await self.reader.read()
+            return status, data, False
+
+        return status, data, response_headers.get('connection', '').lower() != 'close'
+
+    def close(self):
+        self.writer.close()
+
+    async def _read_chunked(self) -> bytes:
+        """reads a chunked transfer encoded body
+
+        :return: the body
+        """
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0].strip(), 16)
+            if size == 0:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+class AsyncTransport(object):
+    """
+    pools keep-alive connections to elasticsearch hosts and bounds the number of requests in flight
+
+    idle connections belong to the event loop that opened them -- they are dropped when the transport is used from
+    another loop, so one transport can be shared process wide
+    """
+
+    def __init__(self, hosts: [str or dict]=None, max_connections: int=DEFAULT_MAX_CONNECTIONS,
+                 timeout: float=DEFAULT_TIMEOUT, serializer: object=None, on_request: callable=None,
+                 compress_level: int=None):
+        """initializes a new transport -- no connection is opened until the first request
+
+        :param hosts: `host:port` strings or {'host', 'port'} dicts, used round robin -- defaults to localhost:9200
+        :param max_connections: the maximum number of open connections (and requests in flight)
+        :param timeout: seconds to wait for a response
+        :param serializer: the body serializer -- defaults to the elasticsearch client's JSONSerializer
+        :param on_request: called with (method, url, status, duration, sent, received) after every completed request
+        :param compress_level: the gzip level request bodies are compressed with, None to send them uncompressed
+        """
+        self.hosts = [self._parse_host(host) for host in (hosts or ['localhost:9200'])]
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.serializer = serializer or JSONSerializer()
+        self.compress_level = compress_level
+        self.on_request = on_request
+        self._hosts = itertools.cycle(self.hosts)
+        self._idle = []
+        self._semaphore = None
+        self._loop = None
+
+    async def perform_request(self, method: str, url: str, params: dict=None, body: object=None,
+                              ignore: (int,)=()) -> object:
+        """performs a request against one of the hosts
+
+        :param method: the http method
+        :param url: the path
+        :param params: the query string parameters
+        :param body: the body -- serialized unless it is a string or bytes
+        :param ignore: statuses that do not raise
+        :return: the deserialized response, True/False for HEAD requests
+        :raise TransportError: for error statuses (the client's NotFoundError, RequestError, ... where they exist)
+        """
+        if params:
+            params = dict((key, str(value).lower() if isinstance(value, bool) else value)
+                          for key, value in params.items())
+            url = '{}?{}'.format(url, urlencode(params))
+        if body is not None:
+            if not isinstance(body, (str, bytes)):
+                body = self.serializer.dumps(body)
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+        encoding = None
+        if body and self.compress_level is not None:
+            body = gzip.compress(body, self.compress_level)
+            encoding = 'gzip'
+
+        loop = asyncio.get_event_loop()
+        if loop is not self._loop:
+            self._idle = []
+            self._semaphore = asyncio.Semaphore(self.max_connections)
+            self._loop = loop
+        async with self._semaphore:
+            host, connection, reused = await self._get_connection()
+            start = time.perf_counter()
+            try:
+                try:
+                    status, data, reusable = await self._send(host, connection, method, url, body, encoding)
+                except STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    host, connection = await self._open_connection()
+                    status, data, reusable = await self._send(host, connection, method, url, body, encoding)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                raise ConnectionError('N/A', str(e), e)
+            if reusable:
+                self._idle.append((host, connection))
+            else:
+                connection.close()
+        if self.on_request is not None:
+            self.on_request(method, url, status, time.perf_counter() - start, len(body) if body else 0, len(data))
+
+        if method == 'HEAD':
+            return 200 <= status < 300
+        text = data.decode('utf-8')
+        if not (200 <= status < 300) and status not in ignore:
+            try:
+                info = self.serializer.loads(text)
+                error = info.get('error', text)
+            except (ValueError, TypeError, AttributeError):
+                info, error = text, text
+            raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error, info)
+        return self.serializer.loads(text) if text else {}
+
+    def close(self):
+        """closes all idle connections
+        """
+        for _, connection in self._idle:
+            connection.close()
+        self._idle = []
+
+    ##
+    # internal methods
+
+    async def _get_connection(self) -> ((str, int), AsyncConnection, bool):
+        """reuses an idle connection or opens a new one
+
+        :return: (host, connection, whether the connection was idle)
+        """
+        if self._idle:
+            return self._idle.pop() + (True,)
+        return (await self._open_connection()) + (False,)
+
+    async def _open_connection(self) -> ((str, int), AsyncConnection):
+        """opens a connection to the next host
+
+        :return: (host, connection)
+        """
+        host = next(self._hosts)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*host), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectionError('N/A', str(e), e)
+        return host, AsyncConnection(reader, writer)
+
+    async def _send(self, host: (str, int), connection: AsyncConnection, method: str, url: str, body: bytes=None,
+                    encoding: str=None) -> (int, bytes, bool):
+        """sends a request over a connection within the timeout -- the connection is closed if it fails
+
+        :return: (status, response body, whether the connection can be reused) -- see `AsyncConnection.request`
+        """
+        try:
+            return await asyncio.wait_for(
+                connection.request(method, '{}:{}'.format(*host), url, body, encoding), self.timeout)
+        except BaseException:
+            connection.close()
+            raise
+
+    @staticmethod
+    def _parse_host(host: str or dict) -> (str, int):
+        """parses a host definition
+
+        :param host: `host:port` or {'host', 'port'}
+        :return: (host, port)
+        """
+        if isinstance(host, dict):
+            return host.get('host', 'localhost'), int(host.get('port', 9200))
+        host = host.split('://', 1)[-1].rstrip('/')
+        name, _, port = host.partition(':')
+        return name, int(port or 9200)
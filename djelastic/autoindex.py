@@ -0,0 +1,412 @@
+"""
+indexing driven by model signals -- saves and deletes are queued once their transaction commits and a background
+thread writes them to elasticsearch in bulk, so requests never wait for elasticsearch
+
+opt in per indexer, once the apps are loaded (e.g. in `AppConfig.ready`)::
+
+    from djelastic import autoindex
+
+    autoindex.register(ArticleIndexer)  # or set `Meta.autoindex = True` and call `autoindex.register()`
+
+the queue holds pks, not documents: every batch is read from the database when it is written (see
+`reindex.reindex_pks`), so a row changed ten times is written once, with its latest state, and rows deleted in the
+meantime have their documents deleted. the queue is configured by `ES_AUTOINDEX` in django project settings, e.g.
+`ES_AUTOINDEX = {'WINDOW': 1.0, 'BATCH_SIZE': 500, 'MAX_BACKOFF': 60.0}`.
+
+without `transaction.on_commit` (django < 1.9), the commit, rollback and savepoint rollback of the connection are
+hooked instead, so rows changed inside an atomic block are queued once it commits and dropped if it rolls back.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models.base import ModelBase
+from django.db.models.signals import post_delete, post_save
+from elasticsearch import TransportError
+
+from .bulk import DEFAULT_CHUNK_SIZE, is_retryable
+from .indexers import get_indexer_classes
+from .reindex import reindex_pks
+
+
+##
+# constants
+
+DEFAULT_WINDOW = 1.0
+DEFAULT_MIN_BACKOFF = 1.0
+DEFAULT_MAX_BACKOFF = 60.0
+
+
+##
+# indexer classes by registered model
+
+_registry = {}
+
+
+##
+# process wide queue
+
+_default_queue = {}
+_default_queue_lock = threading.Lock()
+
+
+##
+# objects
+
+class IndexQueue(object):
+    """
+    pk deduplicated queue of rows to reindex, drained in bulk batches by a background thread
+
+    batches that fail with transport or database errors -- or with retryable items (429, 5xx) -- go back to the
+    front of the queue and are retried with exponential backoff, so writes are not lost while elasticsearch is
+    unavailable. items rejected by elasticsearch for good (e.g. mapping errors) are logged and dropped. once
+    stopped, the queue drops whatever is put into it.
+    """
+
+    def __init__(self, window: float=DEFAULT_WINDOW, batch_size: int=DEFAULT_CHUNK_SIZE,
+                 min_backoff: float=DEFAULT_MIN_BACKOFF, max_backoff: float=DEFAULT_MAX_BACKOFF):
+        """initializes a new queue -- the thread starts with the first queued row
+
+        :param window: seconds queued rows wait for more rows to batch with -- a full batch is written right away
+        :param batch_size: the maximum number of rows per batch (and bulk request)
+        :param min_backoff: seconds to wait before the first retry of a failed batch
+        :param max_backoff: the maximum number of seconds between retries
+        """
+        self.window = window
+        self.batch_size = batch_size
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.written = 0
+        self.retried = 0
+        self.dropped = 0
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._stopped = False
+        self._backoff = 0.0
+        atexit.register(self.stop)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, indexer_class: type, pks: list):
+        """queues rows for reindexing -- rows already queued keep their place
+
+        :param indexer_class: the indexer class
+        :param pks: the pks of the rows
+        """
+        with self._condition:
+            if self._stopped:
+                pks = list(pks)
+                self.dropped += len(pks)
+                logging.error('%s rows of %s put into a stopped queue, dropping them', len(pks),
+                              indexer_class.__name__)
+                return
+            for pk in pks:
+                self._pending[(indexer_class, pk)] = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='djelastic-autoindex')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def drain(self) -> int:
+        """writes every queued row in the calling thread, trying each batch once -- failed rows stay queued
+
+        :return: the number of rows still queued
+        """
+        while True:
+            with self._condition:
+                batch = self._take()
+            if not batch or not self._write(batch):
+                return len(self._pending)
+
+    def stop(self, timeout: float=None):
+        """stops the background thread and drains the queue -- rows that still fail are logged as lost, rows put
+        afterwards are dropped
+
+        :param timeout: seconds to wait for the running batch
+        """
+        with self._condition:
+            self._stopping = self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        remaining = self.drain()
+        if remaining:
+            logging.error('%s queued rows not indexed -- run es_sync or es_reindex to catch up', remaining)
+
+    def stats(self) -> dict:
+        """reports the queue activity of this process
+
+        :return: {'queued', 'written', 'retried', 'dropped'}
+        """
+        return {'queued': len(self._pending), 'written': self.written, 'retried': self.retried,
+                'dropped': self.dropped}
+
+    ##
+    # internal methods
+
+    def _run(self):
+        """drains the queue one batch at a time until stopped
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+
+                # let more rows join the batch -- or back off after a failure
+                delay = self._backoff or self.window
+                deadline = time.time() + delay
+                while not self._stopping and (self._backoff or len(self._pending) < self.batch_size):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if self._stopping:
+                    return
+                batch = self._take()
+
+            # the thread keeps its own database connection -- drop it once broken or past CONN_MAX_AGE
+            close_old_connections()
+            if self._write(batch):
+                self._backoff = 0.0
+            else:
+                self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+                logging.warning('indexing batch failed, retrying in %.1fs', self._backoff)
+
+    def _take(self) -> OrderedDict:
+        """takes the next batch off the queue -- the caller holds the lock
+
+        :return: {indexer class: [pks]}
+        """
+        batch = OrderedDict()
+        for _ in range(min(self.batch_size, len(self._pending))):
+            (indexer_class, pk), _ = self._pending.popitem(last=False)
+            batch.setdefault(indexer_class, []).append(pk)
+        return batch
+
+    def _write(self, batch: OrderedDict) -> bool:
+        """reindexes a batch, putting the rows to retry back at the front of the queue
+
+        :param batch: {indexer class: [pks]}
+        :return: True if nothing has to be retried
+        """
+        retry = []
+        for indexer_class, pks in batch.items():
+            try:
+                res = reindex_pks(indexer_class, pks, chunk_size=self.batch_size)
+            except (TransportError, DatabaseError) as e:
+                logging.warning('indexing %s rows of %s failed: %s', len(pks), indexer_class.__name__, e)
+                retry += [(indexer_class, pk) for pk in pks]
+                continue
+            except Exception:
+                logging.exception('indexing %s rows of %s failed, dropping them', len(pks), indexer_class.__name__)
+                self.dropped += len(pks)
+                continue
+
+            failed = self._get_retryable(indexer_class, pks, res)
+            retry += [(indexer_class, pk) for pk in failed]
+            self.written += res['indexed'] + res['deleted'] + res['skipped']
+            self.dropped += res['failed'] - len(failed)
+
+        if retry:
+            with self._condition:
+                pending = OrderedDict((key, None) for key in retry)
+                pending.update(self._pending)
+                self._pending = pending
+            self.retried += len(retry)
+        return not retry
+
+    def _get_retryable(self, indexer_class: type, pks: list, res: dict) -> list:
+        """picks the rows worth retrying out of a reindex result
+
+        :param indexer_class: the indexer class
+        :param pks: the pks of the batch
+        :param res: the result of `reindex_pks`
+        :return: the pks to retry -- all of them if not every failure was reported
+        """
+        if not res['failed']:
+            return []
+        if res['failed'] > len(res['errors']):
+            return list(pks)
+
+        to_python = indexer_class.Meta.model._meta.pk.to_python
+        retry = []
+        for item in res['errors']:
+            op_type, info = next(iter(item.items()))
+            if is_retryable(info):
+                retry.append(to_python(info['_id']))
+            else:
+                logging.error('%s of %s %s rejected, dropping it: %s', op_type, indexer_class.__name__, info.get('_id'),
+                              info.get('error'))
+        return retry
+
+
+##
+# functions
+
+def register(*indexer_classes: type):
+    """hooks post_save and post_delete of the `Meta.model` of indexers -- saved and deleted rows are queued for
+    reindexing when their transaction commits
+
+    :param indexer_classes: the indexer classes -- defaults to every registered indexer with `Meta.autoindex = True`
+    """
+    if not indexer_classes:
+        indexer_classes = [cls for cls in get_indexer_classes() if getattr(cls.Meta, 'autoindex', False)]
+    for indexer_class in indexer_classes:
+        model = indexer_class.Meta.model
+        classes = _registry.setdefault(model, [])
+        if indexer_class not in classes:
+            classes.append(indexer_class)
+        uid = '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+        post_save.connect(_on_change, sender=model, dispatch_uid='djelastic.autoindex.save.{}'.format(uid))
+        post_delete.connect(_on_change, sender=model, dispatch_uid='djelastic.autoindex.delete.{}'.format(uid))
+
+
+def unregister(*indexer_classes: type):
+    """stops queueing the rows of indexers -- rows already queued are still written
+
+    :param indexer_classes: the indexer classes -- defaults to all of them
+    """
+    for model, classes in list(_registry.items()):
+        classes[:] = [cls for cls in classes if indexer_classes and cls not in indexer_classes]
+
+        # the last indexer of the model is gone
+        if not classes:
+            uid = '{}.{}'.format(model._meta.app_label, model._meta.model_name)
+            post_save.disconnect(sender=model, dispatch_uid='djelastic.autoindex.save.{}'.format(uid))
+            post_delete.disconnect(sender=model, dispatch_uid='djelastic.autoindex.delete.{}'.format(uid))
+            del _registry[model]
+
+
+def enqueue(indexer_class: type, pks: list, using: str=None):
+    """queues rows for reindexing when the current transaction commits
+
+    :param indexer_class: the indexer class
+    :param pks: the pks of the rows
+    :param using: the database alias of the transaction
+    """
+    pks = list(pks)
+    if pks:
+        run_on_commit(lambda: get_index_queue().put(indexer_class, pks), using)
+
+
+def run_on_commit(func: callable, using: str=None):
+    """calls a function when the current transaction commits -- right away outside of atomic blocks
+
+    without `transaction.on_commit` (django < 1.9) the transaction methods of the connection are hooked to the same
+    effect (see `_defer`)
+
+    :param func: the function, called without arguments
+    :param using: the database alias of the transaction
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        func()
+    elif hasattr(transaction, 'on_commit'):
+        transaction.on_commit(func, using)
+    else:
+        _defer(func, connection)
+
+
+def get_index_queue() -> IndexQueue:
+    """gets the process wide queue, configured by `ES_AUTOINDEX` in django project settings
+
+    :return: the queue
+    """
+    with _default_queue_lock:
+        if 'queue' not in _default_queue:
+            config = getattr(settings, 'ES_AUTOINDEX', {})
+            _default_queue['queue'] = IndexQueue(config.get('WINDOW', DEFAULT_WINDOW),
+                                                 config.get('BATCH_SIZE', DEFAULT_CHUNK_SIZE),
+                                                 config.get('MIN_BACKOFF', DEFAULT_MIN_BACKOFF),
+                                                 config.get('MAX_BACKOFF', DEFAULT_MAX_BACKOFF))
+        return _default_queue['queue']
+
+
+def _defer(func: callable, connection: object):
+    """calls a function once the transaction of a connection commits -- `transaction.on_commit` for django < 1.9
+
+    like `transaction.on_commit`, functions deferred after a savepoint are discarded when it is rolled back and all
+    of them when the transaction is. they run in the calling thread once autocommit is back on, so they may query
+    the database.
+
+    :param func: the function, called without arguments
+    :param connection: the database connection, inside an atomic block
+    """
+    if not hasattr(connection, '_djelastic_deferred'):
+        _hook_connection(connection)
+    connection._djelastic_deferred.append((set(connection.savepoint_ids), func))
+
+
+def _hook_connection(connection: object):
+    """wraps the transaction methods of a connection to run or discard the functions deferred by `_defer`
+
+    :param connection: the database connection
+    """
+    commit, rollback, savepoint_rollback = connection.commit, connection.rollback, connection.savepoint_rollback
+    set_autocommit, close = connection.set_autocommit, connection.close
+    connection._djelastic_deferred = []
+    connection._djelastic_committed = False
+
+    def hooked_commit():
+        commit()
+        # the outermost atomic block turns autocommit back on after its commit -- the sqlite backend only flags it
+        if connection.commit_on_exit and not connection.features.autocommits_when_autocommit_is_off:
+            connection._djelastic_committed = True
+        else:
+            _run_deferred(connection)
+
+    def hooked_set_autocommit(autocommit, *args, **kwargs):
+        set_autocommit(autocommit, *args, **kwargs)
+        if autocommit and connection._djelastic_committed:
+            _run_deferred(connection)
+
+    def hooked_rollback():
+        _discard_deferred(connection)
+        rollback()
+
+    def hooked_savepoint_rollback(sid):
+        savepoint_rollback(sid)
+        connection._djelastic_deferred = [(sids, func) for sids, func in connection._djelastic_deferred
+                                          if sid not in sids]
+
+    def hooked_close():
+        _discard_deferred(connection)
+        close()
+
+    connection.commit, connection.rollback, connection.close = hooked_commit, hooked_rollback, hooked_close
+    connection.savepoint_rollback, connection.set_autocommit = hooked_savepoint_rollback, hooked_set_autocommit
+
+
+def _run_deferred(connection: object):
+    """calls the functions deferred on a connection whose transaction committed, in order
+
+    :param connection: the database connection
+    """
+    connection._djelastic_committed = False
+    while connection._djelastic_deferred:
+        _, func = connection._djelastic_deferred.pop(0)
+        func()
+
+
+def _discard_deferred(connection: object):
+    """drops the functions deferred on a connection whose transaction is rolled back or lost
+
+    :param connection: the database connection
+    """
+    connection._djelastic_committed = False
+    connection._djelastic_deferred = []
+
+
+def _on_change(sender: ModelBase, instance: object, using: str=None, **kwargs):
+    """queues a saved or deleted row for every indexer registered for its model
+    """
+    for indexer_class in _registry.get(sender, ()):
+        enqueue(indexer_class, [instance.pk], using)
@@ -0,0 +1,193 @@
+import atexit
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+from elasticsearch import Elasticsearch
+
+from .bulk import DEFAULT_CHUNK_SIZE, is_retryable, send_bulk
+from .cache import invalidate
+
+
+##
+# buffers of this process, flushed once at interpreter exit
+
+_buffers = weakref.WeakSet()
+
+
+##
+# objects
+
+class WriteBuffer(object):
+    """
+    write-behind buffer that coalesces writes to the same document and flushes them as one bulk request
+
+    a flush happens `window` seconds after the first buffered write, as soon as `max_size` documents are pending,
+    on an explicit `flush()` call and at interpreter exit. actions failing with a retryable error (transport errors,
+    429, 5xx) go back into the buffer -- unless a newer write for the same document arrived meanwhile -- and are
+    retried with the next flush. actions rejected by elasticsearch for good are logged and dropped.
+    """
+
+    def __init__(self, es: Elasticsearch, window: float=1.0, max_size: int=DEFAULT_CHUNK_SIZE,
+                 refresh: bool or str=False):
+        """initializes a new buffer
+
+        :param es: the elasticsearch client to flush to
+        :param window: the number of seconds writes are held back for
+        :param max_size: the number of pending documents that triggers an immediate flush
+        :param refresh: the refresh policy of the flushing bulk request
+        """
+        self.es = es
+        self.window = window
+        self.max_size = max_size
+        self.refresh = refresh
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = None
+        _buffers.add(self)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, action: dict, source: dict=None):
+        """buffers a bulk action -- replaces any pending action for the same document
+
+        :param action: the bulk action metadata, e.g. {'index': {'_index', '_type', '_id'}}
+        :param source: the document for index actions, None for deletes
+        """
+        with self._lock:
+            key = self._make_key(action)
+            self._pending.pop(key, None)
+            self._pending[key] = (action, source)
+            full = len(self._pending) >= self.max_size
+            if not full:
+                self._schedule()
+        if full:
+            self.flush()
+
+    def flush(self) -> dict:
+        """sends all pending actions as one bulk request (chunked if needed) with at most one refresh
+
+        :return: {'success', 'failed', 'errors', 'requeued'} -- `requeued` counts the actions kept for a retry
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = OrderedDict()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if not pending:
+            return {'success': 0, 'failed': 0, 'errors': [], 'requeued': 0}
+
+        res = send_bulk(self.es, list(pending.values()), refresh=self.refresh)
+        for index_name, doc_type in set((meta['_index'], meta['_type']) for meta in
+                                        (next(iter(action.values())) for action, _ in pending.values())):
+            invalidate(index_name, doc_type)
+
+        res['requeued'] = self._requeue(pending, res['errors'])
+        if res['failed']:
+            logging.error('write buffer flush: %s of %s actions failed, %s kept for a retry', res['failed'],
+                          len(pending), res['requeued'])
+        return res
+
+    ##
+    # internal methods
+
+    def _schedule(self):
+        """starts the flush timer unless it is running -- the caller holds the lock
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(self.window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _requeue(self, sent: OrderedDict, errors: [dict]) -> int:
+        """puts the actions of retryable failures back in front of the buffer
+
+        :param sent: the flushed actions by document key
+        :param errors: the failed bulk response items
+        :return: the number of requeued actions
+        """
+        retry = OrderedDict()
+        for key, op_type, info in self._match_errors(sent, errors):
+            if key is None:
+                logging.error('write buffer: %s of %s failed and matches no flushed action, dropping it: %s',
+                              op_type, info.get('_id'), info.get('error'))
+            elif is_retryable(info):
+                retry[key] = sent[key]
+            else:
+                logging.error('write buffer: %s of %s rejected, dropping it: %s', op_type, info.get('_id'),
+                              info.get('error'))
+        if not retry:
+            return 0
+
+        with self._lock:
+            # newer writes of the same documents win
+            for key in self._pending:
+                retry.pop(key, None)
+            count = len(retry)
+            retry.update(self._pending)
+            self._pending = retry
+            if retry:
+                self._schedule()
+        return count
+
+    @staticmethod
+    def _match_errors(sent: OrderedDict, errors: [dict]) -> [((str, str, str), str, dict)]:
+        """finds the flushed action of every failed bulk response item
+
+        elasticsearch reports the concrete index of a write, not the alias it was sent to -- items naming an index
+        no action was sent to are matched by doc type and id against the actions not matched otherwise
+
+        :param sent: the flushed actions by document key
+        :param errors: the failed bulk response items
+        :return: (document key or None if no flushed action matches, op type, item info) of every item
+        """
+        by_document = {}
+        for key in sent:
+            by_document.setdefault(key[1:], []).append(key)
+
+        matched = []
+        for item in errors:
+            op_type, info = next(iter(item.items()))
+            key = (info.get('_index'), info.get('_type'), str(info.get('_id')))
+            if key in sent and key in by_document[key[1:]]:
+                by_document[key[1:]].remove(key)
+                matched.append((key, op_type, info))
+            else:
+                matched.append((None, op_type, info))
+
+        for position, (key, op_type, info) in enumerate(matched):
+            if key is None:
+                candidates = by_document.get((info.get('_type'), str(info.get('_id'))))
+                if candidates:
+                    matched[position] = (candidates.pop(0), op_type, info)
+        return matched
+
+    @staticmethod
+    def _make_key(action: dict) -> (str, str, str):
+        """creates the key writes of the same document share
+
+        :param action: the bulk action metadata
+        :return: (index, doc type, document id as str)
+        """
+        meta = next(iter(action.values()))
+        return meta['_index'], meta['_type'], str(meta['_id'])
+
+
+##
+# functions
+
+def flush_all():
+    """flushes every write buffer of this process -- called at interpreter exit
+    """
+    for buffer in list(_buffers):
+        try:
+            buffer.flush()
+        except Exception:
+            logging.exception('write buffer flush at exit failed, its actions are lost')
+
+
+atexit.register(flush_all)
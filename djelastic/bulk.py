@@ -0,0 +1,156 @@
+import logging
+from io import StringIO
+
+from elasticsearch import Elasticsearch, TransportError
+from elasticsearch.exceptions import SerializationError
+
+from .instrumentation import PHASE_BULK_CHUNK, timed
+
+
+##
+# constants
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+
+
+##
+# functions
+
+def chunk_actions(serializer, actions, chunk_size: int=DEFAULT_CHUNK_SIZE, max_bytes: int=DEFAULT_MAX_BYTES,
+                  errors: list=None):
+    """serializes bulk actions and groups them into size bounded ndjson bodies
+
+    the lines of a chunk are written straight into one buffer, joined once per chunk. with a serializer producing
+    ascii only output (`ensure_ascii`, e.g. `serializers.FastJSONSerializer`) sizes are counted without encoding.
+
+    :param serializer: the elasticsearch client serializer used to dump each line
+    :param actions: iterable of `(action, source)` pairs -- `source` is None for deletes
+    :param chunk_size: the maximum number of actions per chunk
+    :param max_bytes: the maximum (approximate) body size in bytes per chunk
+    :param errors: collects a bulk response style error item (status 400) for every action that cannot be
+        serialized, the action is left out -- if None, the `SerializationError` is raised
+    :return: a generator of `(body, actions)` tuples where `body` is the ndjson request body
+    """
+    dumps = serializer.dumps
+    ascii_only = getattr(serializer, 'ensure_ascii', False)
+    buffer = StringIO()
+    chunk = []
+    size = 0
+    for action, source in actions:
+        try:
+            action_line = dumps(action)
+            source_line = dumps(source) if source is not None else None
+        except SerializationError as e:
+            if errors is None:
+                raise
+            op_type, meta = next(iter(action.items()))
+            logging.error('bulk action %s %s not serializable: %s', op_type, meta.get('_id'), e)
+            errors.append({op_type: dict(meta, error=str(e), status=400)})
+            continue
+        if ascii_only:
+            data_size = len(action_line) + (len(source_line) + 2 if source_line is not None else 1)
+        else:
+            data_size = len(action_line.encode('utf-8')) + 1
+            if source_line is not None:
+                data_size += len(source_line.encode('utf-8')) + 1
+
+        # flush the current chunk if this action would overflow it
+        if chunk and (len(chunk) >= chunk_size or size + data_size > max_bytes):
+            yield buffer.getvalue(), chunk
+            buffer = StringIO()
+            chunk, size = [], 0
+
+        buffer.write(action_line)
+        buffer.write('\n')
+        if source_line is not None:
+            buffer.write(source_line)
+            buffer.write('\n')
+        chunk.append(action)
+        size += data_size
+
+    if chunk:
+        yield buffer.getvalue(), chunk
+
+
+def send_bulk(es: Elasticsearch, actions, chunk_size: int=DEFAULT_CHUNK_SIZE, max_bytes: int=DEFAULT_MAX_BYTES,
+              refresh: bool or str=False, **kwargs: dict) -> dict:
+    """sends actions through the elasticsearch bulk endpoint in size bounded chunks
+
+    failures are collected per item -- a failing item, a failing chunk or an action that cannot be serialized
+    never aborts the remaining chunks
+
+    :param es: the elasticsearch client
+    :param actions: iterable of `(action, source)` pairs -- see `chunk_actions`
+    :param chunk_size: the maximum number of actions per request
+    :param max_bytes: the maximum body size in bytes per request
+    :param refresh: the refresh policy -- if set, the written indices are refreshed once after the last request,
+        whether or not the requests succeeded
+    :param kwargs: additional bulk request parameters
+    :return: {'success', 'failed', 'errors'}
+    """
+    result = {'success': 0, 'failed': 0, 'errors': []}
+    serialization_errors = []
+    index_names = set()
+
+    for body, chunk in chunk_actions(es.transport.serializer, actions, chunk_size, max_bytes, serialization_errors):
+        index_names.update(next(iter(action.values())).get('_index', kwargs.get('index')) for action in chunk)
+        with timed(PHASE_BULK_CHUNK, actions=len(chunk), bytes=len(body)) as stats:
+            try:
+                res = es.bulk(body, **kwargs)
+            except TransportError as e:
+                logging.error('bulk request of %s actions failed: %s', len(chunk), e)
+                result['failed'] += len(chunk)
+                stats['failed'] = len(chunk)
+                for action in chunk:
+                    op_type, meta = next(iter(action.items()))
+                    result['errors'].append({op_type: dict(meta, error=str(e), status=e.status_code)})
+                continue
+
+            stats['failed'] = 0
+            for item in res.get('items', []):
+                op_type, info = next(iter(item.items()))
+                if is_failure(op_type, info):
+                    result['failed'] += 1
+                    stats['failed'] += 1
+                    result['errors'].append(item)
+                else:
+                    result['success'] += 1
+
+    result['failed'] += len(serialization_errors)
+    result['errors'] += serialization_errors
+
+    # one refresh of everything written, even if the last requests failed
+    index_names.discard(None)
+    if refresh and index_names:
+        try:
+            es.indices.refresh(index=','.join(sorted(index_names)))
+        except TransportError as e:
+            logging.error('refresh of %s after bulk request failed: %s', ', '.join(sorted(index_names)), e)
+
+    logging.debug('bulk result: %s succeeded, %s failed', result['success'], result['failed'])
+    return result
+
+
+def is_retryable(info: dict) -> bool:
+    """checks if a failed bulk response item may succeed when sent again
+
+    :param info: the bulk response item information
+    :return: True for transport errors (no http status), 429 and 5xx statuses
+    """
+    status = info.get('status')
+    return not isinstance(status, int) or status == 429 or status >= 500
+
+
+def is_failure(op_type: str, info: dict) -> bool:
+    """checks if a bulk response item failed -- deleting a missing document and creating an existing one are not
+    failures
+
+    :param op_type: the bulk operation type (index, create, delete, ...)
+    :param info: the bulk response item information
+    :return: True if the item failed
+    """
+    status = info.get('status', 200)
+    if op_type == 'delete' and status == 404 or op_type == 'create' and status == 409:
+        return False
+    return 'error' in info or status >= 300
@@ -0,0 +1,361 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.base import ModelBase
+
+
+##
+# constants
+
+DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_ENTRIES = 1024
+KEY_PREFIX = 'djelastic'
+
+
+##
+# live search caches -- every one of them is invalidated by writes
+
+_search_caches = weakref.WeakSet()
+_default_cache = {}
+_default_cache_lock = threading.Lock()
+
+
+##
+# backends
+
+class LRUCacheBackend(object):
+    """
+    in-process least recently used cache with per entry expiry
+    """
+
+    def __init__(self, max_entries: int or None=DEFAULT_MAX_ENTRIES):
+        """initializes an empty cache
+
+        :param max_entries: the number of entries kept before the least recently used ones are evicted, None for
+            no limit
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> object:
+        """reads an entry
+
+        :param key: the cache key
+        :return: the value, or None if missing or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys: [str]) -> dict:
+        """reads several entries
+
+        :param keys: the cache keys
+        :return: {key: value} of the entries found
+        """
+        values = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                values[key] = value
+        return values
+
+    def set(self, key: str, value: object, timeout: float=None):
+        """writes an entry
+
+        :param key: the cache key
+        :param value: the value
+        :param timeout: seconds until the entry expires, None for never
+        """
+        expires = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_many(self, values: dict, timeout: float=None):
+        """writes several entries
+
+        :param values: {key: value}
+        :param timeout: seconds until the entries expire, None for never
+        """
+        for key, value in values.items():
+            self.set(key, value, timeout)
+
+    def delete_many(self, keys: [str]):
+        """drops several entries
+
+        :param keys: the cache keys
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def add(self, key: str, value: object, timeout: float=None) -> bool:
+        """writes an entry unless there already is one
+
+        :param key: the cache key
+        :param value: the value
+        :param timeout: seconds until the entry expires, None for never
+        :return: True if the entry was written
+        """
+        with self._lock:
+            if key in self._entries:
+                return False
+        self.set(key, value, timeout)
+        return True
+
+    def incr(self, key: str) -> int:
+        """increments an integer entry
+
+        :param key: the cache key
+        :return: the new value
+        :raise ValueError: if there is no entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                raise ValueError('Key {} not found'.format(key))
+            self._entries[key] = (entry[0], entry[1] + 1)
+            return entry[1] + 1
+
+    def clear(self):
+        """drops all entries
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+
+
+class DjangoCacheBackend(object):
+    """
+    cache backed by one of the project's django caches -- shared between processes
+    """
+
+    def __init__(self, alias: str='default'):
+        """initializes the backend
+
+        :param alias: the name of the cache in the `CACHES` django setting
+        """
+        self.cache = caches[alias]
+
+    def get(self, key: str) -> object:
+        return self.cache.get(key)
+
+    def get_many(self, keys: [str]) -> dict:
+        return self.cache.get_many(keys)
+
+    def set(self, key: str, value: object, timeout: float=None):
+        self.cache.set(key, value, timeout)
+
+    def set_many(self, values: dict, timeout: float=None):
+        self.cache.set_many(values, timeout)
+
+    def delete_many(self, keys: [str]):
+        self.cache.delete_many(keys)
+
+    def add(self, key: str, value: object, timeout: float=None) -> bool:
+        return self.cache.add(key, value, timeout)
+
+    def incr(self, key: str) -> int:
+        return self.cache.incr(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+##
+# objects
+
+class SearchCache(object):
+    """
+    caches search results, invalidated by per index and per doc type generation counters
+
+    every write through a ModelIndexer bumps the generation of its index and doc type (see `invalidate`). the
+    generations are part of the cache keys, so results cached before the last write are never served again. make the
+    key of a search once, before searching, and pass it to both `get` and `set` -- results of a search racing a write
+    are then stored under the generation they were read at, never under the one after the write.
+
+    with an in-process `LRUCacheBackend` the generations are kept apart from the results, in a backend without an
+    entry limit: an evicted generation would start over and could make the key of stale results current again.
+    """
+
+    def __init__(self, backend: object=None, timeout: float=DEFAULT_TIMEOUT):
+        """initializes a new cache
+
+        :param backend: an `LRUCacheBackend`, a `DjangoCacheBackend` or anything with the same methods
+        :param timeout: seconds until cached results expire
+        """
+        self.backend = backend if backend is not None else LRUCacheBackend()
+        # shared backends keep the generations next to the results, so every process sees the same ones
+        self.generations = LRUCacheBackend(None) if isinstance(self.backend, LRUCacheBackend) else self.backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        _search_caches.add(self)
+
+    def make_key(self, index_name: str, doc_type: str or None, *key_parts: object) -> str:
+        """creates the cache key of a search
+
+        :param index_name: the searched index
+        :param doc_type: the searched doc type, None if all doc types are searched
+        :param key_parts: everything else the results depend on -- query, filters, page, ... -- django models in
+            them (e.g. the keys of `only` and `defer` dicts) are keyed by their `app_label.model_name`
+        :return: the cache key, including the current generations
+        """
+        if doc_type is None:
+            generation = (self._get_generation(('epoch', index_name)), self._get_generation(('index', index_name)))
+        else:
+            generation = (self._get_generation(('epoch', index_name)),
+                          self._get_generation(('type', index_name, doc_type)))
+        data = json.dumps([index_name, doc_type, _make_key_part(key_parts)], sort_keys=True, default=str)
+        digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+        return '{}:search:{}:{}:{}'.format(KEY_PREFIX, digest, *generation)
+
+    def get(self, key: str) -> object:
+        """reads cached results
+
+        :param key: the cache key -- see `make_key`
+        :return: the results, or None on a miss
+        """
+        data = self.backend.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(data)
+
+    def set(self, key: str, value: object):
+        """caches results -- they are pickled, so callers never share (and mutate) the cached objects
+
+        :param key: the cache key made before searching -- see `make_key`
+        :param value: the results
+        """
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self.backend.set(key, data, self.timeout)
+
+    def bump(self, index_name: str, doc_type: str=None):
+        """invalidates the cached results of a doc type and of whole index searches
+
+        :param index_name: the written index
+        :param doc_type: the written doc type -- if None, every doc type of the index is invalidated
+        """
+        scopes = [('index', index_name)]
+        scopes.append(('type', index_name, doc_type) if doc_type is not None else ('epoch', index_name))
+        for scope in scopes:
+            key = self._make_generation_key(scope)
+            try:
+                self.generations.incr(key)
+            except ValueError:
+                self._get_generation(scope)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """reports the cache usage of this process
+
+        :return: {'hits', 'misses', 'hit_ratio', 'invalidations'}
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+    ##
+    # internal methods
+
+    def _make_generation_key(self, scope: tuple) -> str:
+        """creates the cache key of a generation counter
+
+        :param scope: ('epoch', index), ('index', index) or ('type', index, doc type)
+        :return: the cache key
+        """
+        return '{}:generation:{}'.format(KEY_PREFIX, ':'.join(scope))
+
+    def _get_generation(self, scope: tuple) -> int:
+        """reads (or initializes) a generation counter
+
+        missing counters start at the current time in milliseconds, so an evicted counter never goes back to a
+        value older cache entries were stored under
+
+        :param scope: ('epoch', index), ('index', index) or ('type', index, doc type)
+        :return: the generation
+        """
+        key = self._make_generation_key(scope)
+        generation = self.generations.get(key)
+        if generation is None:
+            self.generations.add(key, int(time.time() * 1000), None)
+            generation = self.generations.get(key)
+        return generation
+
+
+##
+# functions
+
+def get_search_cache() -> SearchCache or None:
+    """gets the search cache configured by `ES_SEARCH_CACHE` in django project settings, e.g.::
+
+        ES_SEARCH_CACHE = {'BACKEND': 'django', 'ALIAS': 'default', 'TIMEOUT': 60}
+        ES_SEARCH_CACHE = {'BACKEND': 'lru', 'MAX_ENTRIES': 1024, 'TIMEOUT': 60}
+
+    the `lru` backend lives in process, so it is only invalidated by writes of the same process -- use the `django`
+    backend with a shared cache when other processes write to the index
+
+    :return: the process wide cache, or None if the setting is missing
+    """
+    config = getattr(settings, 'ES_SEARCH_CACHE', None)
+    if config is None:
+        return None
+
+    with _default_cache_lock:
+        if 'cache' not in _default_cache:
+            if config.get('BACKEND', 'lru') == 'django':
+                backend = DjangoCacheBackend(config.get('ALIAS', 'default'))
+            else:
+                backend = LRUCacheBackend(config.get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+            _default_cache['cache'] = SearchCache(backend, config.get('TIMEOUT', DEFAULT_TIMEOUT))
+        return _default_cache['cache']
+
+
+def invalidate(index_name: str, doc_type: str=None):
+    """bumps the generations of an index (and doc type) in every search cache
+
+    :param index_name: the written index
+    :param doc_type: the written doc type -- if None, every doc type of the index is invalidated
+    """
+    get_search_cache()
+    for cache in list(_search_caches):
+        cache.bump(index_name, doc_type)
+
+
+def _make_key_part(value: object) -> object:
+    """turns a search cache key part into something json can encode with sorted keys
+
+    :param value: a key part -- dicts may be keyed by django models, e.g. `only` and `defer`
+    :return: the value with models replaced by their `app_label.model_name` and every dict key a string
+    """
+    if isinstance(value, ModelBase):
+        return '{}.{}'.format(value._meta.app_label, value._meta.model_name)
+    if isinstance(value, dict):
+        return dict((str(_make_key_part(key)), _make_key_part(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [_make_key_part(item) for item in value]
+    return value
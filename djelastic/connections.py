@@ -0,0 +1,244 @@
+import gzip
+import logging
+import threading
+
+from django.conf import settings
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+from elasticsearch import Elasticsearch
+from elasticsearch.connection.base import logger, tracer
+
+from .errors import ConfigurationError
+from .instrumentation import InstrumentedConnection
+from .serializers import get_serializer
+
+
+##
+# constants
+
+DEFAULT_ALIAS = 'default'
+DEFAULT_COMPRESS_LEVEL = 1
+CONNECTION_SETTINGS = ('ES_CONNECTIONS', 'ES_HOSTS', 'ES_TRANSPORT', 'ES_KWARGS')
+
+
+##
+# objects
+
+class GzipConnection(InstrumentedConnection):
+    """
+    elasticsearch connection sending gzip compressed request bodies -- elasticsearch decompresses them on its own
+
+    responses are asked for compressed too, elasticsearch only compresses them with `http.compression` enabled.
+    compression trades cpu for network bytes: worth it for bulk requests to remote clusters, rarely on localhost.
+    """
+
+    def __init__(self, host: str='localhost', port: int=9200, compress_level: int=DEFAULT_COMPRESS_LEVEL,
+                 **kwargs: dict):
+        """initializes a new connection
+
+        :param host: the host name
+        :param port: the port
+        :param compress_level: the gzip level, 1 (fastest) to 9 (smallest)
+        :param kwargs: additional connection arguments
+        """
+        super(GzipConnection, self).__init__(host, port, **kwargs)
+        self.compress_level = compress_level
+        self.headers.update({'content-encoding': 'gzip', 'accept-encoding': 'gzip'})
+
+    def perform_request(self, method: str, url: str, params: dict=None, body: bytes=None, timeout: float=None,
+                        ignore: (int,)=()) -> (int, dict, str):
+        if body:
+            body = gzip.compress(body, self.compress_level)
+        return super(GzipConnection, self).perform_request(method, url, params, body, timeout, ignore)
+
+    def log_request_success(self, method: str, full_url: str, path: str, body: bytes, status_code: int,
+                            response: str, duration: float):
+        body = self._get_logged_body(body, logging.DEBUG)
+        super(GzipConnection, self).log_request_success(method, full_url, path, body, status_code, response, duration)
+
+    def log_request_fail(self, method: str, full_url: str, body: bytes, duration: float, status_code: int=None,
+                         exception: Exception=None):
+        body = self._get_logged_body(body, logging.INFO)
+        super(GzipConnection, self).log_request_fail(method, full_url, body, duration, status_code, exception)
+
+    ##
+    # internal methods
+
+    @staticmethod
+    def _get_logged_body(body: bytes, level: int) -> bytes or None:
+        """decompresses a request body for the client's loggers -- only if they log it at all
+
+        :param body: the compressed body
+        :param level: the level the client logs bodies at
+        :return: the original body, None if no logger shows it
+        """
+        if body and (logger.isEnabledFor(level) or tracer.isEnabledFor(logging.INFO)):
+            return gzip.decompress(body)
+        return None
+
+
+class ConnectionRegistry(object):
+    """
+    process wide registry of named elasticsearch clients
+
+    clients are created lazily from the `ES_CONNECTIONS` django setting, e.g.::
+
+        ES_CONNECTIONS = {
+            'default': {'hosts': ['localhost:9200'], 'timeout': 5},
+            'search': 'default',  # an alias of another connection
+        }
+
+    if `ES_CONNECTIONS` is not set, the `default` connection falls back to `ES_HOSTS`, `ES_TRANSPORT` and
+    `ES_KWARGS`. every client keeps its own connection pool, so sharing one client per cluster keeps keep-alive
+    sockets warm across requests. `transport_class`, `connection_class` and `serializer` may be dotted paths -- the
+    connection class defaults to `instrumentation.InstrumentedConnection`, which reports every request, or to
+    `GzipConnection` with `'compress': True` (see `compress_level`). `serializers.FastJSONSerializer` is a faster
+    serializer than the client's default.
+    """
+
+    def __init__(self):
+        """initializes an empty registry
+        """
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_connection(self, alias: str=DEFAULT_ALIAS) -> Elasticsearch:
+        """gets (or lazily creates) the client registered under `alias`
+
+        :param alias: the connection name
+        :return: the shared client
+        :raise ConfigurationError: if there is no configuration for the alias
+        """
+        # fast path -- no locking once the client exists
+        try:
+            return self._clients[alias]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if alias not in self._clients:
+                self._clients[alias] = self._create_connection(alias)
+            return self._clients[alias]
+
+    def add_connection(self, alias: str, es: Elasticsearch):
+        """registers an already created client under `alias`
+
+        :param alias: the connection name
+        :param es: the client
+        """
+        with self._lock:
+            self._clients[alias] = es
+
+    def reset(self):
+        """drops all clients -- they are recreated on next use (e.g. after forking a worker process)
+        """
+        with self._lock:
+            self._clients = {}
+
+    ##
+    # internal methods
+
+    def _create_connection(self, alias: str, seen: tuple=()) -> Elasticsearch:
+        """creates the client for `alias` -- must be called with the lock held
+
+        :param alias: the connection name
+        :param seen: aliases already followed, to detect cycles
+        :return: a new (or, for aliases of aliases, the shared) client
+        :raise ConfigurationError: if there is no configuration for the alias
+        """
+        config = self._get_config(alias)
+
+        # alias of another connection
+        if isinstance(config, str):
+            if config in seen:
+                raise ConfigurationError('Circular elasticsearch connection alias {}'.format(alias))
+            if config not in self._clients:
+                self._clients[config] = self._create_connection(config, seen + (alias,))
+            return self._clients[config]
+
+        kwargs = dict(config)
+        for key in ('transport_class', 'connection_class'):
+            if isinstance(kwargs.get(key), str):
+                kwargs[key] = import_string(kwargs[key])
+        if kwargs.get('serializer') is not None:
+            kwargs['serializer'] = get_serializer(kwargs['serializer'])
+        compress = kwargs.pop('compress', False)
+        kwargs.setdefault('connection_class', GzipConnection if compress else InstrumentedConnection)
+        logging.debug('connecting to elasticsearch for connection %s', alias)
+        return Elasticsearch(**kwargs)
+
+    @staticmethod
+    def _get_config(alias: str) -> dict or str:
+        """gets the client configuration for `alias` from django project settings
+
+        :param alias: the connection name
+        :return: the client keyword arguments, or the name of another connection
+        :raise ConfigurationError: if there is no configuration for the alias
+        """
+        connections = getattr(settings, 'ES_CONNECTIONS', None)
+        if connections is not None:
+            if alias in connections:
+                return connections[alias]
+
+        # legacy settings
+        elif alias == DEFAULT_ALIAS and hasattr(settings, 'ES_HOSTS'):
+            config = {'hosts': settings.ES_HOSTS}
+            if hasattr(settings, 'ES_TRANSPORT'):
+                config['transport_class'] = settings.ES_TRANSPORT
+            config.update(getattr(settings, 'ES_KWARGS', {}))
+            return config
+
+        # raise exception -- no config found
+        logging.error('no elasticsearch connection information found for {}'.format(alias))
+        raise ConfigurationError('No elasticsearch connection information found for {}'.format(alias))
+
+
+##
+# registry
+
+connections = ConnectionRegistry()
+
+
+##
+# functions
+
+def get_connection(es: Elasticsearch or str=None) -> Elasticsearch:
+    """resolves a client or a connection name to a client
+
+    :param es: a client, a connection name or None for the default connection
+    :return: the client
+    """
+    if es is None:
+        es = DEFAULT_ALIAS
+    if isinstance(es, str):
+        return connections.get_connection(es)
+    return es
+
+
+def get_connection_config(alias: str=DEFAULT_ALIAS) -> dict:
+    """gets the client configuration of a connection from django project settings, following connections that
+    are aliases of others
+
+    :param alias: the connection name
+    :return: the client keyword arguments
+    :raise ConfigurationError: if there is no configuration for the alias, or the aliases are circular
+    """
+    config, seen = connections._get_config(alias), (alias,)
+    while isinstance(config, str):
+        if config in seen:
+            raise ConfigurationError('Circular elasticsearch connection alias {}'.format(alias))
+        seen += (config,)
+        config = connections._get_config(config)
+    return config
+
+
+def _reset_connections(setting: str, **kwargs: dict):
+    """drops every client once the connection settings change, e.g. with `override_settings`
+
+    :param setting: the name of the changed setting
+    """
+    if setting in CONNECTION_SETTINGS:
+        connections.reset()
+
+
+setting_changed.connect(_reset_connections, dispatch_uid='djelastic.connections.reset_connections')
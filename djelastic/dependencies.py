@@ -0,0 +1,272 @@
+"""
+reindexing of the documents that denormalize related models -- e.g. the articles of an author who got renamed
+
+indexers read related models through dotted sources (`author.name`, `tags.name`, collected per indexer class in
+`_related_sources`). once `connect`-ed, saves, deletes and many-to-many changes of those related models reindex the
+dependent documents only: the dependent pks are looked up with one query per relation when the transaction commits,
+however often the related rows changed within it, and handed to the indexing queue (see `autoindex`). outside of
+atomic blocks, the dependents are looked up right away (see `autoindex.run_on_commit`).
+
+rows of reverse relationships (e.g. the articles of an indexed author) name their dependent through their own foreign
+key, so they cost no lookup at all -- and a row moving to another parent reindexes the old parent as well.
+
+call `connect` once the apps are loaded, e.g. in `AppConfig.ready`.
+"""
+import logging
+import threading
+
+from django.db.models.base import ModelBase
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from .autoindex import get_index_queue, run_on_commit
+from .indexers import indexer_classes
+
+
+##
+# reverse dependency index -- {related model: [(indexer class, relationship name, attribute names)]}, the foreign
+# keys of reverse relationships by (indexer class, relationship name) and the many-to-many relationships by through
+# model
+
+_dependencies = {'count': 0, 'mapping': {}, 'links': {}, 'through': {}}
+
+
+##
+# changes pending until the transaction commits, per thread
+
+_local = threading.local()
+
+
+##
+# functions
+
+def connect():
+    """reindexes dependent documents on saves, deletes and many-to-many changes of related models from now on
+    """
+    pre_save.connect(_on_pre_save, dispatch_uid='djelastic.dependencies.pre_save')
+    post_save.connect(_on_save, dispatch_uid='djelastic.dependencies.save')
+    pre_delete.connect(_on_pre_delete, dispatch_uid='djelastic.dependencies.pre_delete')
+    post_delete.connect(_on_post_delete, dispatch_uid='djelastic.dependencies.post_delete')
+    m2m_changed.connect(_on_m2m_changed, dispatch_uid='djelastic.dependencies.m2m_changed')
+
+
+def disconnect():
+    """stops reindexing dependent documents -- pending changes are still flushed on commit
+    """
+    pre_save.disconnect(dispatch_uid='djelastic.dependencies.pre_save')
+    post_save.disconnect(dispatch_uid='djelastic.dependencies.save')
+    pre_delete.disconnect(dispatch_uid='djelastic.dependencies.pre_delete')
+    post_delete.disconnect(dispatch_uid='djelastic.dependencies.post_delete')
+    m2m_changed.disconnect(dispatch_uid='djelastic.dependencies.m2m_changed')
+
+
+def get_dependencies(model: ModelBase) -> [(type, str, frozenset)]:
+    """looks up the registered indexers reading a related model through dotted sources
+
+    :param model: the related django model
+    :return: (indexer class, relationship name on its `Meta.model`, attribute names read) tuples
+    """
+    return _load_dependencies()['mapping'].get(model, [])
+
+
+def find_dependents(indexer_class: type, relation: str, related_pks) -> list:
+    """finds the rows reading some related rows -- one query
+
+    :param indexer_class: the indexer class
+    :param relation: the relationship name on the indexer's `Meta.model`
+    :param related_pks: the pks of the related rows
+    :return: the pks of the dependent rows
+    """
+    queryset = indexer_class.Meta.model._default_manager.filter(**{'{}__in'.format(relation): list(related_pks)})
+    return list(queryset.values_list('pk', flat=True).distinct())
+
+
+def flush(pending: dict=None) -> dict:
+    """looks up the dependents of pending changes and queues them for reindexing
+
+    :param pending: the changes to flush -- defaults to those pending in this thread
+    :return: {indexer class: set of queued pks}
+    """
+    if pending is None:
+        pending = getattr(_local, 'pending', None)
+    if pending is None or pending['flushed']:
+        return {}
+    pending['flushed'] = True
+
+    pks = pending['pks']
+    for (indexer_class, relation), related_pks in pending['relations'].items():
+        pks.setdefault(indexer_class, set()).update(find_dependents(indexer_class, relation, related_pks))
+    for indexer_class, class_pks in pks.items():
+        if class_pks:
+            get_index_queue().put(indexer_class, class_pks)
+            logging.debug('queued %s dependents of %s', len(class_pks), indexer_class.__name__)
+    return pks
+
+
+def _load_dependencies() -> dict:
+    """gets the reverse dependency index -- rebuilt whenever more indexers got registered
+
+    :return: {'count', 'mapping', 'links', 'through'}
+    """
+    if _dependencies['count'] != len(indexer_classes):
+        mapping, links, through = {}, {}, {}
+        for indexer_class in list(indexer_classes.values()):
+            for name, attrs in indexer_class._related_sources.items():
+                related_model, link, through_model = _get_relation(indexer_class.Meta.model, name)
+                if link is not None:
+                    links[(indexer_class, name)] = link
+                    attrs |= frozenset([link[0]])
+                mapping.setdefault(related_model, []).append((indexer_class, name, attrs))
+                if through_model is not None:
+                    through.setdefault(through_model, []).append((indexer_class, name))
+        _dependencies.update(mapping=mapping, links=links, through=through, count=len(indexer_classes))
+    return _dependencies
+
+
+def _get_relation(model: ModelBase, name: str) -> (ModelBase, (str, str) or None, ModelBase or None):
+    """resolves a relationship of a dotted source
+
+    :param model: the indexed django model
+    :param name: the relationship name, e.g. `author`
+    :return: the related model, (name, attname) of its foreign key linking back (for reverse foreign keys) and the
+        through model (for many-to-many relationships)
+    """
+    field = model._meta.get_field(str(name))
+    related_model = getattr(field, 'related_model', None) or field.rel.to
+
+    # reverse relationships are described by the field of the related model
+    through = getattr(field, 'through', None)
+    if through is None:
+        through = getattr(getattr(field, 'remote_field', None) or getattr(field, 'rel', None), 'through', None)
+    if through is not None:
+        return related_model, None, through
+    if getattr(field, 'auto_created', False) and not getattr(field, 'concrete', True):
+        return related_model, (field.field.name, field.field.attname), None
+    return related_model, None, None
+
+
+def _get_pending() -> dict:
+    """gets the changes pending in this thread
+
+    :return: {'relations': {(indexer class, relationship name): related pks}, 'pks': {indexer class: pks},
+        'flushed'}
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None or pending['flushed']:
+        pending = _local.pending = {'relations': {}, 'pks': {}, 'flushed': False}
+    return pending
+
+
+def _schedule(using: str=None):
+    """flushes the pending changes when the transaction commits (see `autoindex.run_on_commit`)
+
+    every change schedules a flush, the first one to run flushes them all. changes of a rolled back transaction
+    are flushed with the next commit, which only reindexes documents that did not change.
+
+    :param using: the database alias
+    """
+    pending = _get_pending()
+    run_on_commit(lambda: flush(pending), using)
+
+
+def _queue_pks(indexer_class: type, pks):
+    """adds dependent rows to the changes pending in this thread
+
+    :param indexer_class: the indexer class
+    :param pks: the pks of the dependent rows -- None values are ignored
+    """
+    _get_pending()['pks'].setdefault(indexer_class, set()).update(pk for pk in pks if pk is not None)
+
+
+def _queue_related(indexer_class: type, relation: str, related_pk: object):
+    """adds a changed related row to the changes pending in this thread -- its dependents are looked up on flush
+
+    :param indexer_class: the indexer class
+    :param relation: the relationship name on the indexer's `Meta.model`
+    :param related_pk: the pk of the related row
+    """
+    _get_pending()['relations'].setdefault((indexer_class, relation), set()).add(related_pk)
+
+
+def _on_pre_save(sender: ModelBase, instance: object, raw: bool=False, using: str=None,
+                 update_fields: frozenset=None, **kwargs):
+    """collects the old parents of a row about to move to other ones through reverse foreign keys -- one query
+    """
+    if raw or instance._state.adding:
+        return
+    links = []
+    for indexer_class, relation, attrs in get_dependencies(sender):
+        link = _dependencies['links'].get((indexer_class, relation))
+        if link is not None and (update_fields is None or link[0] in update_fields):
+            links.append((indexer_class, link))
+    if not links:
+        return
+
+    old = sender._base_manager.using(using).filter(pk=instance.pk).values(*set(name for _, (name, _) in links))
+    for values in old:
+        for indexer_class, (name, attname) in links:
+            if values[name] != getattr(instance, attname):
+                _queue_pks(indexer_class, [values[name]])
+
+
+def _on_save(sender: ModelBase, instance: object, update_fields: frozenset=None, using: str=None, **kwargs):
+    """collects the dependents of a saved row -- saves updating none of the read attributes are ignored
+    """
+    dependencies = get_dependencies(sender)
+    if not dependencies:
+        return
+
+    scheduled = False
+    for indexer_class, relation, attrs in dependencies:
+        if update_fields is not None and not attrs.intersection(update_fields):
+            continue
+        link = _dependencies['links'].get((indexer_class, relation))
+        if link is not None:
+            _queue_pks(indexer_class, [getattr(instance, link[1])])
+        else:
+            _queue_related(indexer_class, relation, instance.pk)
+        scheduled = True
+    if scheduled:
+        _schedule(using)
+
+
+def _on_pre_delete(sender: ModelBase, instance: object, using: str=None, **kwargs):
+    """collects the dependents of a row about to be deleted
+
+    rows of reverse foreign keys name their dependent themselves. other dependents are looked up now: the deletion
+    removes the links (many-to-many rows, cascades, nulled foreign keys) before any post_delete is sent.
+    """
+    for indexer_class, relation, _ in get_dependencies(sender):
+        link = _dependencies['links'].get((indexer_class, relation))
+        if link is not None:
+            _queue_pks(indexer_class, [getattr(instance, link[1])])
+        else:
+            _queue_pks(indexer_class, find_dependents(indexer_class, relation, [instance.pk]))
+
+
+def _on_post_delete(sender: ModelBase, instance: object, using: str=None, **kwargs):
+    """schedules the reindex of the dependents of a deleted row
+    """
+    if get_dependencies(sender):
+        _schedule(using)
+
+
+def _on_m2m_changed(sender: ModelBase, instance: object, action: str, pk_set: set=None, using: str=None, **kwargs):
+    """collects the dependents of added, removed or cleared many-to-many rows
+
+    the dependent is the changed row itself if it is the indexed one, otherwise the rows added or removed -- or, for
+    a clear, the rows linked before it, looked up with one query.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    scheduled = False
+    for indexer_class, relation in _load_dependencies()['through'].get(sender, ()):
+        if isinstance(instance, indexer_class.Meta.model):
+            _queue_pks(indexer_class, [instance.pk])
+        elif action == 'pre_clear':
+            _queue_pks(indexer_class, find_dependents(indexer_class, relation, [instance.pk]))
+        else:
+            _queue_pks(indexer_class, pk_set or ())
+        scheduled = True
+    if scheduled:
+        _schedule(using)
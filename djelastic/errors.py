@@ -1,2 +1,17 @@
 class ConfigurationError(Exception):
     pass
+
+
+class SearchError(Exception):
+    pass
+
+
+class ReindexError(Exception):
+    pass
+
+
+class RebuildError(Exception):
+
+    def __init__(self, message: str, result: dict):
+        super(RebuildError, self).__init__(message)
+        self.result = result
@@ -1,6 +1,16 @@
-from datetime import date, datetime
+import re
+from datetime import date, datetime, timedelta, timezone
 
-from django.utils import timezone
+
+##
+# iso 8601 parsing -- `YYYY-MM-DD`, optionally followed by `THH:MM[:SS[.fraction]]` and `Z` or a `+HH[:MM]` offset
+
+ISO_8601 = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d+))?)?\s*(Z|[+-]\d{2}(?::?\d{2})?)?)?$'
+)
+
+_timezones = {'Z': timezone.utc, '+00:00': timezone.utc, None: timezone.utc}
 
 
 class IndexableField(object):
@@ -8,19 +18,27 @@ class IndexableField(object):
     maps python to es field types
     """
 
+    __slots__ = ('source', '_attrs')
     _type = None
-    _attrs = []
 
     def __init__(self, source: str, **kwargs: dict):
-        """initializes the field and sets internal attributes of the object
+        """initializes the field and keeps the mapping attributes of this instance
 
         :param source: the django model attribute to source the data from
         :param kwargs: `dict` of mapping information about field mapping attributes
         """
         self.source = source
-        for key, value in kwargs.items():
-            self._attrs.append(key)
-            setattr(self, key, value)
+        self._attrs = kwargs
+
+    def __getattr__(self, name: str) -> object:
+        # mapping attributes read like regular attributes, e.g. `field.analyzer`
+        try:
+            return object.__getattribute__(self, '_attrs')[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self) -> str:
+        return '<{}: {}>'.format(type(self).__name__, self.source)
 
     def define_mapping(self) -> dict:
         """builds an elasticsearch field mapping definition
@@ -28,8 +46,7 @@ class IndexableField(object):
         :return: the elasticsearch field mapping declaration
         """
         definition = {'type': self._type}
-        for attr in self._attrs:
-            value = getattr(self, attr, None)
+        for attr, value in self._attrs.items():
             if value is not None:
                 definition[attr] = value
         return definition
@@ -55,12 +72,34 @@ class IndexableField(object):
         """
         raise NotImplementedError()
 
+    ##
+    # batch methods -- convert a whole column (e.g. one field of every document of a bulk chunk) at once
+
+    def to_es_many(self, values: list) -> list:
+        """converts values to elasticsearch types
+
+        :param values: the things to be indexed
+        :return: the values mapped to acceptable types in elasticsearch, None staying None
+        """
+        to_es = self.to_es
+        return [None if value is None else to_es(value) for value in values]
+
+    def to_python_many(self, values: list) -> list:
+        """converts values to python types
+
+        :param values: the things from the index
+        :return: the values mapped back to their original python types, None staying None
+        """
+        to_python = self.to_python
+        return [None if value is None else to_python(value) for value in values]
+
 
 class StringField(IndexableField):
     """
     maps string types
     """
 
+    __slots__ = ()
     _type = 'string'
 
     @staticmethod
@@ -75,12 +114,18 @@ class StringField(IndexableField):
             return None
         return str(value)
 
+    def to_es_many(self, values: list) -> list:
+        return [value if value is None or type(value) is str else str(value) for value in values]
+
+    to_python_many = to_es_many
+
 
 class IntegerField(IndexableField):
     """
     maps integer types
     """
 
+    __slots__ = ()
     _type = 'integer'
 
     @staticmethod
@@ -95,12 +140,18 @@ class IntegerField(IndexableField):
             return None
         return int(value)
 
+    def to_es_many(self, values: list) -> list:
+        return [value if value is None or type(value) is int else int(value) for value in values]
+
+    to_python_many = to_es_many
+
 
 class FloatField(IndexableField):
     """
     maps float types
     """
 
+    __slots__ = ()
     _type = 'float'
 
     @staticmethod
@@ -115,30 +166,45 @@ class FloatField(IndexableField):
             return None
         return float(value)
 
+    def to_es_many(self, values: list) -> list:
+        return [value if value is None or type(value) is float else float(value) for value in values]
+
+    to_python_many = to_es_many
+
 
 class DateField(IndexableField):
     """
     maps date types
     """
 
+    __slots__ = ()
     _type = 'date'
 
     @staticmethod
-    def to_es(value: type) -> str:
+    def to_es(value: type) -> str or None:
+        if value is None:
+            return None
         if isinstance(value, (date, datetime)):
             return value.isoformat()
         return str(value)
 
     @staticmethod
-    def to_python(value: type) -> datetime or None:
+    def to_python(value: type) -> datetime or date or None:
         if isinstance(value, str):
-            return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f+00:00')\
-                .replace(tzinfo=timezone.utc)
+            return parse_iso8601(value)
         elif isinstance(value, (date, datetime)):
             return value
         else:
             return str(value)
 
+    def to_es_many(self, values: list) -> list:
+        return [None if value is None else value.isoformat() if isinstance(value, date) else str(value)
+                for value in values]
+
+    def to_python_many(self, values: list) -> list:
+        return [parse_iso8601(value) if type(value) is str else value if value is None or isinstance(value, date)
+                else str(value) for value in values]
+
 
 ##
 # field constants
@@ -183,3 +249,58 @@ def get_es_type_mapping(source: str, django_type: str) -> dict or None:
     if es_type is None:
         return None
     return es_type(source).define_mapping()
+
+
+def get_converter(field: IndexableField, name: str) -> callable or None:
+    """gets a value converter of a field, unless its class keeps the (identity) one of `IndexableField`
+
+    :param field: the mapped field
+    :param name: the converter method -- 'to_es' or 'to_python'
+    :return: the bound converter, or None if the field class does not define one
+    """
+    converter = getattr(field, name)
+    if getattr(converter, '__func__', converter) is getattr(IndexableField, name):
+        return None
+    return converter
+
+
+def get_many_converter(field: IndexableField, name: str) -> callable:
+    """gets the batch converter of a field -- the per value loop of `IndexableField` if the field class overrides the
+    single value converter below the class whose batch converter it inherits, so both always convert alike
+
+    :param field: the mapped field
+    :param name: the single value converter method -- 'to_es' or 'to_python'
+    :return: the bound batch converter
+    """
+    many_name = '{}_many'.format(name)
+    mro = type(field).__mro__
+    owner = next(klass for klass in mro if name in klass.__dict__)
+    many_owner = next(klass for klass in mro if many_name in klass.__dict__)
+    if owner is not many_owner and issubclass(owner, many_owner):
+        return getattr(IndexableField, many_name).__get__(field)
+    return getattr(field, many_name)
+
+
+def parse_iso8601(value: str) -> datetime or date:
+    """parses an iso 8601 date or date and time
+
+    :param value: e.g. `2015-01-02`, `2015-01-02T03:04:05`, `2015-01-02T03:04:05.678+01:00` or `...Z`
+    :return: a date for date only values, else an aware datetime -- values without an offset are taken as utc
+    :raise ValueError: if the value is not iso 8601
+    """
+    match = ISO_8601.match(value)
+    if match is None:
+        raise ValueError('Invalid iso 8601 date: {}'.format(value))
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    if hour is None:
+        return date(int(year), int(month), int(day))
+
+    tzinfo = _timezones.get(offset)
+    if tzinfo is None:
+        digits = offset[1:].replace(':', '')
+        minutes = int(digits[:2]) * 60 + int(digits[2:] or 0)
+        tzinfo = timezone(timedelta(minutes=-minutes if offset[0] == '-' else minutes))
+        _timezones[offset] = tzinfo
+
+    microsecond = int(fraction[:6].ljust(6, '0')) if fraction else 0
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second or 0), microsecond, tzinfo)
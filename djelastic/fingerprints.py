@@ -0,0 +1,301 @@
+"""
+content fingerprints of written documents -- an indexer with a fingerprint store skips the writes of documents that
+did not change since they were last written, e.g. saves that only touched columns which are not indexed
+
+stores are configured by `ES_FINGERPRINTS` in django project settings (see `get_fingerprint_store`) or per indexer
+with `Meta.fingerprint_store`
+
+the in-process `lru` backend only knows the writes of its own process: as soon as another process (a second web
+worker, a reindex command, a celery task) writes the same index, its fingerprints are wrong and writes that would
+restore a document are skipped. use it for single-process writers only -- otherwise use the `django` backend with a
+shared cache, or the `document` backend.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.test.signals import setting_changed
+from elasticsearch import TransportError
+
+from .cache import KEY_PREFIX, DjangoCacheBackend, LRUCacheBackend
+
+
+##
+# constants
+
+DEFAULT_FIELD = 'es_fingerprint'
+DEFAULT_MAX_ENTRIES = 100000
+
+
+##
+# process wide stores, by name -- 'settings' for the `ES_FINGERPRINTS` store, 'process' for the in-process one
+
+_default_store = {}
+_default_store_lock = threading.Lock()
+
+
+##
+# objects
+
+class FingerprintStore(object):
+    """
+    remembers the fingerprint of every written document and counts the written and skipped documents of this process
+    """
+
+    def __init__(self):
+        """initializes a new store
+        """
+        self.written = 0
+        self.skipped = 0
+
+    def filter_changed(self, indexer, documents: [dict], force: bool=False) -> [(dict, str)]:
+        """drops the documents whose fingerprint is the one last written
+
+        :param indexer: the `ModelIndexer` writing the documents
+        :param documents: the documents
+        :param force: keep every document -- their fingerprints are still recorded with `record`
+        :return: (document, fingerprint) of every changed document, prepared for writing (see `prepare`)
+        """
+        fingerprints = [make_fingerprint(document) for document in documents]
+        known = {}
+        if documents and not force:
+            known = self.get_many(indexer, [document[indexer.model_pk_name] for document in documents])
+
+        changed = []
+        for document, fingerprint in zip(documents, fingerprints):
+            if known.get(str(document[indexer.model_pk_name])) == fingerprint:
+                continue
+            self.prepare(document, fingerprint)
+            changed.append((document, fingerprint))
+        self.skipped += len(documents) - len(changed)
+        return changed
+
+    def record(self, indexer, fingerprints: dict):
+        """records the fingerprints of written documents
+
+        :param indexer: the `ModelIndexer` that wrote the documents
+        :param fingerprints: {document id: fingerprint}
+        """
+        if fingerprints:
+            self.set_many(indexer, dict((str(doc_id), fingerprint) for doc_id, fingerprint in fingerprints.items()))
+        self.written += len(fingerprints)
+
+    def forget(self, indexer, doc_ids: list):
+        """drops the fingerprints of deleted documents
+
+        :param indexer: the `ModelIndexer` that deleted the documents
+        :param doc_ids: the document ids
+        """
+        if doc_ids:
+            self.delete_many(indexer, [str(doc_id) for doc_id in doc_ids])
+
+    def stats(self) -> dict:
+        """reports the write volume saved in this process
+
+        :return: {'written', 'skipped', 'skip_ratio'}
+        """
+        total = self.written + self.skipped
+        return {
+            'written': self.written,
+            'skipped': self.skipped,
+            'skip_ratio': self.skipped / total if total else 0.0,
+        }
+
+    ##
+    # store specific methods
+
+    def get_many(self, indexer, doc_ids: list) -> dict:
+        """reads the fingerprints of documents
+
+        :param indexer: the `ModelIndexer` writing the documents
+        :param doc_ids: the document ids
+        :return: {document id as str: fingerprint} of the known documents
+        """
+        raise NotImplementedError
+
+    def set_many(self, indexer, fingerprints: dict):
+        """writes the fingerprints of documents
+
+        :param indexer: the `ModelIndexer` that wrote the documents
+        :param fingerprints: {document id as str: fingerprint}
+        """
+        raise NotImplementedError
+
+    def delete_many(self, indexer, doc_ids: [str]):
+        """drops the fingerprints of documents
+
+        :param indexer: the `ModelIndexer` that deleted the documents
+        :param doc_ids: the document ids as str
+        """
+        raise NotImplementedError
+
+    def prepare(self, document: dict, fingerprint: str):
+        """adds whatever the store needs to a document about to be written -- nothing by default
+
+        :param document: the document
+        :param fingerprint: its fingerprint
+        """
+
+    def define_mapping(self) -> dict:
+        """gets the mapping of the fields `prepare` adds
+
+        :return: {field name: field mapping}
+        """
+        return {}
+
+
+class CacheFingerprintStore(FingerprintStore):
+    """
+    keeps the fingerprints in a cache backend -- in process (`LRUCacheBackend`, the default) or shared
+    (`DjangoCacheBackend`)
+
+    the cache knows nothing of the index: after an index was deleted or restored out of band, clear the cache or
+    write with `force`. evicted fingerprints only cost a redundant write.
+    """
+
+    def __init__(self, backend: object=None, timeout: float=None):
+        """initializes a new store
+
+        :param backend: an `LRUCacheBackend`, a `DjangoCacheBackend` or anything with the same methods
+        :param timeout: seconds until fingerprints expire, None for never
+        """
+        super(CacheFingerprintStore, self).__init__()
+        self.backend = backend if backend is not None else LRUCacheBackend(DEFAULT_MAX_ENTRIES)
+        self.timeout = timeout
+
+    def get_many(self, indexer, doc_ids: list) -> dict:
+        keys = dict((self._make_key(indexer, doc_id), str(doc_id)) for doc_id in doc_ids)
+        return dict((keys[key], fingerprint) for key, fingerprint in self.backend.get_many(list(keys)).items())
+
+    def set_many(self, indexer, fingerprints: dict):
+        self.backend.set_many(dict((self._make_key(indexer, doc_id), fingerprint)
+                                   for doc_id, fingerprint in fingerprints.items()), self.timeout)
+
+    def delete_many(self, indexer, doc_ids: [str]):
+        self.backend.delete_many([self._make_key(indexer, doc_id) for doc_id in doc_ids])
+
+    ##
+    # internal methods
+
+    @staticmethod
+    def _make_key(indexer, doc_id: object) -> str:
+        """creates the cache key of a document's fingerprint
+
+        :param indexer: the `ModelIndexer` writing the document
+        :param doc_id: the document id
+        :return: the cache key
+        """
+        return '{}:fingerprint:{}:{}:{}'.format(KEY_PREFIX, indexer.index_name, indexer.doc_type_name, doc_id)
+
+
+class DocumentFingerprintStore(FingerprintStore):
+    """
+    keeps the fingerprint in a stored, unindexed field of the document itself -- always in line with the index,
+    at the cost of a multi get before every write
+    """
+
+    def __init__(self, field: str=DEFAULT_FIELD):
+        """initializes a new store
+
+        :param field: the name of the document field holding the fingerprint
+        """
+        super(DocumentFingerprintStore, self).__init__()
+        self.field = field
+
+    def get_many(self, indexer, doc_ids: list) -> dict:
+        try:
+            res = indexer.es.mget({'ids': [str(doc_id) for doc_id in doc_ids]}, index=indexer.index_name,
+                                  doc_type=indexer.doc_type_name, _source_include=self.field)
+        except TransportError as e:
+            logging.warning('fingerprints of %s documents not read, writing all of them: %s', len(doc_ids), e)
+            return {}
+        return dict((doc['_id'], doc['_source'].get(self.field)) for doc in res.get('docs', [])
+                    if doc.get('found') and '_source' in doc)
+
+    def set_many(self, indexer, fingerprints: dict):
+        pass
+
+    def delete_many(self, indexer, doc_ids: [str]):
+        pass
+
+    def prepare(self, document: dict, fingerprint: str):
+        document[self.field] = fingerprint
+
+    def define_mapping(self) -> dict:
+        return {self.field: {'type': 'string', 'index': 'no'}}
+
+
+##
+# functions
+
+def make_fingerprint(document: dict) -> str:
+    """creates the fingerprint of a document -- independent of key order
+
+    :param document: the document, as built by the indexer
+    :return: the hex digest
+    """
+    data = json.dumps(document, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def get_fingerprint_store() -> FingerprintStore or None:
+    """gets the fingerprint store configured by `ES_FINGERPRINTS` in django project settings, e.g.::
+
+        ES_FINGERPRINTS = {'BACKEND': 'lru', 'MAX_ENTRIES': 100000}
+        ES_FINGERPRINTS = {'BACKEND': 'django', 'ALIAS': 'default', 'TIMEOUT': None}
+        ES_FINGERPRINTS = {'BACKEND': 'document', 'FIELD': 'es_fingerprint'}
+
+    with the setting, every indexer without a `Meta.fingerprint_store` of its own skips unchanged writes
+
+    :return: the process wide store, or None if the setting is missing
+    """
+    config = getattr(settings, 'ES_FINGERPRINTS', None)
+    if config is None:
+        return None
+    return _get_default_store('settings', config)
+
+
+def get_process_store() -> FingerprintStore:
+    """gets the in-process store used by indexers opting in with `Meta.fingerprint_store = True` when
+    `ES_FINGERPRINTS` is not configured
+
+    :return: the store
+    """
+    return _get_default_store('process', {'BACKEND': 'lru'})
+
+
+def _get_default_store(name: str, config: dict) -> FingerprintStore:
+    """gets (or lazily creates) a process wide store
+
+    :param name: the name of the store -- 'settings' or 'process'
+    :param config: the store configuration -- see `get_fingerprint_store`
+    :return: the store
+    """
+    with _default_store_lock:
+        if name not in _default_store:
+            backend = config.get('BACKEND', 'lru')
+            if backend == 'document':
+                store = DocumentFingerprintStore(config.get('FIELD', DEFAULT_FIELD))
+            elif backend == 'django':
+                store = CacheFingerprintStore(DjangoCacheBackend(config.get('ALIAS', 'default')),
+                                              config.get('TIMEOUT'))
+            else:
+                store = CacheFingerprintStore(LRUCacheBackend(config.get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+                                              config.get('TIMEOUT'))
+            _default_store[name] = store
+        return _default_store[name]
+
+
+def _reset_default_store(setting: str, **kwargs: dict):
+    """drops the `ES_FINGERPRINTS` store once the setting changes, e.g. with `override_settings`
+
+    :param setting: the name of the changed setting
+    """
+    if setting == 'ES_FINGERPRINTS':
+        with _default_store_lock:
+            _default_store.pop('settings', None)
+
+
+setting_changed.connect(_reset_default_store, dispatch_uid='djelastic.fingerprints.reset_default_store')
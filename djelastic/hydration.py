@@ -0,0 +1,198 @@
+import copy
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Model
+from django.db.models.base import ModelBase
+
+from .indexers import get_doc_type_indexers
+from .instrumentation import PHASE_HYDRATION, timed
+
+
+##
+# doc type -> django model resolution cache
+
+_doc_type_models = {}
+_doc_type_models_lock = threading.Lock()
+
+
+##
+# objects
+
+class Hydrator(object):
+    """
+    turns elasticsearch hits back into django model instances, keeping the elasticsearch order
+
+    rows are fetched with one `in_bulk` query per model -- concurrently, in threads, if several models are involved
+    and `concurrent` is set. worker threads use database connections of their own, which cannot see the rows of a
+    transaction that is not committed yet, so inside an atomic block rows are always fetched serially.
+    """
+
+    def __init__(self, only: [str] or dict=None, defer: [str] or dict=None, concurrent: bool=None):
+        """initializes a new hydrator
+
+        :param only: field names to load -- a list for every model or a {model: list} dict
+        :param defer: field names not to load -- a list for every model or a {model: list} dict
+        :param concurrent: query several models concurrently (outside of atomic blocks) -- defaults to
+            `ES_CONCURRENT_HYDRATION` in django project settings, then False
+        """
+        self.only = only
+        self.defer = defer
+        if concurrent is None:
+            concurrent = getattr(settings, 'ES_CONCURRENT_HYDRATION', False)
+        self.concurrent = concurrent
+
+    def hydrate(self, hits: [(str, str, float)]) -> [Model]:
+        """fetches the model instances of hits and attaches each hit's score as `es_score`
+
+        hits whose doc type has no model, or whose row no longer exists, are dropped
+
+        :param hits: (doc type, document id, score) of every hit, in elasticsearch order
+        :return: the model instances, in elasticsearch order
+        """
+        return self.hydrate_many([hits])[0]
+
+    def hydrate_many(self, hit_lists: [[(str, str, float)]]) -> [[Model]]:
+        """hydrates the hits of several searches together -- still one query per model
+
+        a row hit by more than one search is copied, so every instance carries the score of its own search
+
+        :param hit_lists: the hits of every search -- see `hydrate`
+        :return: the model instances of every search, in elasticsearch order
+        """
+        with timed(PHASE_HYDRATION, sender=type(self), searches=len(hit_lists)) as info:
+            instance_lists = self._hydrate_many(hit_lists)
+            info['hits'] = sum(len(instances) for instances in instance_lists)
+        return instance_lists
+
+    ##
+    # internal methods
+
+    def _hydrate_many(self, hit_lists: [[(str, str, float)]]) -> [[Model]]:
+        """hydrates the hits of several searches together -- see `hydrate_many`
+        """
+        # resolve models and pks
+        resolved_lists = []
+        pks_by_model = {}
+        for hits in hit_lists:
+            resolved = []
+            for doc_type, doc_id, score in hits:
+                model = get_model(doc_type)
+                if model is None:
+                    logging.warning('no model found for doc type %s', doc_type)
+                    continue
+                pk = model._meta.pk.to_python(doc_id)
+                resolved.append((model, pk, score))
+                pks_by_model.setdefault(model, set()).add(pk)
+            resolved_lists.append(resolved)
+
+        # fetch rows
+        if self.concurrent and len(pks_by_model) > 1 and not self._in_atomic_block(pks_by_model):
+            with ThreadPoolExecutor(max_workers=len(pks_by_model)) as executor:
+                futures = dict((model, executor.submit(self._fetch_in_thread, model, list(pks)))
+                               for model, pks in pks_by_model.items())
+                rows = dict((model, future.result()) for model, future in futures.items())
+        else:
+            rows = dict((model, self._fetch(model, list(pks))) for model, pks in pks_by_model.items())
+
+        # keep the elasticsearch order
+        instance_lists = []
+        used = set()
+        for resolved in resolved_lists:
+            instances = []
+            for model, pk, score in resolved:
+                instance = rows[model].get(pk)
+                if instance is None:
+                    continue
+                if (model, pk) in used:
+                    instance = copy.copy(instance)
+                used.add((model, pk))
+                instance.es_score = score
+                instances.append(instance)
+            instance_lists.append(instances)
+        return instance_lists
+
+    def _fetch(self, model: ModelBase, pks: list) -> dict:
+        """fetches the rows of one model
+
+        :param model: the django model
+        :param pks: the pks to fetch
+        :return: {pk: instance}
+        """
+        queryset = model._default_manager.all()
+        only = self._get_fields(self.only, model)
+        if only:
+            queryset = queryset.only(*only)
+        defer = self._get_fields(self.defer, model)
+        if defer:
+            queryset = queryset.defer(*defer)
+        return queryset.in_bulk(pks)
+
+    def _fetch_in_thread(self, model: ModelBase, pks: list) -> dict:
+        """fetches the rows of one model from a worker thread, closing the thread's database connection afterwards
+
+        :param model: the django model
+        :param pks: the pks to fetch
+        :return: {pk: instance}
+        """
+        try:
+            return self._fetch(model, pks)
+        finally:
+            for conn in connections.all():
+                conn.close()
+
+    @staticmethod
+    def _in_atomic_block(models: [ModelBase]) -> bool:
+        """checks if the database connection of any of the models is in an atomic block on this thread
+
+        :param models: the django models
+        :return: True if a transaction (or savepoint) is open
+        """
+        return any(connections[router.db_for_read(model)].in_atomic_block for model in models)
+
+    @staticmethod
+    def _get_fields(fields: [str] or dict, model: ModelBase) -> [str] or None:
+        """gets the field list for a model
+
+        :param fields: a list for every model or a {model: list} dict
+        :param model: the django model
+        :return: the field names, if any
+        """
+        if isinstance(fields, dict):
+            return fields.get(model)
+        return fields
+
+
+##
+# functions
+
+def get_model(doc_type: str) -> ModelBase or None:
+    """resolves a doc type name to its django model -- cached per process once resolved
+
+    doc types written by a registered indexer resolve to its `Meta.model`, others are read as `app_label.model_name`
+
+    :param doc_type: the doc type name
+    :return: the django model, or None if there is none
+    """
+    try:
+        return _doc_type_models[doc_type]
+    except KeyError:
+        pass
+
+    indexer_class = get_doc_type_indexers().get(doc_type)
+    if indexer_class is not None:
+        model = indexer_class.Meta.model
+    else:
+        try:
+            model = apps.get_model(*doc_type.split('.', 1))
+        except (LookupError, ValueError, TypeError):
+            model = None
+
+    if model is not None:
+        with _doc_type_models_lock:
+            _doc_type_models[doc_type] = model
+    return model
@@ -1,13 +1,76 @@
+import itertools
 import logging
+import threading
+import weakref
+from collections import OrderedDict
 
 from django.conf import settings
 from django.db.models import Model
+from django.db.models.query import QuerySet
 from django.db.models.base import ModelBase
+from django.test.signals import setting_changed
 from elasticsearch import Elasticsearch
 from six import add_metaclass
 
+from .aliases import INITIAL_INDEX_SUFFIX, create_versioned_index, get_rebuild_indices
+from .buffer import WriteBuffer
+from .bulk import DEFAULT_CHUNK_SIZE, DEFAULT_MAX_BYTES, send_bulk
+from .cache import invalidate
+from .connections import get_connection
 from .errors import ConfigurationError
-from .fields import IndexableField, get_es_type_mapping
+from .fields import DJANGO_TO_ES, IndexableField, get_converter, get_es_type_mapping, get_many_converter
+from .fingerprints import FingerprintStore, get_fingerprint_store, get_process_store
+from .instrumentation import PHASE_BOOTSTRAP, PHASE_DOCUMENT, PHASE_INDEX, is_enabled, timed
+
+
+##
+# refresh policies
+
+REFRESH_NONE = False
+REFRESH_WAIT_FOR = 'wait_for'
+REFRESH_IMMEDIATE = True
+
+
+##
+# bootstrap cache -- (index, doc type) pairs known to exist, per client
+
+_bootstrapped = weakref.WeakKeyDictionary()
+_bootstrapped_lock = threading.Lock()
+
+
+##
+# relationship kinds of dotted field sources
+
+SINGLE_RELATIONS = ('ForeignKey', 'OneToOneField', 'OneToOneRel')
+MANY_RELATIONS = ('ManyToManyField', 'ManyToManyRel', 'ManyToOneRel')
+
+
+##
+# compiled document extraction plans, per indexer class
+
+_document_plans = {}
+_related_paths = {}
+
+
+##
+# write-behind buffers, per (client, refresh policy, window)
+
+_write_buffers = {}
+_write_buffers_lock = threading.Lock()
+
+
+##
+# resolved class metadata (index name, doc type, pk, mapping, ...), per indexer class -- dropped whenever an `ES_*`
+# setting changes (see `reset_class_metadata`)
+
+_class_metadata = {}
+
+
+##
+# concrete indexer classes by '<module>.<class name>', in definition order
+
+indexer_classes = OrderedDict()
+_doc_type_indexers = {'count': 0, 'mapping': {}}
 
 
 ##
@@ -19,7 +82,8 @@ class IndexerMetaClass(type):
     """
 
     def __new__(mcs, name: str, bases: [object], attributes: dict):
-        """sets new attribute `_mapped_fields` of object
+        """sets new attribute `_mapped_fields` of object, registers indexers with a `Meta.model` and resolves their
+        model metadata (doc type, pk, mapping) once
 
         :param name: the object name
         :param bases: base (parent) objects
@@ -28,151 +92,475 @@ class IndexerMetaClass(type):
         """
         # get this object's attributes
         fields = []
-        for name, obj in list(attributes.items()):
+        for attr_name, obj in list(attributes.items()):
             if isinstance(obj, IndexableField):
-                fields.append((name, attributes.pop(name)))
+                fields.append((attr_name, attributes.pop(attr_name)))
 
         # descend into base classes. if they are also Indexers, grab and prepend their mapped fields
         for base in bases:
             if hasattr(base, '_mapped_fields'):
                 fields = list(base._mapped_fields.items()) + fields
 
+        # derive fields from the django model -- declared and inherited fields win
+        meta = attributes.get('Meta')
+        if getattr(meta, 'auto_fields', None):
+            fields = _make_auto_fields(meta, fields) + fields
+
+        # collect the related model attributes read by dotted sources, e.g. {'author': {'name'}} (see `dependencies`)
+        mapped_fields = dict(fields)
+        related_sources = {}
+        for field in mapped_fields.values():
+            if '.' in field.source:
+                relation, attr = field.source.split('.')[:2]
+                related_sources.setdefault(relation, set()).add(attr)
+
         # set and run super
-        attributes['_mapped_fields'] = dict(fields)
-        return super(IndexerMetaClass, mcs).__new__(mcs, name, bases, attributes)
+        attributes['_mapped_fields'] = mapped_fields
+        attributes['_related_sources'] = dict(
+            (relation, frozenset(attrs)) for relation, attrs in related_sources.items())
+        cls = super(IndexerMetaClass, mcs).__new__(mcs, name, bases, attributes)
+
+        # resolve the model metadata of concrete indexers now -- settings dependent metadata (the client, the index
+        # name, the mapping with the fields of the fingerprint store) is resolved on first use
+        if meta is not None and hasattr(meta, 'model') and not getattr(meta, 'abstract', False):
+            for attr_name in ('doc_type_name', 'model_pk_name', 'model_pk_type'):
+                getattr(cls, attr_name)
+
+            # register -- variants opting out with `_registered = False` (e.g. async ones) excepted
+            if cls._registered:
+                indexer_classes['{}.{}'.format(cls.__module__, cls.__name__)] = cls
+        return cls
 
 
 ##
 # objects
 
+class ClassMetadata(object):
+    """
+    indexer metadata resolved lazily by a classmethod of the indexer, once per indexer class -- readable from the
+    class and its instances
+
+    metadata with a `slot` can be overridden per instance, e.g. a reindex writing to a new physical index. metadata
+    that is not `cached` is resolved on every read, e.g. the client, which the connection registry caches already.
+    """
+
+    __slots__ = ('resolver', 'slot', 'cached')
+
+    def __init__(self, resolver: str, slot: str=None, cached: bool=True):
+        """initializes a new metadata attribute
+
+        :param resolver: the name of the indexer classmethod computing the value
+        :param slot: the name of the instance slot holding an override, if overridable
+        :param cached: keep the value per indexer class
+        """
+        self.resolver = resolver
+        self.slot = slot
+        self.cached = cached
+
+    def __get__(self, instance: object, owner: type) -> object:
+        if instance is not None and self.slot is not None:
+            value = getattr(instance, self.slot)
+            if value is not None:
+                return value
+        if not self.cached:
+            return getattr(owner, self.resolver)()
+        try:
+            return _class_metadata[owner][self.resolver]
+        except KeyError:
+            pass
+        value = getattr(owner, self.resolver)()
+        _class_metadata.setdefault(owner, {})[self.resolver] = value
+        return value
+
+    def __set__(self, instance: object, value: object):
+        if self.slot is None:
+            raise AttributeError('{} is resolved per indexer class'.format(self.resolver))
+        setattr(instance, self.slot, value)
+
+
 @add_metaclass(IndexerMetaClass)
 class ModelIndexer(object):
     """
     django model indexer
+
+    the index name, doc type, pk and mapping are resolved once per indexer class (see `ClassMetadata`), so an
+    indexer instance is a slotted handle around a model instance -- declare `__slots__ = ()` on subclasses to keep it
+    that way. `Meta.auto_fields` maps the model's columns without declaring them: True for all of them or a list
+    of field names.
+
+    with a fingerprint store (see `fingerprints`), writes of documents that did not change since their last write
+    are skipped -- buffered writes are never skipped, and drop the fingerprint of their document.
     """
 
+    __slots__ = ('instance', '_es', '_index_name')
+
+    _registered = True
+
+    es = ClassMetadata('_get_es', '_es', cached=False)
+    index_name = ClassMetadata('_get_index_name', '_index_name')
+    doc_type_name = ClassMetadata('_get_doc_type_name')
+    model_pk_name = ClassMetadata('_get_model_pk_name')
+    model_pk_type = ClassMetadata('_get_model_pk_type')
+    mapping = ClassMetadata('_make_mapping')
+    fingerprint_store = ClassMetadata('_get_fingerprint_store')
+
     def __init__(self, instance: Model=None):
         """initializes a new indexer
 
         :param instance: an instance of a django model
         """
-        # run super to get django model fields mapped in
-        super(ModelIndexer, self).__init__()
-
-        # elasticsearch stuff
-        self.es = self._get_es()
-        self.index_name = self._get_index_name()
-        self.doc_type_name = self._get_doc_type_name()
-        self.model_pk_name, self.model_pk_type = self._get_model_pk()
-        self.mapping = self._make_mapping()
-
-        # make sure the index and the doc type exist
-        if not self.es.indices.exists(self.index_name):
-            self.es.indices.create(self.index_name)
-        if not self.es.indices.exists_type(self.index_name, doc_type=[self.doc_type_name]):
-            self.es.indices.put_mapping(doc_type=self.doc_type_name, body=self.mapping, index=self.index_name)
-
-        # set instance
+        self._es = None
+        self._index_name = None
         self.instance = instance
 
+        # make sure the index and the doc type exist -- checked once per process
+        if getattr(settings, 'ES_ENSURE_MAPPINGS', True) and not self._is_bootstrapped():
+            self.ensure_index()
+
     ##
     # callable methods
 
-    def index(self) -> dict:
+    def index(self, refresh: bool or str=None, buffered: bool=None, force: bool=False) -> dict:
         """upserts the document into elasticsearch
 
-        :return: {'_type', 'created', '_version', '_index', '_id'}
+        :param refresh: the refresh policy (REFRESH_NONE, REFRESH_WAIT_FOR, REFRESH_IMMEDIATE) -- defaults to
+            `Meta.refresh`, then `ES_REFRESH` in django project settings, then REFRESH_IMMEDIATE
+        :param buffered: hand the write to the write-behind buffer -- defaults to True if `Meta.write_behind` is set
+        :param force: write even if the document's fingerprint did not change
+        :return: {'_type', 'created', '_version', '_index', '_id'} -- plus 'skipped': True if the write was skipped
         """
-        document = self._make_document()
-        if len(document):
-            doc_id = document[self.model_pk_name]
-            res = self.es.index(self.index_name, self.doc_type_name, document, id=doc_id, refresh=True)
-            logging.debug('index result: {}'.format(res))
-            return res
-        logging.debug('index result: None -- there is no document')
-        return {'_type': None, 'created': None, '_version': None, '_index': None, '_id': None}
-
-    def delete(self) -> dict:
+        with timed(PHASE_INDEX, sender=type(self), op='index', doc_type=self.doc_type_name) as info:
+            document = self._make_document()
+            if len(document):
+                doc_id = info['id'] = document[self.model_pk_name]
+                if self._is_buffered(buffered):
+                    self._forget_fingerprints([doc_id])
+                    for index_name in self._get_write_indices():
+                        self._get_write_buffer().add(self._make_action('index', doc_id, index_name), document)
+                    logging.debug('index buffered: %s', doc_id)
+                    return {'_type': self.doc_type_name, 'created': None, '_version': None,
+                            '_index': self.index_name, '_id': doc_id}
+                store = self.fingerprint_store
+                if store is not None:
+                    changed = store.filter_changed(self, [document], force)
+                    if not changed:
+                        info['skipped'] = True
+                        logging.debug('index skipped, document unchanged: %s', doc_id)
+                        return {'_type': self.doc_type_name, 'created': False, '_version': None,
+                                '_index': self.index_name, '_id': doc_id, 'skipped': True}
+                res = self.es.index(self.index_name, self.doc_type_name, document, id=doc_id,
+                                    refresh=self._get_refresh(refresh))
+                for index_name in self._get_write_indices()[1:]:
+                    self.es.index(index_name, self.doc_type_name, document, id=doc_id)
+                if store is not None:
+                    store.record(self, {doc_id: changed[0][1]})
+                invalidate(self.index_name, self.doc_type_name)
+                logging.debug('index result: %s', res)
+                return res
+            logging.debug('index result: None -- there is no document')
+            return {'_type': None, 'created': None, '_version': None, '_index': None, '_id': None}
+
+    def delete(self, refresh: bool or str=None, buffered: bool=None) -> dict:
         """deletes the document from elasticsearch
 
+        :param refresh: the refresh policy -- see `index`
+        :param buffered: hand the delete to the write-behind buffer -- see `index`
         :return: {'found', '_type':, '_version''_index', '_id'}
         """
-        document = self._make_document()
-        if document is not None:
-            doc_id = document[self.model_pk_name]
-            res = self.es.delete(self.index_name, self.doc_type_name, id=doc_id, refresh=True)
-            logging.debug('delete result: {}'.format(res))
+        with timed(PHASE_INDEX, sender=type(self), op='delete', doc_type=self.doc_type_name) as info:
+            document = self._make_document()
+            if document is not None:
+                doc_id = info['id'] = document[self.model_pk_name]
+                if self._is_buffered(buffered):
+                    self._forget_fingerprints([doc_id])
+                    for index_name in self._get_write_indices():
+                        self._get_write_buffer().add(self._make_action('delete', doc_id, index_name))
+                    logging.debug('delete buffered: %s', doc_id)
+                    return {'found': None, '_type': self.doc_type_name, '_version': None,
+                            '_index': self.index_name, '_id': doc_id}
+                res = self.es.delete(self.index_name, self.doc_type_name, id=doc_id,
+                                     refresh=self._get_refresh(refresh))
+                for index_name in self._get_write_indices()[1:]:
+                    self.es.delete(index_name, self.doc_type_name, id=doc_id, ignore=404)
+                self._forget_fingerprints([doc_id])
+                invalidate(self.index_name, self.doc_type_name)
+                logging.debug('delete result: %s', res)
+                return res
+            logging.debug('delete result: None - there is no document')
+            return {'found': None, '_type': None, '_version': None, '_index': None, '_id': None}
+
+    def flush(self) -> dict:
+        """flushes the pending writes of this indexer's write-behind buffer
+
+        :return: {'success', 'failed', 'errors', 'requeued'}
+        """
+        return self._get_write_buffer().flush()
+
+    def ensure_index(self) -> bool:
+        """creates the index and puts the doc type mapping if either one is missing
+
+        the result is cached per process, so later indexers for the same client, index and doc type skip the checks.
+        versioned indexers (see `_is_versioned`) create `<index>_initial` behind an alias named after the index.
+
+        :return: True if the index or the mapping had to be created
+        """
+        with timed(PHASE_BOOTSTRAP, sender=type(self), index=self.index_name, doc_type=self.doc_type_name):
+            created = False
+            if not self.es.indices.exists(self.index_name):
+                self._create_index()
+                created = True
+            if not self.es.indices.exists_type(self.index_name, doc_type=[self.doc_type_name]):
+                self.es.indices.put_mapping(doc_type=self.doc_type_name, body=self.mapping,
+                                            index=self.index_name)
+                created = True
+            self._set_bootstrapped()
+            return created
+
+    def sync_mapping(self) -> dict:
+        """creates the index if it is missing and (re)puts the doc type mapping -- useful at deploy time
+
+        :return: the put mapping result
+        """
+        with timed(PHASE_BOOTSTRAP, sender=type(self), index=self.index_name, doc_type=self.doc_type_name):
+            if not self.es.indices.exists(self.index_name):
+                self._create_index()
+            res = self.es.indices.put_mapping(doc_type=self.doc_type_name, body=self.mapping, index=self.index_name)
+            logging.debug('put mapping result: %s', res)
+            self._set_bootstrapped()
             return res
-        logging.debug('delete result: None - there is no document')
-        return {'found': None, '_type': None, '_version': None, '_index': None, '_id': None}
+
+    def bulk_index(self, instances, chunk_size: int=DEFAULT_CHUNK_SIZE, max_bytes: int=DEFAULT_MAX_BYTES,
+                   refresh: bool or str=None, force: bool=False, op_type: str='index') -> dict:
+        """upserts the documents of many instances through the bulk endpoint
+
+        querysets are read in pk ordered chunks of `chunk_size` rows with the relationships of the mapped fields
+        selected or prefetched (see `get_queryset`), so every chunk costs a constant number of queries. documents are
+        built column-wise, one chunk at a time (see `_make_documents`).
+
+        :param instances: a queryset or an iterable of django model instances
+        :param chunk_size: the maximum number of documents per bulk request
+        :param max_bytes: the maximum body size in bytes per bulk request
+        :param refresh: the refresh policy -- if set, the written indices are refreshed once after the last request
+        :param force: write every document, even those whose fingerprint did not change
+        :param op_type: the bulk operation type -- 'create' leaves documents that already exist alone
+        :return: {'success', 'failed', 'errors', 'skipped'} -- `errors` holds the failed bulk response items,
+            `skipped` counts the unchanged documents
+        """
+        if isinstance(instances, QuerySet):
+            chunks = iter_queryset_chunks(self.get_queryset(instances), chunk_size)
+        else:
+            chunks = iter_chunks(instances, chunk_size)
+
+        index_names = self._get_write_indices()
+        store = self.fingerprint_store
+        fingerprints = {}
+        skipped = []
+
+        def actions():
+            for chunk in chunks:
+                documents = self._make_documents(chunk)
+                if store is not None:
+                    changed = store.filter_changed(self, documents, force)
+                    skipped.append(len(documents) - len(changed))
+                    documents = [document for document, _ in changed]
+                    fingerprints.update((str(document[self.model_pk_name]), fingerprint)
+                                        for document, fingerprint in changed)
+                for document in documents:
+                    for index_name in index_names:
+                        yield self._make_action(op_type, document[self.model_pk_name], index_name), document
+
+        res = send_bulk(self.es, actions(), chunk_size, max_bytes, refresh=self._get_refresh(refresh))
+        res['skipped'] = sum(skipped)
+        if store is not None:
+            for item in res['errors']:
+                fingerprints.pop(str(next(iter(item.values())).get('_id')), None)
+            store.record(self, fingerprints)
+        invalidate(self.index_name, self.doc_type_name)
+        return res
+
+    def bulk_delete(self, pks, chunk_size: int=DEFAULT_CHUNK_SIZE, max_bytes: int=DEFAULT_MAX_BYTES,
+                    refresh: bool or str=None) -> dict:
+        """deletes the documents of many model pks through the bulk endpoint
+
+        :param pks: an iterable of django model pks
+        :param chunk_size: the maximum number of deletes per bulk request
+        :param max_bytes: the maximum body size in bytes per bulk request
+        :param refresh: the refresh policy -- if set, the written indices are refreshed once after the last request
+        :return: {'success', 'failed', 'errors'} -- `errors` holds the failed bulk response items
+        """
+        if self.fingerprint_store is not None:
+            pks = list(pks)
+        index_names = self._get_write_indices()
+        actions = ((self._make_action('delete', pk, index_name), None) for pk in pks for index_name in index_names)
+        res = send_bulk(self.es, actions, chunk_size, max_bytes, refresh=self._get_refresh(refresh))
+        self._forget_fingerprints(pks)
+        invalidate(self.index_name, self.doc_type_name)
+        return res
+
+    def get_queryset(self, queryset: QuerySet=None) -> QuerySet:
+        """applies the `select_related` and `prefetch_related` paths needed by the dotted field sources
+
+        :param queryset: the queryset to extend -- defaults to all rows of `Meta.model`
+        :return: the queryset, ready for building documents without per instance queries
+        """
+        if queryset is None:
+            queryset = self.Meta.model._default_manager.all()
+        select, prefetch = self._get_related_paths()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
 
     ##
     # internal methods
 
-    def _get_es(self) -> Elasticsearch:
-        """gets connection to elasticsearch from meta or project settings
+    def _is_bootstrapped(self) -> bool:
+        """checks if the index and doc type are known to exist for this indexer's client
+
+        :return: True if `ensure_index` or `sync_mapping` already succeeded in this process
+        """
+        known = _bootstrapped.get(self.es)
+        return known is not None and (self.index_name, self.doc_type_name) in known
+
+    def _set_bootstrapped(self):
+        """records that the index and doc type exist for this indexer's client
+        """
+        with _bootstrapped_lock:
+            _bootstrapped.setdefault(self.es, set()).add((self.index_name, self.doc_type_name))
+
+    def _create_index(self):
+        """creates the index -- or, for versioned indexers, the initial physical index behind the index alias
+        """
+        if self._is_versioned():
+            name = '{}{}'.format(self.index_name, INITIAL_INDEX_SUFFIX)
+            create_versioned_index(self.es, self.index_name, name=name, ignore=400)
+        else:
+            self.es.indices.create(self.index_name, ignore=400)
+
+    def _is_versioned(self) -> bool:
+        """checks if the index name is an alias backed by versioned physical indices (see `reindex.rebuild`)
+
+        :return: `Meta.versioned`, defaulting to `ES_VERSIONED_INDICES` in django project settings
+        """
+        if hasattr(self.Meta, 'versioned'):
+            return self.Meta.versioned
+        return getattr(settings, 'ES_VERSIONED_INDICES', False)
+
+    def _get_write_indices(self) -> [str]:
+        """gets the indices every write goes to -- the index, plus any index being rebuilt behind its alias
+
+        :return: the index names, `self.index_name` first
+        """
+        if not self._is_versioned():
+            return [self.index_name]
+        return [self.index_name] + [
+            name for name in get_rebuild_indices(self.es, self.index_name) if name != self.index_name]
+
+    def _forget_fingerprints(self, doc_ids: list):
+        """drops the fingerprints of documents written without them -- deleted, buffered or written asynchronously --
+        so the next write of these documents is never skipped
+
+        :param doc_ids: the document ids
+        """
+        store = self.fingerprint_store
+        if store is not None:
+            store.forget(self, doc_ids)
+
+    def _get_refresh(self, refresh: bool or str=None) -> bool or str:
+        """resolves the refresh policy of a write
+
+        :param refresh: the policy passed to the call, if any
+        :return: the policy from the call, `Meta.refresh`, `ES_REFRESH` or REFRESH_IMMEDIATE -- in that order
+        """
+        if refresh is not None:
+            return refresh
+        if hasattr(self.Meta, 'refresh'):
+            return self.Meta.refresh
+        return getattr(settings, 'ES_REFRESH', REFRESH_IMMEDIATE)
+
+    def _is_buffered(self, buffered: bool=None) -> bool:
+        """checks if a write should go through the write-behind buffer
+
+        :param buffered: the choice passed to the call, if any
+        :return: the choice from the call, or True if `Meta.write_behind` is set
+        """
+        if buffered is not None:
+            return buffered
+        return bool(getattr(self.Meta, 'write_behind', None))
+
+    def _get_write_buffer(self) -> WriteBuffer:
+        """gets (or lazily creates) the write-behind buffer of this indexer's client and refresh policy -- shared
+        by every indexer writing with both
+
+        the buffer holds writes for `Meta.write_behind` seconds (default 1), then flushes with the refresh policy
+
+        :return: the write buffer
+        """
+        key = (self.es, self._get_refresh(), getattr(self.Meta, 'write_behind', None) or 1.0)
+        try:
+            return _write_buffers[key]
+        except KeyError:
+            pass
+
+        with _write_buffers_lock:
+            if key not in _write_buffers:
+                _write_buffers[key] = WriteBuffer(key[0], window=key[2], refresh=key[1])
+            return _write_buffers[key]
+
+    @classmethod
+    def _get_es(cls) -> Elasticsearch:
+        """gets the shared connection to elasticsearch from meta or the connection registry
+
+        `Meta.es` may either be a client or the name of a connection in `ES_CONNECTIONS`
 
         :return: a pooled connection
-        :raise ConfigurationError: if no Meta.es property or ES_* properties in django project settings
+        :raise ConfigurationError: if no Meta.es property and no ES_* connection information in django project settings
         """
-        # check meta
-        if hasattr(self.Meta, 'es'):
+        es = getattr(cls.Meta, 'es', None)
+        if es is not None and not isinstance(es, str):
             logging.debug('connecting to elasticsearch from passed Meta.es attribute')
-            return self.Meta.es
-
-        # create a new connection
-        if hasattr(settings, 'ES_HOSTS'):
-            if hasattr(settings, 'ES_TRANSPORT'):
-                if hasattr(settings, 'ES_KWARGS'):
-                    logging.debug('connecting to elasticsearch from django project settings')
-                    return Elasticsearch(
-                        hosts=settings.ES_HOSTS, transport_class=settings.ES_TRANSPORT, **settings.ES_KWARGS)
-                logging.debug('connecting to elasticsearch from django project settings')
-                return Elasticsearch(hosts=settings.ES_HOSTS, transport_class=settings.ES_TRANSPORT)
-            logging.debug('connecting to elasticsearch from django project settings')
-            return Elasticsearch(hosts=settings.ES_HOSTS)
-
-        # raise exception -- no es found
-        logging.error('no elasticsearch connection information found')
-        raise ConfigurationError('No elasticsearch connection information found')
-
-    def _get_index_name(self) -> str:
+        return get_connection(es)
+
+    @classmethod
+    def _get_index_name(cls) -> str:
         """gets the elasticsearch index name from meta or project settings
 
         :return: the index name to be used for indexing
         :raise ConfigurationError: if no Meta.index property or ES_INDEX_NAME in django project settings
         """
         # check meta
-        if hasattr(self.Meta, 'index'):
-            logging.debug('using index {}'.format(self.Meta.index))
-            return self.Meta.index
+        if hasattr(cls.Meta, 'index'):
+            logging.debug('using index %s', cls.Meta.index)
+            return cls.Meta.index
 
         # check django project settings
         if hasattr(settings, 'ES_INDEX_NAME'):
-            logging.debug('using index {}'.format(settings.ES_INDEX_NAME))
+            logging.debug('using index %s', settings.ES_INDEX_NAME)
             return settings.ES_INDEX_NAME
 
         # raise exception -- no name found
         logging.error('no index name information found')
         raise ConfigurationError('No index name information found')
 
-    def _get_doc_type_name(self) -> str:
+    @classmethod
+    def _get_doc_type_name(cls) -> str:
         """gets or creates the name for the elasticsearch doc type -- if created, it's the importable django model name
 
         :return: the name of the doc type
         :raise ConfigurationError: if no Meta.doc_type property or Meta.model or Meta.model is not a django model
         """
         # check meta
-        if hasattr(self.Meta, 'doc_type'):
-            logging.debug('using doc type {}'.format(self.Meta.doc_type))
-            return self.Meta.doc_type
+        if hasattr(cls.Meta, 'doc_type'):
+            logging.debug('using doc type %s', cls.Meta.doc_type)
+            return cls.Meta.doc_type
 
         # create from django model
-        if hasattr(self.Meta, 'model'):
-            model = self.Meta.model
+        if hasattr(cls.Meta, 'model'):
+            model = cls.Meta.model
             if isinstance(model, ModelBase):
                 name = '{}.{}'.format(model._meta.app_label, model._meta.model_name)
-                logging.debug('created doc type name {}'.format(name))
+                logging.debug('created doc type name %s', name)
                 return name
 
             # raise exception -- model is not a django model
@@ -183,18 +571,19 @@ class ModelIndexer(object):
         logging.error('no doc type name information found')
         raise ConfigurationError('No doc type name information found')
 
-    def _get_model_pk(self) -> (str, str):
+    @classmethod
+    def _get_model_pk(cls) -> (str, str):
         """gets the name of the django model's pk and its field's internal type
 
         :return: the name of the django model's pk and its field's internal type
         :raise ConfigurationError: if no Meta.model or Meta.model is not a django model
         """
-        if hasattr(self.Meta, 'model'):
-            model = self.Meta.model
+        if hasattr(cls.Meta, 'model'):
+            model = cls.Meta.model
             if isinstance(model, ModelBase):
                 name = model._meta.pk.name
-                internal_type = model._meta.get_field(name).get_internal_type()
-                logging.debug('model pk: {}, {}'.format(name, internal_type))
+                internal_type = model._meta.pk.get_internal_type()
+                logging.debug('model pk: %s, %s', name, internal_type)
                 return name, internal_type
 
             # raise exception -- not a django model
@@ -205,28 +594,58 @@ class ModelIndexer(object):
         logging.error('Meta.model attribute not found')
         raise ConfigurationError('Meta.model attribute not found')
 
-    def _make_mapping(self) -> dict:
+    @classmethod
+    def _get_fingerprint_store(cls) -> FingerprintStore or None:
+        """gets the store of the fingerprints of written documents
+
+        :return: `Meta.fingerprint_store` -- a store, True for the `ES_FINGERPRINTS` store (an in-process one if the
+            setting is missing) or False for none -- defaulting to the `ES_FINGERPRINTS` store, None if writes are
+            never skipped
+        """
+        store = getattr(cls.Meta, 'fingerprint_store', None)
+        if store is True:
+            return get_fingerprint_store() or get_process_store()
+        if store is None:
+            return get_fingerprint_store()
+        return store or None
+
+    @classmethod
+    def _get_model_pk_name(cls) -> str:
+        """gets the name of the django model's pk -- see `_get_model_pk`
+        """
+        return cls._get_model_pk()[0]
+
+    @classmethod
+    def _get_model_pk_type(cls) -> str:
+        """gets the internal type of the django model's pk field -- see `_get_model_pk`
+        """
+        return cls._get_model_pk()[1]
+
+    @classmethod
+    def _make_mapping(cls) -> dict:
         """creates an elasticsearch mapping based on attributes
 
         :return: the full elasticsearch mapping document mapping
         """
-        # build base properties based on declared attributes (self._mapped_fields)
+        # build base properties based on declared attributes (cls._mapped_fields)
         properties = {}
-        for name, field_type in self._mapped_fields.items():
+        for name, field_type in cls._mapped_fields.items():
             # check if name is dotted (for FKs, 121s and M2Ms)
             if '.' in name:
                 name = name.split('.')[0]
             properties[name] = field_type.define_mapping()
 
-        # add in model pk
-        properties[self.model_pk_name] = get_es_type_mapping(self.model_pk_name, self.model_pk_type)
+        # add in model pk and the fields of the fingerprint store
+        properties[cls.model_pk_name] = get_es_type_mapping(cls.model_pk_name, cls.model_pk_type)
+        if cls.fingerprint_store is not None:
+            properties.update(cls.fingerprint_store.define_mapping())
 
         # check dynamic mapping from meta
-        dynamic = getattr(self.Meta, 'dynamic', None)
+        dynamic = getattr(cls.Meta, 'dynamic', None)
 
         # build mapping
         mapping = {
-            '_id': {'path': self.model_pk_name},
+            '_id': {'path': cls.model_pk_name},
             'properties': properties,
         }
 
@@ -239,56 +658,286 @@ class ModelIndexer(object):
             mapping['date_detection'] = False
 
         # return
-        logging.debug('mapping created: {}'.format(mapping))
+        logging.debug('mapping created: %s', mapping)
         return mapping
 
-    def _make_document(self) -> dict:
-        """creates an elasticsearch document based on the mapped fields from the init-ed instance
+    def _make_action(self, op_type: str, doc_id: object, index_name: str=None) -> dict:
+        """creates a bulk action line for a document
+
+        :param op_type: the bulk operation type (index, create, delete)
+        :param doc_id: the document id (the django model pk)
+        :param index_name: the target index -- defaults to `self.index_name`
+        :return: the bulk action metadata
+        """
+        return {op_type: {'_index': index_name or self.index_name, '_type': self.doc_type_name, '_id': doc_id}}
+
+    def _make_document(self, instance: Model=None) -> dict:
+        """creates an elasticsearch document based on the mapped fields from the instance
 
+        :param instance: the django model instance -- defaults to the init-ed instance
         :return: the full document to be indexed
         """
         document = {}
+        if instance is None:
+            instance = self.instance
+
+        # run the precompiled extraction plan over the instance -- timed only if somebody listens, this runs for
+        # every document
+        if instance:
+            if is_enabled(PHASE_DOCUMENT):
+                with timed(PHASE_DOCUMENT, sender=type(self), count=1):
+                    self._fill_document(document, instance)
+            else:
+                self._fill_document(document, instance)
+
+        # return -- formatted lazily, this runs for every document
+        logging.debug('document created: %s', document)
+        return document
 
-        # parse instance
-        if self.instance:
-            for doc_key, field in self._mapped_fields.items():
-                # get source name
-                name = field.source
+    def _fill_document(self, document: dict, instance: Model):
+        """runs the document plan over an instance -- see `_make_document`
 
-                # check if name is dotted (for FKs, 121s and M2Ms)
-                if '.' in name:
-                    name, attr = name.split('.')[:2]
-                    rel_model = getattr(self.instance, name, None)
+        :param document: the document to fill
+        :param instance: the django model instance
+        """
+        for doc_key, getter, converter, _ in self._get_document_plan():
+            value = getter(instance)
+            if converter is not None:
+                value = converter(value)
+            document[doc_key] = value
 
-                    # descend into relationship
-                    if rel_model is not None:
-                        dj_type = self.Meta.model._meta.get_field(str(name)).get_internal_type()
+        # add pk to document
+        document[self.model_pk_name] = getattr(instance, self.model_pk_name, None)
 
-                        # FK or 121
-                        if dj_type in ('ForeignKey', 'OneToOneField', 'ManyToOneRel', 'OneToOneRel'):
-                            value = getattr(rel_model, attr, None)
+    def _make_documents(self, instances: [Model]) -> [dict]:
+        """creates the documents of many instances column-wise -- every mapped field is read from all instances and
+        converted with one `to_es_many` call
 
-                        # M2M
-                        elif dj_type in ('ManyToManyField', 'ManyToManyRel'):
-                            values = [getattr(obj, attr, None) for obj in rel_model.all()]
-                            value = ' '.join([str(val) for val in values])
+        :param instances: the django model instances
+        :return: the documents, in the order of `instances` -- instances that are None are skipped
+        """
+        instances = [instance for instance in instances if instance]
+        documents = [{} for _ in instances]
+        with timed(PHASE_DOCUMENT, sender=type(self), count=len(instances)):
+            for doc_key, getter, _, many_converter in self._get_document_plan():
+                column = [getter(instance) for instance in instances]
+                if many_converter is not None:
+                    column = many_converter(column)
+                for document, value in zip(documents, column):
+                    document[doc_key] = value
+
+            # add pks to documents
+            for document, instance in zip(documents, instances):
+                document[self.model_pk_name] = getattr(instance, self.model_pk_name, None)
+
+        logging.debug('%s documents created', len(documents))
+        return documents
+
+    def _get_document_plan(self) -> [(str, callable, callable, callable)]:
+        """gets (or lazily compiles) the document extraction plan of this indexer class
+
+        the plan resolves every mapped field once -- dotted sources, the kind of relationship and the field's
+        `to_es` and `to_es_many` converters -- so building a document only has to run a list of getters
+
+        :return: a list of (document key, attribute getter, converter or None, batch converter or None)
+        """
+        cls = type(self)
+        try:
+            return _document_plans[cls]
+        except KeyError:
+            pass
+
+        plan = []
+        for doc_key, field in self._mapped_fields.items():
+            converter = get_converter(field, 'to_es')
+            many_converter = None if converter is None else get_many_converter(field, 'to_es')
+            plan.append((doc_key, self._make_getter(field.source), converter, many_converter))
+        _document_plans[cls] = plan
+        logging.debug('document plan compiled for %s', cls.__name__)
+        return plan
+
+    def _get_related_paths(self) -> ([str], [str]):
+        """gets (or lazily resolves) the relationships traversed by the dotted sources of this indexer class
+
+        :return: the `select_related` paths (FKs, 121s) and the `prefetch_related` paths (M2Ms, reverse FKs)
+        """
+        cls = type(self)
+        try:
+            return _related_paths[cls]
+        except KeyError:
+            pass
+
+        select, prefetch = [], []
+        for field in self._mapped_fields.values():
+            if '.' not in field.source:
+                continue
+            name = field.source.split('.')[0]
+            dj_type = self.Meta.model._meta.get_field(str(name)).get_internal_type()
+            if dj_type in SINGLE_RELATIONS and name not in select:
+                select.append(name)
+            elif dj_type in MANY_RELATIONS and name not in prefetch:
+                prefetch.append(name)
+        _related_paths[cls] = select, prefetch
+        logging.debug('related paths for %s: select %s, prefetch %s', cls.__name__, select, prefetch)
+        return select, prefetch
+
+    def _make_getter(self, source: str) -> callable:
+        """creates the attribute getter for a mapped field source
+
+        :param source: the django model attribute, dotted for FKs, 121s and M2Ms (e.g. `author.name`)
+        :return: a function taking a model instance and returning the raw value
+        """
+        # plain attribute
+        if '.' not in source:
+            return lambda instance: getattr(instance, source, None)
+
+        # relationship -- resolve its kind once
+        name, attr = source.split('.')[:2]
+        dj_type = self.Meta.model._meta.get_field(str(name)).get_internal_type()
+
+        # FK or 121
+        if dj_type in SINGLE_RELATIONS:
+            def getter(instance):
+                rel_model = getattr(instance, name, None)
+                if rel_model is None:
+                    return None
+                return getattr(rel_model, attr, None)
+            return getter
+
+        # M2M or reverse FK
+        if dj_type in MANY_RELATIONS:
+            def getter(instance):
+                rel_model = getattr(instance, name, None)
+                if rel_model is None:
+                    return None
+                return ' '.join([str(getattr(obj, attr, None)) for obj in rel_model.all()])
+            return getter
+
+        # WTF?
+        logging.warning('unsupported relationship %s for source %s', dj_type, source)
+        return lambda instance: None
 
-                        # WTF?
-                        else:
-                            value = None
 
-                    else:
-                        value = None
+##
+# functions
 
-                # get value
-                else:
-                    value = getattr(self.instance, name, None)
-                # set value
-                document[doc_key] = value
+def get_indexer_classes(labels: [str]=None) -> [type]:
+    """looks up registered indexer classes
 
-            # add pk to document
-            document[self.model_pk_name] = getattr(self.instance, self.model_pk_name, None)
+    :param labels: indexer paths (`app.indexers.ArticleIndexer`), indexer class names (`ArticleIndexer`) or model
+        labels (`app.Article`) -- all registered indexers if empty
+    :return: the matching indexer classes, in registration order
+    :raise ConfigurationError: if a label matches no indexer
+    """
+    if not labels:
+        return list(indexer_classes.values())
+
+    classes = []
+    for label in labels:
+        matches = [
+            cls for path, cls in indexer_classes.items()
+            if label in (path, cls.__name__) or label.lower() == '{}.{}'.format(
+                cls.Meta.model._meta.app_label, cls.Meta.model._meta.model_name)
+        ]
+        if not matches:
+            raise ConfigurationError('No indexer found for {}'.format(label))
+        classes += [cls for cls in matches if cls not in classes]
+    return classes
+
+
+def get_doc_type_indexers() -> dict:
+    """maps doc type names to the registered indexer classes writing them
+
+    :return: {doc type name: indexer class}
+    """
+    # rebuilt whenever more indexers got registered
+    if _doc_type_indexers['count'] != len(indexer_classes):
+        _doc_type_indexers['mapping'] = dict((cls.doc_type_name, cls) for cls in indexer_classes.values())
+        _doc_type_indexers['count'] = len(indexer_classes)
+    return _doc_type_indexers['mapping']
 
-        # return
-        logging.debug('document created: {}'.format(document))
-        return document
+
+def reset_class_metadata(setting: str=None, **kwargs: dict):
+    """drops the resolved metadata of every indexer class -- it is resolved again on next use
+
+    connected to django's `setting_changed` signal, so `override_settings` of `ES_*` settings takes effect
+
+    :param setting: the name of the changed setting -- every change resets if None
+    """
+    if setting is None or setting.startswith('ES_'):
+        _class_metadata.clear()
+
+
+setting_changed.connect(reset_class_metadata, dispatch_uid='djelastic.indexers.reset_class_metadata')
+
+
+def iter_chunks(iterable, chunk_size: int):
+    """iterates over any iterable in lists of up to `chunk_size` items
+
+    :param iterable: the iterable
+    :param chunk_size: the number of items per chunk
+    :return: a generator of lists
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_queryset_chunks(queryset: QuerySet, chunk_size: int, start_after: object=None):
+    """iterates over a queryset in pk ordered chunks using keyset pagination
+
+    every chunk is a separate (fully evaluated) query, so memory stays constant and prefetches apply per chunk
+
+    :param queryset: the queryset -- its ordering is replaced by pk order
+    :param chunk_size: the number of rows per chunk
+    :param start_after: only rows with a pk greater than this one are read
+    :return: a generator of lists of model instances
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = start_after
+    while True:
+        chunk_qs = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk_qs[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+
+def _make_auto_fields(meta: type, declared: [(str, IndexableField)]) -> [(str, IndexableField)]:
+    """derives mapped fields from the columns of `Meta.model` (see `fields.DJANGO_TO_ES`)
+
+    :param meta: the indexer's Meta -- `auto_fields` is True for every column or a list of field names
+    :param declared: the (name, field) pairs declared on (or inherited by) the indexer, not derived again
+    :return: (name, field) pairs -- the pk and columns without an elasticsearch type (e.g. FKs) are skipped
+    :raise ConfigurationError: if there is no django model, or a listed field is not a mappable column
+    """
+    model = getattr(meta, 'model', None)
+    if not isinstance(model, ModelBase):
+        raise ConfigurationError('Meta.auto_fields requires Meta.model to be a django model')
+
+    names = None if meta.auto_fields is True else list(meta.auto_fields)
+    taken = set(name for name, _ in declared) | set(field.source for _, field in declared)
+    fields = []
+    for dj_field in model._meta.fields:
+        es_type = DJANGO_TO_ES.get(dj_field.get_internal_type())
+        if dj_field.primary_key or dj_field.name in taken or (names is not None and dj_field.name not in names):
+            continue
+        if es_type is None:
+            if names is not None:
+                raise ConfigurationError('Meta.auto_fields: no elasticsearch type for {}.{}'.format(
+                    model.__name__, dj_field.name))
+            continue
+        fields.append((dj_field.name, es_type(dj_field.name)))
+
+    # every listed field has to exist
+    missing = set(names or ()) - taken - set(name for name, _ in fields)
+    if missing:
+        raise ConfigurationError('Meta.auto_fields: no fields {} on {}'.format(
+            ', '.join(sorted(missing)), model.__name__))
+    return fields
@@ -0,0 +1,154 @@
+"""
+timings of the indexing and searching hot paths
+
+every timed operation sends the `operation_timed` signal -- connect a receiver to feed a metrics backend::
+
+    from djelastic.instrumentation import operation_timed
+
+    def report(sender, phase, duration, info, **kwargs):
+        statsd.timing('elasticsearch.{}'.format(phase), duration * 1000)
+
+    operation_timed.connect(report)
+
+operations slower than the `ES_SLOW_LOG` thresholds (in seconds) are logged as warnings to the `djelastic.slow`
+logger, e.g. `ES_SLOW_LOG = {'search': 0.5, 'index': 0.2}` or `ES_SLOW_LOG = 1.0` for every phase. nothing is
+timed while there are no receivers and no thresholds.
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.dispatch import Signal
+from django.test.signals import setting_changed
+from elasticsearch.connection import Urllib3HttpConnection
+
+
+##
+# phases
+
+PHASE_BOOTSTRAP = 'bootstrap'
+PHASE_DOCUMENT = 'document'
+PHASE_INDEX = 'index'
+PHASE_BULK_CHUNK = 'bulk_chunk'
+PHASE_REQUEST = 'request'
+PHASE_SEARCH = 'search'
+PHASE_HYDRATION = 'hydration'
+
+
+##
+# clock -- `time.perf_counter` is python 3.3+
+
+perf_counter = getattr(time, 'perf_counter', time.time)
+
+
+##
+# signals
+
+operation_timed = Signal(providing_args=['phase', 'duration', 'info'])
+
+
+##
+# slow log
+
+slow_logger = logging.getLogger('djelastic.slow')
+
+# `ES_SLOW_LOG`, read once -- {'config': value}, cleared when the setting changes
+_slow_log = {}
+
+
+##
+# objects
+
+class InstrumentedConnection(Urllib3HttpConnection):
+    """
+    elasticsearch connection reporting the duration and the request and response sizes of every request
+    """
+
+    def perform_request(self, method: str, url: str, params: dict=None, body: bytes=None, timeout: float=None,
+                        ignore: (int,)=()) -> (int, dict, str):
+        if not is_enabled(PHASE_REQUEST):
+            return super(InstrumentedConnection, self).perform_request(method, url, params, body, timeout, ignore)
+
+        start = perf_counter()
+        status = None
+        raw_data = ''
+        try:
+            status, headers, raw_data = super(InstrumentedConnection, self).perform_request(
+                method, url, params, body, timeout, ignore)
+            return status, headers, raw_data
+        finally:
+            record(PHASE_REQUEST, perf_counter() - start, sender=type(self), method=method, url=url,
+                   status=status, sent=len(body) if body else 0, received=len(raw_data) if raw_data else 0)
+
+
+##
+# functions
+
+def is_enabled(phase: str) -> bool:
+    """checks if anybody is interested in the timings of a phase
+
+    :param phase: the phase
+    :return: True if there are signal receivers or a slow log threshold for the phase
+    """
+    # runs for every timed operation -- a connected (possibly dead) receiver is enough, no weak reference is resolved
+    return get_slow_threshold(phase) is not None or bool(operation_timed.receivers)
+
+
+def get_slow_threshold(phase: str) -> float or None:
+    """gets the duration from which on operations of a phase are logged as slow
+
+    :param phase: the phase
+    :return: the threshold in seconds from `ES_SLOW_LOG` in django project settings, None if not logged
+    """
+    try:
+        config = _slow_log['config']
+    except KeyError:
+        config = _slow_log['config'] = getattr(settings, 'ES_SLOW_LOG', None)
+    return config.get(phase) if isinstance(config, dict) else config
+
+
+def record(phase: str, duration: float, sender: object=None, **info: dict):
+    """reports a timed operation to the signal receivers and the slow log
+
+    :param phase: the phase
+    :param duration: the duration in seconds
+    :param sender: the class the operation belongs to
+    :param info: details -- counts, sizes, names
+    """
+    operation_timed.send(sender=sender, phase=phase, duration=duration, info=info)
+    threshold = get_slow_threshold(phase)
+    if threshold is not None and duration >= threshold:
+        slow_logger.warning('slow %s: %.3fs %s', phase, duration, info)
+
+
+@contextmanager
+def timed(phase: str, sender: object=None, **info: dict):
+    """times the block and records it (see `record`) -- the yielded dict collects details known inside the block
+
+    nothing is timed if the phase is not enabled (see `is_enabled`), the dict is yielded all the same
+
+    :param phase: the phase
+    :param sender: the class the operation belongs to
+    :param info: details known up front
+    """
+    if not is_enabled(phase):
+        yield info
+        return
+    start = perf_counter()
+    try:
+        yield info
+    finally:
+        record(phase, perf_counter() - start, sender, **info)
+
+
+def _reset_slow_log(setting: str, **kwargs: dict):
+    """forgets the slow log thresholds once `ES_SLOW_LOG` changes, e.g. with `override_settings`
+
+    :param setting: the name of the changed setting
+    """
+    if setting == 'ES_SLOW_LOG':
+        _slow_log.clear()
+
+
+setting_changed.connect(_reset_slow_log, dispatch_uid='djelastic.instrumentation.reset_slow_log')
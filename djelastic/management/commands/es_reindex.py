@@ -0,0 +1,105 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from ...bulk import DEFAULT_CHUNK_SIZE
+from ...errors import ConfigurationError, RebuildError, ReindexError
+from ...indexers import get_indexer_classes
+from ...reindex import CheckpointStore, get_indexer_label, parallel_reindex, rebuild, reindex
+from ..progress import make_progress
+
+
+class Command(BaseCommand):
+    """
+    rebuilds the elasticsearch documents of registered indexers from the database
+    """
+
+    args = '[indexer or app_label.Model ...]'
+    help = 'Streams all rows of the given (default: all) indexers into elasticsearch in pk ordered bulk chunks. ' \
+           'Indexers are discovered from the `indexers` module of every installed app.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size', default=DEFAULT_CHUNK_SIZE,
+                    help='number of rows per chunk and bulk request'),
+        make_option('--state-file', dest='state_file', default='.es_reindex.json',
+                    help='file the last committed pk of every indexer is recorded in'),
+        make_option('--resume', action='store_true', dest='resume', default=False,
+                    help='continue after the last committed pk recorded in the state file'),
+        make_option('--workers', type='int', dest='workers', default=1,
+                    help='number of worker processes the pk space is partitioned across'),
+        make_option('--partitions', type='int', dest='partitions', default=None,
+                    help='number of pk ranges handed out to the workers (default: 4 per worker)'),
+        make_option('--rebuild', action='store_true', dest='rebuild', default=False,
+                    help='rebuild every index of the given indexers into a new versioned index and swap its alias'),
+        make_option('--keep-old', action='store_true', dest='keep_old', default=False,
+                    help='keep the indices an alias pointed at before a rebuild'),
+        make_option('--force', action='store_true', dest='force', default=False,
+                    help='swap the alias of a rebuild even if rows failed to copy'),
+    )
+
+    def handle(self, *labels, **options):
+        autodiscover_modules('indexers')
+        try:
+            indexer_classes = get_indexer_classes(labels)
+        except ConfigurationError as e:
+            raise CommandError(str(e))
+
+        if options['resume'] and (options['workers'] > 1 or options['rebuild']):
+            raise CommandError('--resume is only supported by single process, in place reindexing')
+
+        if options['rebuild']:
+            return self._rebuild(indexer_classes, options)
+
+        checkpoints = CheckpointStore(options['state_file'])
+        for indexer_class in indexer_classes:
+            label = get_indexer_label(indexer_class)
+            self.stdout.write('reindexing {}'.format(label))
+            if options['workers'] > 1:
+                try:
+                    result = parallel_reindex(indexer_class, workers=options['workers'],
+                                              chunk_size=options['chunk_size'], partitions=options['partitions'],
+                                              progress=make_progress(self.stdout, label))
+                except ReindexError as e:
+                    raise CommandError(str(e))
+            else:
+                result = reindex(indexer_class, chunk_size=options['chunk_size'], checkpoints=checkpoints,
+                                 resume=options['resume'], progress=make_progress(self.stdout, label))
+            self.stdout.write('{}: {} indexed, {} failed'.format(label, result['indexed'], result['failed']))
+            for error in result['errors'][:10]:
+                self.stderr.write('  {}'.format(error))
+
+    def _rebuild(self, indexer_classes: [type], options: dict):
+        """rebuilds the indices of the indexers behind their aliases
+
+        :param indexer_classes: the indexers to rebuild -- all registered indexers of their indices are rebuilt
+        :param options: the command options
+        """
+        aliases = []
+        for indexer_class in indexer_classes:
+            alias = indexer_class.index_name
+            if alias not in aliases:
+                aliases.append(alias)
+
+        callbacks = {}
+
+        def progress(cls, *args):
+            if cls not in callbacks:
+                callbacks[cls] = make_progress(self.stdout, get_indexer_label(cls))
+            callbacks[cls](*args)
+
+        for alias in aliases:
+            self.stdout.write('rebuilding {}'.format(alias))
+            try:
+                result = rebuild(alias, workers=options['workers'], chunk_size=options['chunk_size'],
+                                 delete_old=not options['keep_old'], progress=progress, force=options['force'])
+            except (ConfigurationError, ReindexError) as e:
+                raise CommandError(str(e))
+            except RebuildError as e:
+                for error in e.result['errors'][:10]:
+                    self.stderr.write('  {}'.format(error))
+                raise CommandError('{} -- pass --force to swap anyway'.format(e))
+            self.stdout.write('{} now points at {}: {} indexed, {} deleted, {} failed'.format(
+                alias, result['index'], result['indexed'], result['deleted'], result['failed']))
+            for error in result['errors'][:10]:
+                self.stderr.write('  {}'.format(error))
@@ -0,0 +1,54 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+
+from ...bulk import DEFAULT_CHUNK_SIZE
+from ...errors import ConfigurationError
+from ...indexers import get_indexer_classes
+from ...reindex import CheckpointStore, get_indexer_label, sync
+from ..progress import make_progress
+
+
+class Command(BaseCommand):
+    """
+    catches elasticsearch up with the rows changed since the last sync
+    """
+
+    args = '[indexer or app_label.Model ...]'
+    help = 'Reindexes the rows changed since the last sync of the given (default: all) indexers with a ' \
+           '`Meta.updated_field` and deletes the documents of deleted rows.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', type='int', dest='chunk_size', default=DEFAULT_CHUNK_SIZE,
+                    help='number of rows per chunk and bulk request'),
+        make_option('--state-file', dest='state_file', default='.es_reindex.json',
+                    help='file the watermark of every indexer is recorded in'),
+        make_option('--full', action='store_true', dest='full', default=False,
+                    help='ignore the recorded watermarks and reindex every row'),
+        make_option('--no-delete', action='store_false', dest='delete', default=True,
+                    help='do not look for documents of deleted rows'),
+    )
+
+    def handle(self, *labels, **options):
+        autodiscover_modules('indexers')
+        try:
+            indexer_classes = get_indexer_classes(labels)
+        except ConfigurationError as e:
+            raise CommandError(str(e))
+
+        syncable = [cls for cls in indexer_classes if getattr(cls.Meta, 'updated_field', None)]
+        if labels and len(syncable) < len(indexer_classes):
+            raise CommandError('No Meta.updated_field on {}'.format(', '.join(
+                get_indexer_label(cls) for cls in indexer_classes if cls not in syncable)))
+
+        checkpoints = CheckpointStore(options['state_file'])
+        for indexer_class in syncable:
+            label = get_indexer_label(indexer_class)
+            self.stdout.write('syncing {}'.format(label))
+            result = sync(indexer_class, checkpoints, chunk_size=options['chunk_size'], full=options['full'],
+                          delete=options['delete'], progress=make_progress(self.stdout, label))
+            self.stdout.write('{}: {} indexed, {} deleted, {} unchanged, {} failed, watermark {}'.format(
+                label, result['indexed'], result['deleted'], result['skipped'], result['failed'], result['watermark']))
+            for error in result['errors'][:10]:
+                self.stderr.write('  {}'.format(error))
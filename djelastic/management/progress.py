@@ -0,0 +1,24 @@
+import time
+
+
+##
+# functions
+
+def make_progress(stdout, label: str) -> callable:
+    """creates a progress callback printing throughput and eta at most once a second
+
+    :param stdout: the stream to print to, e.g. a management command's `stdout`
+    :param label: the indexer label
+    :return: the progress callback, called with (indexed, failed, total, elapsed seconds)
+    """
+    last = [0.0]
+
+    def progress(indexed, failed, total, elapsed):
+        done = indexed + failed
+        if time.time() - last[0] < 1 and done < total:
+            return
+        last[0] = time.time()
+        rate = done / elapsed if elapsed else 0.0
+        eta = (total - done) / rate if rate else 0.0
+        stdout.write('{}: {}/{} ({} failed) {:.0f} docs/s, eta {:.0f}s'.format(label, done, total, failed, rate, eta))
+    return progress
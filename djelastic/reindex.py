@@ -0,0 +1,656 @@
+import errno
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from datetime import date, timedelta
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.db import connections as db_connections
+from django.db.models import Max
+from django.db.models.query import QuerySet
+
+from .aliases import (create_versioned_index, get_alias_indices, get_rebuild_alias, get_rebuild_check_interval,
+                      make_versioned_name)
+from .bulk import DEFAULT_CHUNK_SIZE
+from .cache import invalidate
+from .connections import connections
+from .errors import ConfigurationError, RebuildError, ReindexError
+from .indexers import REFRESH_NONE, get_indexer_classes, iter_chunks, iter_queryset_chunks
+
+
+##
+# constants
+
+MAX_REPORTED_ERRORS = 1000
+PARTITIONS_PER_WORKER = 4
+DEFAULT_REPLICAS = 1
+DEFAULT_REFRESH_INTERVAL = '1s'
+HEALTH_TIMEOUT = '5m'
+DEFAULT_SYNC_OVERLAP = 60
+SCROLL_TIMEOUT = '5m'
+
+
+##
+# worker process state
+
+_progress_queue = None
+
+
+##
+# objects
+
+class CheckpointStore(object):
+    """
+    persists reindexing state (e.g. the last committed pk per indexer) in a json file
+    """
+
+    def __init__(self, path: str):
+        """initializes a new store
+
+        :param path: the json file -- created on first write
+        """
+        self.path = path
+
+    def get(self, key: str, default: object=None) -> object:
+        """reads a value
+
+        :param key: the state key
+        :param default: returned if there is no value for the key
+        :return: the stored value
+        """
+        return self._load().get(key, default)
+
+    def set(self, key: str, value: object):
+        """writes a value -- the file is replaced atomically, so a crash never leaves a partial file
+
+        :param key: the state key
+        :param value: a json serializable value
+        """
+        state = self._load()
+        state[key] = value
+        self._dump(state)
+
+    def delete(self, key: str):
+        """removes a value
+
+        :param key: the state key
+        """
+        state = self._load()
+        if state.pop(key, None) is not None:
+            self._dump(state)
+
+    ##
+    # internal methods
+
+    def _load(self) -> dict:
+        """reads the whole state
+
+        :return: the state, empty if the file does not exist
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return {}
+
+    def _dump(self, state: dict):
+        """writes the whole state
+
+        :param state: the state
+        """
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, default=str)
+        # atomic on posix -- `os.replace` is python 3.3+
+        os.rename(tmp_path, self.path)
+
+
+##
+# functions
+
+def get_indexer_label(indexer_class: type) -> str:
+    """gets the label reindexing state is stored under for an indexer class
+
+    :param indexer_class: a ModelIndexer subclass
+    :return: the indexer's dotted path
+    """
+    return '{}.{}'.format(indexer_class.__module__, indexer_class.__name__)
+
+
+def reindex(indexer_class: type, queryset: QuerySet=None, chunk_size: int=DEFAULT_CHUNK_SIZE,
+            checkpoints: CheckpointStore=None, resume: bool=False, progress: callable=None,
+            refresh: bool or str=None, index_name: str=None, op_type: str='index') -> dict:
+    """streams all rows of an indexer's model into elasticsearch
+
+    rows are read in pk ordered keyset chunks (constant memory, a constant number of queries per chunk) and every
+    chunk is sent as one bulk request without refreshing. the index is refreshed once at the end, following the
+    indexer's refresh policy.
+
+    the checkpoint only advances past chunks whose rows were all indexed -- after the first chunk with a failure it
+    stays put and is kept at the end, so resuming retries the failed rows (and the rows after them)
+
+    :param indexer_class: a ModelIndexer subclass
+    :param queryset: the rows to index -- defaults to all rows of `Meta.model`
+    :param chunk_size: the number of rows per chunk (and bulk request)
+    :param checkpoints: records the last committed pk after every fully indexed chunk
+    :param resume: continue after the last committed pk found in `checkpoints`
+    :param progress: called after every chunk with (indexed, failed, total, elapsed seconds)
+    :param refresh: the refresh policy applied at the end -- defaults to the indexer's policy
+    :param index_name: the physical index to write to -- defaults to the indexer's index
+    :param op_type: the bulk operation type -- 'create' leaves documents that already exist alone
+    :return: {'indexed', 'failed', 'errors', 'last_pk'} -- `errors` holds up to MAX_REPORTED_ERRORS failed items,
+        `last_pk` is the last committed pk
+    """
+    indexer = indexer_class()
+    if index_name is not None:
+        indexer.index_name = index_name
+    label = get_indexer_label(indexer_class)
+    queryset = indexer.get_queryset(queryset)
+
+    start_after = None
+    if resume and checkpoints is not None:
+        start_after = checkpoints.get(label)
+        if start_after is not None:
+            logging.info('resuming reindex of %s after pk %s', label, start_after)
+            queryset = queryset.filter(pk__gt=start_after)
+    elif checkpoints is not None:
+        # a checkpoint left by an earlier run must not outlive a fresh one
+        checkpoints.delete(label)
+
+    total = queryset.count()
+    result = {'indexed': 0, 'failed': 0, 'errors': [], 'last_pk': start_after}
+    start = time.time()
+
+    for chunk in iter_queryset_chunks(queryset, chunk_size):
+        res = indexer.bulk_index(chunk, chunk_size=chunk_size, refresh=REFRESH_NONE, force=True, op_type=op_type)
+        result['indexed'] += res['success']
+        result['failed'] += res['failed']
+        result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+
+        # the chunk and every chunk before it are committed -- a crash from here on resumes after it
+        if not result['failed']:
+            result['last_pk'] = chunk[-1].pk
+            if checkpoints is not None:
+                checkpoints.set(label, result['last_pk'])
+        if progress is not None:
+            progress(result['indexed'], result['failed'], total, time.time() - start)
+
+    if indexer._get_refresh(refresh):
+        indexer.es.indices.refresh(index=indexer.index_name)
+    if checkpoints is not None and not result['failed']:
+        checkpoints.delete(label)
+
+    logging.info('reindexed %s: %s indexed, %s failed', label, result['indexed'], result['failed'])
+    return result
+
+
+def reindex_pks(indexer_class: type, pks, chunk_size: int=DEFAULT_CHUNK_SIZE, refresh: bool or str=None) -> dict:
+    """reindexes the documents of some rows -- the documents of rows that no longer exist are deleted
+
+    :param indexer_class: a ModelIndexer subclass
+    :param pks: the pks of the rows
+    :param chunk_size: the number of rows per chunk (and bulk request)
+    :param refresh: the refresh policy of every bulk request -- defaults to the indexer's policy
+    :return: {'indexed', 'deleted', 'skipped', 'failed', 'errors'}
+    """
+    indexer = indexer_class()
+    manager = indexer.Meta.model._default_manager
+    result = {'indexed': 0, 'deleted': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+
+    def add(res, count_key):
+        result[count_key] += res['success']
+        result['skipped'] += res.get('skipped', 0)
+        result['failed'] += res['failed']
+        result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+
+    for chunk in iter_chunks(set(pks), chunk_size):
+        rows = list(indexer.get_queryset(manager.filter(pk__in=chunk)))
+        if rows:
+            add(indexer.bulk_index(rows, chunk_size=chunk_size, refresh=refresh), 'indexed')
+        missing = set(chunk) - set(row.pk for row in rows)
+        if missing:
+            add(indexer.bulk_delete(missing, chunk_size=chunk_size, refresh=refresh), 'deleted')
+    return result
+
+
+def partition_pks(queryset: QuerySet, partitions: int) -> [(object, object)]:
+    """splits the pk space of a queryset into ranges holding roughly the same number of rows
+
+    boundaries are read from the pk ordered rows, so this works for any orderable pk type and for sparse pks
+
+    :param queryset: the rows to split
+    :param partitions: the number of ranges
+    :return: a list of (exclusive lower bound or None, inclusive upper bound or None)
+    """
+    queryset = queryset.order_by('pk')
+    count = queryset.count()
+    partitions = max(1, min(partitions, count))
+
+    pks = queryset.values_list('pk', flat=True)
+    boundaries = []
+    for i in range(1, partitions):
+        pk = pks[i * count // partitions - 1]
+        if not boundaries or pk != boundaries[-1]:
+            boundaries.append(pk)
+
+    lowers = [None] + boundaries
+    uppers = boundaries + [None]
+    return list(zip(lowers, uppers))
+
+
+def parallel_reindex(indexer_class: type, queryset: QuerySet=None, workers: int=None,
+                     chunk_size: int=DEFAULT_CHUNK_SIZE, partitions: int=None, progress: callable=None,
+                     refresh: bool or str=None, index_name: str=None, op_type: str='index') -> dict:
+    """streams all rows of an indexer's model into elasticsearch from a pool of worker processes
+
+    the pk space is split into `partitions` ranges (see `partition_pks`) which are reindexed by the workers, each
+    with its own database and elasticsearch connections. the index is refreshed once, after all ranges are done.
+    a worker process dying (killed, out of memory) takes its range with it -- the pool is terminated and the run
+    fails instead of waiting for that range forever.
+
+    :param indexer_class: a ModelIndexer subclass -- must be importable by the worker processes
+    :param queryset: the rows to index -- defaults to all rows of `Meta.model`
+    :param workers: the number of worker processes -- defaults to the number of cpus
+    :param chunk_size: the number of rows per chunk (and bulk request)
+    :param partitions: the number of pk ranges -- defaults to PARTITIONS_PER_WORKER per worker
+    :param progress: called with the aggregated (indexed, failed, total, elapsed seconds) as workers progress
+    :param refresh: the refresh policy applied at the end -- defaults to the indexer's policy
+    :param index_name: the physical index to write to -- defaults to the indexer's index
+    :param op_type: the bulk operation type -- 'create' leaves documents that already exist alone
+    :return: {'indexed', 'failed', 'errors'} -- `errors` holds up to MAX_REPORTED_ERRORS failed items or ranges,
+        the rows of a range whose worker crashed count as failed unless reported as indexed
+    :raise ReindexError: if a worker process died
+    """
+    workers = workers or multiprocessing.cpu_count()
+    partitions = partitions or workers * PARTITIONS_PER_WORKER
+
+    indexer = indexer_class()
+    if index_name is not None:
+        indexer.index_name = index_name
+    else:
+        indexer.ensure_index()
+    if queryset is None:
+        queryset = indexer.Meta.model._default_manager.all()
+    total = queryset.count()
+    ranges = partition_pks(queryset, partitions)
+    # querysets are evaluated when pickled, so workers get the (unevaluated) query
+    tasks = [(indexer_class, queryset.query, lower, upper, chunk_size, index_name, op_type) for lower, upper in ranges]
+
+    # forked workers must not share the parent's database sockets
+    for connection in db_connections.all():
+        connection.close()
+
+    result = {'indexed': 0, 'failed': 0, 'errors': []}
+    start = time.time()
+    manager = multiprocessing.Manager()
+    progress_queue = manager.Queue()
+    worker_pids = manager.list()
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(progress_queue, worker_pids))
+    try:
+        pending = pool.map_async(_reindex_range, tasks)
+        indexed, failed = 0, 0
+        while True:
+            try:
+                chunk_indexed, chunk_failed = progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                if pending.ready():
+                    break
+                # the pool replaces a dead worker, but the result of its range never arrives
+                dead = set(worker_pids) - set(process.pid for process in multiprocessing.active_children())
+                if dead:
+                    raise ReindexError('worker process {} of {} died, its pk range was not reindexed'.format(
+                        ', '.join(str(pid) for pid in sorted(dead)), get_indexer_label(indexer_class)))
+                continue
+            indexed += chunk_indexed
+            failed += chunk_failed
+            if progress is not None:
+                progress(indexed, failed, total, time.time() - start)
+
+        for res in pending.get():
+            result['indexed'] += res['indexed']
+            result['failed'] += res['failed']
+            result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        manager.shutdown()
+
+    if indexer._get_refresh(refresh):
+        indexer.es.indices.refresh(index=indexer.index_name)
+
+    logging.info('reindexed %s with %s workers: %s indexed, %s failed', get_indexer_label(indexer_class), workers,
+                 result['indexed'], result['failed'])
+    return result
+
+
+def rebuild(alias: str, indexer_classes: [type]=None, workers: int=1, chunk_size: int=DEFAULT_CHUNK_SIZE,
+            delete_old: bool=True, progress: callable=None, force: bool=False) -> dict:
+    """rebuilds all doc types behind an index alias into a fresh physical index and swaps the alias atomically
+
+    1. a new `<alias>_<timestamp>` index is created with every indexer's mapping, no replicas and refreshing
+       disabled, and the `<alias>_rebuilding` alias is pointed at it
+    2. after `ES_REBUILD_CHECK_INTERVAL` seconds -- when every process writes to the new index as well (see
+       `ModelIndexer._get_write_indices`) -- all rows are copied into it. the copy only creates documents, so a
+       document written by a live write in the meantime is newer than the copied row and wins
+    3. documents without a row are deleted from the new index -- a row deleted after the copy read it but before
+       the copy wrote it would otherwise come back with the swap
+    4. if any row failed to copy or delete, the new index is deleted and the alias keeps pointing at the old
+       indices -- unless `force` is set
+    5. replicas and the refresh interval of the live index are restored, the new index is refreshed and, once its
+       replicas are allocated, the alias is moved to it and the rebuild alias removed in one request
+    6. the old indices are deleted, unless `delete_old` is False
+
+    searches keep hitting the old index until the swap, so their latency is not affected by the rebuild
+
+    :param alias: the alias the indexers read and write through
+    :param indexer_classes: the indexers to rebuild -- defaults to all registered indexers using the alias
+    :param workers: the number of worker processes (see `parallel_reindex`), 1 for reindexing in process
+    :param chunk_size: the number of rows per chunk (and bulk request)
+    :param delete_old: delete the physical indices the alias pointed at before
+    :param progress: called with (indexer class, indexed, failed, total, elapsed seconds)
+    :param force: swap the alias even if rows failed to copy
+    :return: {'index', 'old_indices', 'indexed', 'deleted', 'failed', 'errors'}
+    :raise ConfigurationError: if there are no indexers for the alias or it names a physical index
+    :raise RebuildError: if rows failed to copy and `force` is not set -- its `result` holds the failures
+    """
+    if indexer_classes is None:
+        indexer_classes = [cls for cls in get_indexer_classes() if cls.index_name == alias]
+    if not indexer_classes:
+        raise ConfigurationError('No indexers found for index {}'.format(alias))
+    indexers = [cls() for cls in indexer_classes]
+    es = indexers[0].es
+
+    # the live index settings are restored on the new index
+    old_indices = get_alias_indices(es, alias)
+    if not old_indices and es.indices.exists(alias):
+        raise ConfigurationError('{} is an index, not an alias -- delete it or rename it to use versioned indices'
+                                 .format(alias))
+    index_settings = {'number_of_replicas': DEFAULT_REPLICAS, 'refresh_interval': DEFAULT_REFRESH_INTERVAL}
+    if old_indices:
+        live = es.indices.get_settings(index=old_indices[0])[old_indices[0]]['settings']['index']
+        index_settings['number_of_replicas'] = live.get('number_of_replicas', DEFAULT_REPLICAS)
+        index_settings['refresh_interval'] = live.get('refresh_interval', DEFAULT_REFRESH_INTERVAL)
+
+    # create the bulk tuned index behind the rebuild alias and let every process notice it
+    body = {
+        'settings': {'index': {'number_of_replicas': 0, 'refresh_interval': '-1'}},
+        'mappings': dict((indexer.doc_type_name, indexer.mapping) for indexer in indexers),
+    }
+    rebuild_alias = get_rebuild_alias(alias)
+    name = create_versioned_index(es, rebuild_alias, body=body, name=make_versioned_name(alias))
+    time.sleep(get_rebuild_check_interval())
+
+    result = {'index': name, 'old_indices': old_indices, 'indexed': 0, 'deleted': 0, 'failed': 0, 'errors': []}
+    try:
+        for indexer_class in indexer_classes:
+            callback = None if progress is None else functools.partial(progress, indexer_class)
+            if workers > 1:
+                res = parallel_reindex(indexer_class, workers=workers, chunk_size=chunk_size, progress=callback,
+                                       refresh=REFRESH_NONE, index_name=name, op_type='create')
+            else:
+                res = reindex(indexer_class, chunk_size=chunk_size, progress=callback, refresh=REFRESH_NONE,
+                              index_name=name, op_type='create')
+            result['indexed'] += res['indexed']
+            result['failed'] += res['failed']
+            result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+
+        # drop the documents of rows deleted while the copy ran -- refreshed first, the scroll only sees refreshed
+        # documents
+        es.indices.refresh(index=name)
+        for indexer_class in indexer_classes:
+            indexer = indexer_class()
+            indexer.index_name = name
+            queryset = indexer.Meta.model._default_manager.all()
+            for pks in iter_chunks(_iter_deleted_pks(indexer, queryset, chunk_size), chunk_size):
+                res = indexer.bulk_delete(pks, chunk_size=chunk_size, refresh=REFRESH_NONE)
+                result['deleted'] += res['success']
+                result['failed'] += res['failed']
+                result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+
+        # a partial copy must not replace the complete one
+        if result['failed'] and not force:
+            raise RebuildError('{} rows failed to copy into {}, {} still points at {}'.format(
+                result['failed'], name, alias, old_indices), result)
+
+        # restore the live settings and wait for the replicas before serving searches from the new index
+        es.indices.put_settings(body={'index': index_settings}, index=name)
+        es.indices.refresh(index=name)
+        health = es.cluster.health(index=name, wait_for_status='green', timeout=HEALTH_TIMEOUT)
+        if health.get('timed_out'):
+            logging.warning('replicas of %s not allocated after %s, swapping anyway', name, HEALTH_TIMEOUT)
+
+    except Exception:
+        logging.exception('rebuild of %s failed, deleting %s', alias, name)
+        es.indices.delete(index=name, ignore=404)
+        raise
+
+    # atomic swap -- the alias is read again, it may have been created while copying
+    old_indices = result['old_indices'] = get_alias_indices(es, alias)
+    actions = [{'remove': {'index': index, 'alias': alias}} for index in old_indices]
+    actions += [
+        {'add': {'index': name, 'alias': alias}},
+        {'remove': {'index': name, 'alias': rebuild_alias}},
+    ]
+    es.indices.update_aliases(body={'actions': actions})
+    invalidate(alias)
+    logging.info('alias %s swapped from %s to %s', alias, old_indices, name)
+
+    if delete_old and old_indices:
+        es.indices.delete(index=','.join(old_indices))
+    return result
+
+
+def sync(indexer_class: type, checkpoints: CheckpointStore, queryset: QuerySet=None,
+         chunk_size: int=DEFAULT_CHUNK_SIZE, full: bool=False, delete: bool=True, progress: callable=None,
+         refresh: bool or str=None) -> dict:
+    """brings an index up to date with the rows changed since the last sync -- a catch up, not a rebuild
+
+    1. rows whose `Meta.updated_field` is at or after the persisted watermark (minus `ES_SYNC_OVERLAP` seconds, to
+       cover transactions committing late) are reindexed in pk ordered chunks
+    2. documents of rows that no longer exist are found by merging the pk ordered document ids of the index with the
+       pk ordered rows, chunk by chunk, and deleted
+    3. the watermark advances to the highest `updated_field` value seen when the sync started -- it does not move
+       if anything failed, so the next sync retries
+
+    the pk merge needs the index to sort pks like the database does -- numeric pks, or not analyzed string pks
+
+    :param indexer_class: a ModelIndexer subclass with a `Meta.updated_field`
+    :param checkpoints: the store the watermark is persisted in
+    :param queryset: the rows that should be indexed -- defaults to all rows of `Meta.model`
+    :param chunk_size: the number of rows per chunk (and bulk request)
+    :param full: ignore the watermark and reindex every row, unchanged documents included
+    :param delete: delete the documents of rows that no longer exist
+    :param progress: called after every reindexed chunk with (indexed, failed, total, elapsed seconds)
+    :param refresh: the refresh policy applied at the end -- defaults to the indexer's policy
+    :return: {'indexed', 'deleted', 'skipped', 'failed', 'errors', 'watermark'} -- `skipped` counts the unchanged
+        documents (see `fingerprints`)
+    :raise ConfigurationError: if the indexer has no `Meta.updated_field`
+    """
+    indexer = indexer_class()
+    updated_field = getattr(indexer.Meta, 'updated_field', None)
+    if updated_field is None:
+        raise ConfigurationError('{} has no Meta.updated_field'.format(indexer_class.__name__))
+    if queryset is None:
+        queryset = indexer.Meta.model._default_manager.all()
+    label = get_indexer_label(indexer_class)
+    key = '{}:watermark'.format(label)
+
+    # the next watermark is read before any row is indexed, rows changing from now on are picked up next time
+    next_watermark = queryset.aggregate(watermark=Max(updated_field))['watermark']
+    changed = queryset
+    watermark = None if full else _load_watermark(indexer, updated_field, checkpoints.get(key))
+    if watermark is not None:
+        changed = queryset.filter(**{'{}__gte'.format(updated_field): watermark})
+    changed = indexer.get_queryset(changed)
+
+    total = changed.count()
+    result = {'indexed': 0, 'deleted': 0, 'skipped': 0, 'failed': 0, 'errors': [], 'watermark': next_watermark}
+    start = time.time()
+    logging.info('syncing %s: %s rows changed since %s', label, total, watermark)
+
+    def add(res, count_key):
+        result[count_key] += res['success']
+        result['skipped'] += res.get('skipped', 0)
+        result['failed'] += res['failed']
+        result['errors'] += res['errors'][:MAX_REPORTED_ERRORS - len(result['errors'])]
+
+    for chunk in iter_queryset_chunks(changed, chunk_size):
+        add(indexer.bulk_index(chunk, chunk_size=chunk_size, refresh=REFRESH_NONE, force=full), 'indexed')
+        if progress is not None:
+            progress(result['indexed'], result['failed'], total, time.time() - start)
+
+    if delete:
+        for pks in iter_chunks(_iter_deleted_pks(indexer, queryset, chunk_size), chunk_size):
+            add(indexer.bulk_delete(pks, chunk_size=chunk_size, refresh=REFRESH_NONE), 'deleted')
+
+    if indexer._get_refresh(refresh):
+        indexer.es.indices.refresh(index=indexer.index_name)
+    if not result['failed'] and next_watermark is not None:
+        checkpoints.set(key, next_watermark.isoformat() if isinstance(next_watermark, date) else next_watermark)
+
+    logging.info('synced %s: %s indexed, %s deleted, %s skipped, %s failed', label, result['indexed'],
+                 result['deleted'], result['skipped'], result['failed'])
+    return result
+
+
+def _load_watermark(indexer, updated_field: str, value: object) -> object:
+    """turns a persisted watermark back into a value of the updated field, minus the sync overlap
+
+    :param indexer: the ModelIndexer
+    :param updated_field: the name of the model field rows are synced by
+    :param value: the persisted watermark, None if there is none
+    :return: the lower bound of the rows to sync, None to sync every row
+    """
+    if value is None:
+        return None
+    value = indexer.Meta.model._meta.get_field(updated_field).to_python(value)
+    if isinstance(value, date):
+        value -= timedelta(seconds=getattr(settings, 'ES_SYNC_OVERLAP', DEFAULT_SYNC_OVERLAP))
+    return value
+
+
+def _iter_deleted_pks(indexer, queryset: QuerySet, chunk_size: int):
+    """finds the documents whose rows no longer exist by merging two pk ordered streams -- the document ids of the
+    index (scrolled in `chunk_size` batches) and the pks of the rows (read in `chunk_size` keyset chunks)
+
+    :param indexer: the ModelIndexer
+    :param queryset: the rows that should be indexed
+    :param chunk_size: the number of ids read per round trip
+    :return: a generator of the pks of documents without a row
+    """
+    end = object()
+    row_pks = _iter_row_pks(queryset, chunk_size)
+    row_pk = next(row_pks, end)
+    for doc_pk in _iter_document_pks(indexer, chunk_size):
+        while row_pk is not end and row_pk < doc_pk:
+            row_pk = next(row_pks, end)
+        if row_pk is end or row_pk != doc_pk:
+            yield doc_pk
+
+
+def _iter_row_pks(queryset: QuerySet, chunk_size: int):
+    """iterates over the pks of a queryset in pk order using keyset pagination
+
+    :param queryset: the rows
+    :param chunk_size: the number of pks per query
+    :return: a generator of pks
+    """
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        chunk = list((queryset if last_pk is None else queryset.filter(pk__gt=last_pk))[:chunk_size])
+        for pk in chunk:
+            yield pk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1]
+
+
+def _iter_document_pks(indexer, chunk_size: int):
+    """iterates over the document ids of an indexer's doc type in pk order through a scroll
+
+    :param indexer: the ModelIndexer
+    :param chunk_size: the number of ids per round trip
+    :return: a generator of model pks
+    """
+    to_python = indexer.Meta.model._meta.pk.to_python
+    body = {'query': {'match_all': {}}, 'sort': [{indexer.model_pk_name: 'asc'}], '_source': False}
+    res = indexer.es.search(index=indexer.index_name, doc_type=indexer.doc_type_name, body=body,
+                            scroll=SCROLL_TIMEOUT, size=chunk_size)
+    scroll_id = res.get('_scroll_id')
+    try:
+        while res['hits']['hits']:
+            for hit in res['hits']['hits']:
+                yield to_python(hit['_id'])
+            res = indexer.es.scroll(scroll_id, scroll=SCROLL_TIMEOUT)
+            scroll_id = res.get('_scroll_id', scroll_id)
+    finally:
+        if scroll_id is not None:
+            indexer.es.clear_scroll(scroll_id=scroll_id, ignore=404)
+
+
+def _init_worker(progress_queue, worker_pids):
+    """sets up a reindex worker process
+
+    :param progress_queue: the queue chunk progress is reported to
+    :param worker_pids: the shared list the worker adds its pid to, so the parent notices when it dies
+    """
+    global _progress_queue
+    _progress_queue = progress_queue
+    worker_pids.append(os.getpid())
+
+    # spawned (not forked) workers start without a configured django
+    if not apps.ready:
+        django.setup()
+
+    # drop elasticsearch clients inherited from the parent -- their pools hold the parent's sockets
+    connections.reset()
+
+
+def _reindex_range(task: tuple) -> dict:
+    """reindexes one pk range in a worker process
+
+    :param task: (indexer class, query, exclusive lower bound, inclusive upper bound, chunk size, index name, op type)
+    :return: {'indexed', 'failed', 'errors'}
+    """
+    indexer_class, query, lower, upper, chunk_size, index_name, op_type = task
+    queryset = indexer_class.Meta.model._default_manager.all()
+    queryset.query = query
+    if lower is not None:
+        queryset = queryset.filter(pk__gt=lower)
+    if upper is not None:
+        queryset = queryset.filter(pk__lte=upper)
+
+    last = [0, 0]
+
+    def progress(indexed, failed, total, elapsed):
+        _progress_queue.put((indexed - last[0], failed - last[1]))
+        last[0], last[1] = indexed, failed
+
+    try:
+        return reindex(indexer_class, queryset=queryset, chunk_size=chunk_size, progress=progress,
+                       refresh=REFRESH_NONE, index_name=index_name, op_type=op_type)
+    except Exception as e:
+        logging.exception('reindexing pk range (%s, %s] failed', lower, upper)
+        error = {'range': (lower, upper), 'error': str(e)}
+
+    # the rows of the range not reported as indexed failed -- a crashed range counts as failed even if none are left
+    try:
+        failed = queryset.count() - last[0]
+    except Exception:
+        logging.exception('counting the rows of pk range (%s, %s] failed', lower, upper)
+        failed = 0
+    failed = max(failed, last[1], 1)
+    _progress_queue.put((0, failed - last[1]))
+    return {'indexed': last[0], 'failed': failed, 'errors': [error]}
@@ -0,0 +1,223 @@
+import threading
+from collections import OrderedDict
+
+from .errors import ConfigurationError
+from .fields import DJANGO_TO_ES, get_converter, get_many_converter
+
+
+##
+# result classes, per indexer class
+
+_result_classes = {}
+_result_classes_lock = threading.Lock()
+
+
+##
+# objects
+
+class SourceResult(object):
+    """
+    lightweight search result built straight from a hit's `_source` -- no database access involved
+
+    subclasses are generated per indexer with one slot per document field (see `get_result_class`) -- fields must
+    not be named like an attribute of this class, e.g. `_id`, `_type`, `_index` or `_score`
+    """
+
+    __slots__ = ('_id', '_type', '_index', '_score')
+    _converters = ()
+    _indexer = None
+
+    def __init__(self, hit: dict):
+        """initializes the result from a raw elasticsearch hit, converting values with the fields' `to_python`
+
+        :param hit: the raw hit, {'_id', '_type', '_index', '_score', '_source'}
+        """
+        self._id = hit.get('_id')
+        self._type = hit.get('_type')
+        self._index = hit.get('_index')
+        self._score = hit.get('_score')
+        source = hit.get('_source') or {}
+        for name, converter, _ in self._converters:
+            value = source.get(name)
+            if converter is not None and value is not None:
+                value = converter(value)
+            setattr(self, name, value)
+
+    @classmethod
+    def from_hits(cls, hits: [dict]) -> list:
+        """builds the results of many hits column-wise -- every field is converted with one `to_python_many` call
+
+        :param hits: the raw hits
+        :return: the results, in the order of `hits`
+        """
+        results = []
+        for hit in hits:
+            result = cls.__new__(cls)
+            result._id = hit.get('_id')
+            result._type = hit.get('_type')
+            result._index = hit.get('_index')
+            result._score = hit.get('_score')
+            results.append(result)
+
+        sources = [hit.get('_source') or {} for hit in hits]
+        for name, _, many_converter in cls._converters:
+            column = [source.get(name) for source in sources]
+            if many_converter is not None:
+                column = many_converter(column)
+            for result, value in zip(results, column):
+                setattr(result, name, value)
+        return results
+
+    def __repr__(self) -> str:
+        return '<{}: {}>'.format(type(self).__name__, self._id)
+
+    def __reduce__(self):
+        # generated result classes are not importable -- they are pickled through their indexer
+        names = [name for cls in type(self).__mro__ for name in getattr(cls, '__slots__', ())]
+        state = dict((name, getattr(self, name, None)) for name in names)
+        if self._indexer is not None:
+            return _restore_result, (self._indexer, None, state)
+        return _restore_result, (None, type(self), state)
+
+
+class RawSourceResult(SourceResult):
+    """
+    search result for hits without a registered indexer -- the `_source` is kept as is
+    """
+
+    __slots__ = ('_source',)
+
+    def __init__(self, hit: dict):
+        super(RawSourceResult, self).__init__(hit)
+        self._source = hit.get('_source') or {}
+
+    @classmethod
+    def from_hits(cls, hits: [dict]) -> list:
+        results = super(RawSourceResult, cls).from_hits(hits)
+        for result, hit in zip(results, hits):
+            result._source = hit.get('_source') or {}
+        return results
+
+
+class SearchPage(object):
+    """
+    one page of a paginated search
+    """
+
+    __slots__ = ('results', 'total', 'number', 'per_page')
+
+    def __init__(self, results: list, total: int, number: int, per_page: int):
+        """initializes a new page
+
+        :param results: the results on this page
+        :param total: the total number of hits of the search
+        :param number: the 1-based page number
+        :param per_page: the number of hits per page
+        """
+        self.results = results
+        self.total = total
+        self.number = number
+        self.per_page = per_page
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    @property
+    def num_pages(self) -> int:
+        return max(1, (self.total + self.per_page - 1) // self.per_page)
+
+    @property
+    def has_next(self) -> bool:
+        return self.number < self.num_pages
+
+    @property
+    def has_previous(self) -> bool:
+        return self.number > 1
+
+
+##
+# functions
+
+def get_result_class(indexer) -> type:
+    """gets (or lazily creates) the result class of an indexer -- a `SourceResult` with a slot per document field
+
+    :param indexer: a ModelIndexer (or ModelIndexer subclass)
+    :return: the result class
+    :raise ConfigurationError: if a document field is named like a `SourceResult` attribute
+    """
+    cls = indexer if isinstance(indexer, type) else type(indexer)
+    try:
+        return _result_classes[cls]
+    except KeyError:
+        pass
+
+    converters = []
+    for name, field in cls._mapped_fields.items():
+        converter = get_converter(field, 'to_python')
+        converters.append((name, converter, None if converter is None else get_many_converter(field, 'to_python')))
+
+    # the model pk is always part of the document
+    pk = cls.Meta.model._meta.pk
+    if pk.name not in cls._mapped_fields:
+        es_type = DJANGO_TO_ES.get(pk.get_internal_type())
+        if es_type is None:
+            converters.append((pk.name, None, None))
+        else:
+            field = es_type(pk.name)
+            converters.append((pk.name, field.to_python, field.to_python_many))
+
+    # a slot named like a hit attribute (or a method) would shadow it
+    reserved = [name for name, _, _ in converters if hasattr(SourceResult, name)]
+    if reserved:
+        raise ConfigurationError('Fields {} of {} are named like SourceResult attributes -- rename them'.format(
+            ', '.join(reserved), cls.__name__))
+
+    attributes = {
+        '__slots__': tuple(name for name, _, _ in converters),
+        '_converters': tuple(converters),
+        '_indexer': cls,
+    }
+    result_class = type('{}Result'.format(cls.Meta.model.__name__), (SourceResult,), attributes)
+    with _result_classes_lock:
+        return _result_classes.setdefault(cls, result_class)
+
+
+def make_source_results(hits: [dict], indexers: dict) -> [SourceResult]:
+    """builds lightweight results from raw elasticsearch hits, keeping their order
+
+    the hits are grouped by result class and converted column-wise (see `SourceResult.from_hits`)
+
+    :param hits: the raw hits
+    :param indexers: ModelIndexer classes by doc type name -- hits of other doc types become `RawSourceResult`s
+    :return: the results
+    """
+    groups = OrderedDict()
+    for position, hit in enumerate(hits):
+        indexer = indexers.get(hit.get('_type'))
+        result_class = RawSourceResult if indexer is None else get_result_class(indexer)
+        groups.setdefault(result_class, []).append(position)
+
+    results = [None] * len(hits)
+    for result_class, positions in groups.items():
+        for position, result in zip(positions, result_class.from_hits([hits[position] for position in positions])):
+            results[position] = result
+    return results
+
+
+def _restore_result(indexer: type, result_class: type, state: dict) -> SourceResult:
+    """unpickles a result
+
+    :param indexer: the indexer class the result class was generated for, if any
+    :param result_class: the result class, if it was not generated
+    :param state: the slot values
+    :return: the result
+    """
+    if indexer is not None:
+        result_class = get_result_class(indexer)
+    result = result_class.__new__(result_class)
+    for name, value in state.items():
+        setattr(result, name, value)
+    return result
@@ -1,13 +1,33 @@
 import logging
+from collections import OrderedDict
 
 from django.conf import settings
 from django.db.models import Model
-from django.db.models.loading import get_model
 from elasticsearch import Elasticsearch
 from elasticsearch_dsl import Search, F
 
-from .errors import ConfigurationError
-from .indexers import ModelIndexer
+from .cache import SearchCache, get_search_cache
+from .connections import get_connection
+from .errors import ConfigurationError, SearchError
+from .hydration import Hydrator
+from .indexers import ModelIndexer, get_doc_type_indexers
+from .instrumentation import PHASE_SEARCH, timed
+from .results import SearchPage, SourceResult, make_source_results
+
+
+##
+# response filtering of hydrated searches -- only what hydration needs is sent back (elasticsearch 1.6+, older
+# versions ignore the parameter)
+
+HYDRATION_FILTER_PATH = 'took,timed_out,_scroll_id,hits.total,hits.hits._type,hits.hits._id,hits.hits._score'
+MULTI_HYDRATION_FILTER_PATH = ','.join(
+    ['responses.error'] + ['responses.{}'.format(path) for path in HYDRATION_FILTER_PATH.split(',')])
+
+
+##
+# in-process search cache, used if ES_SEARCH_CACHE is not configured
+
+_process_cache = None
 
 
 ##
@@ -15,14 +35,16 @@ from .indexers import ModelIndexer
 
 class BasicSearcher(object):
 
-    def __init__(self, es: Elasticsearch, index_name: str=None):
-        """
+    def __init__(self, es: Elasticsearch or str=None, index_name: str=None, cache: bool or SearchCache=False):
+        """initializes a new searcher
 
-        :param es:
-        :param index_name:
+        :param es: a client or the name of a connection in `ES_CONNECTIONS` -- defaults to the default connection
+        :param index_name: the index to search -- defaults to `ES_INDEX_NAME`
+        :param cache: cache search results -- True for the `ES_SEARCH_CACHE` cache, or a `SearchCache`
         :return:
         """
-        self.es = es
+        self.es = get_connection(es)
+        self.cache = get_cache(cache)
 
         if index_name:
             self.index_name = index_name
@@ -34,12 +56,56 @@ class BasicSearcher(object):
 
         super(BasicSearcher, self).__init__()
 
-    def search(self, query: str, filters: [(str, str)]=None) -> [Model]:
+    def search(self, query: str, filters: [(str, str)]=None, hydrate: bool=True, only: [str] or dict=None,
+               defer: [str] or dict=None) -> [Model] or [SourceResult]:
         """performs a search against elasticsearch
 
-        :param query:
-        :param filters:
-        :return:
+        :param query: query terms to search by
+        :param filters: (attribute, value) filters to limit the query results
+        :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+        :param only: model fields to load when hydrating -- a list for every model or a {model: list} dict
+        :param defer: model fields not to load when hydrating -- a list for every model or a {model: list} dict
+        :return: a list of models with an additional `es_score` value added, or a list of `SourceResult`s
+        """
+        # serve from the cache -- the key holds the generations read before searching
+        if self.cache is not None:
+            key = self.cache.make_key(self.index_name, None, query, filters, hydrate, only, defer)
+            results = self.cache.get(key)
+            if results is None:
+                results = self._search(query, filters, hydrate, only, defer)
+                self.cache.set(key, results)
+            return results
+        return self._search(query, filters, hydrate, only, defer)
+
+    ##
+    # internal methods
+
+    def _search(self, query: str, filters: [(str, str)]=None, hydrate: bool=True, only: [str] or dict=None,
+                defer: [str] or dict=None) -> [Model] or [SourceResult]:
+        """performs a search against elasticsearch -- see `search`
+        """
+        body = make_body(self._build_search(query, filters), hydrate)
+        with timed(PHASE_SEARCH, sender=type(self), index=self.index_name, query=query, filters=filters) as info:
+            res = self.es.search(index=self.index_name, body=body, params=get_params(hydrate))
+            info['took'] = res.get('took')
+
+        # skip the database entirely
+        if not hydrate:
+            return make_source_results(get_response_hits(res), get_doc_type_indexers())
+
+        # pull the hits from the database, in elasticsearch order
+        instances = Hydrator(only=only, defer=defer).hydrate(_get_hits(get_response_hits(res)))
+
+        # return
+        logging.debug('%s hits for search (query=%s, filters=%s)', len(instances), query, filters)
+        return instances
+
+    def _build_search(self, query: str, filters: [(str, str)]=None) -> Search:
+        """builds the search object
+
+        :param query: query terms to search by
+        :param filters: (attribute, value) filters to limit the query results
+        :return: the search
         """
         # build up search
         s = Search(using=self.es).index(self.index_name).query('match', _all=query)
@@ -48,45 +114,16 @@ class BasicSearcher(object):
         if filters:
             for key, value in filters:
                 s = s.filter(F({'term': {key: value}}))
+        return s
 
-        # execute search
-        res = s.execute()
+    def _make_request(self, query: str, filters: [(str, str)]=None) -> (dict, dict):
+        """builds the multi search request lines of a search
 
-        # build up django query
-        results = {}
-        for hit in res:
-            # get the model
-            dj_type = hit._meta.doc_type
-            model = get_model(dj_type)
-
-            # get the pk
-            pk_name = model._meta.pk.name
-            pk = getattr(hit, pk_name)
-
-            # get the score
-            score = hit._meta.score
-
-            # add to mapping
-            results.setdefault(model, {})
-            results[model][pk] = score
-
-        # get queryset
-        querysets = []
-        for model, pk_score in results.items():
-            qs = model.objects.filter(pk__in=pk_score.keys())
-            querysets += list(qs)
-
-        # attach scores to instances
-        for instance in querysets:
-            score = results[type(instance)][instance.pk]
-            instance._meta.es_score = score
-
-        # order by score
-        querysets = sorted(querysets, key=lambda i: i._meta.es_score, reverse=True)
-
-        # return
-        logging.debug('{} hits for search (query={}, filters={})'.format(len(querysets), query, filters))
-        return querysets
+        :param query: query terms to search by
+        :param filters: (attribute, value) filters to limit the query results
+        :return: the (header, body) of the search
+        """
+        return {'index': self.index_name}, self._build_search(query, filters).to_dict()
 
 
 ##
@@ -94,24 +131,113 @@ class BasicSearcher(object):
 
 class ModelSearcher(object):
 
-    def __init__(self, indexer: ModelIndexer):
+    def __init__(self, indexer: ModelIndexer, es: Elasticsearch or str=None, cache: bool or SearchCache=False):
         """initializes a new searcher
 
         :param indexer: an instance of ModelIndexer
+        :param es: a client or connection name to search with -- defaults to the indexer's connection
+        :param cache: cache `search` and `page` results -- True for the `ES_SEARCH_CACHE` cache, or a `SearchCache`
         :return:
         """
         self.indexer = indexer
+        self.es = indexer.es if es is None else get_connection(es)
+        self.cache = get_cache(cache)
 
-    def search(self, query: str, filters: dict=None, only_this_type: bool=True, **kwargs: dict) -> list:
+    def search(self, query: str, filters: dict=None, only_this_type: bool=True, hydrate: bool=True,
+               only: [str] or dict=None, defer: [str] or dict=None, **kwargs: dict) -> list:
         """performs a search against elasticsearch and then pulls the corresponding data from the db
 
         :param query: query terms to search by
         :param filters: named (attribute, value) filters to limit the query results
+        :param only_this_type: only search the indexer's doc type
+        :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+        :param only: model fields to load when hydrating -- a list for every model or a {model: list} dict
+        :param defer: model fields not to load when hydrating -- a list for every model or a {model: list} dict
         :param kwargs: additional search keyword arguments
-        :return: a list of models with an additional `__score` value added
+        :return: a list of models with an additional `es_score` value added, or a list of `SourceResult`s
+        """
+        key = self._make_cache_key(only_this_type, 'search', query, filters, hydrate, only, defer)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        # hydrated searches only fetch what hydration needs -- no `_source`, no elasticsearch_dsl wrappers
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        res = self._timed_search(body, hydrate, only_this_type, query, filters)
+        return self._set_cached(key, self._make_results(get_response_hits(res), hydrate, only, defer))
+
+    def iter_search(self, query: str, filters: dict=None, only_this_type: bool=True, batch_size: int=500,
+                    hydrate: bool=True, only: [str] or dict=None, defer: [str] or dict=None, scroll: str='5m'):
+        """streams all hits of a search through a scroll, converting them one batch at a time
+
+        memory stays bounded by `batch_size` however many documents match -- useful for exports and batch jobs
+
+        :param query: query terms to search by
+        :param filters: named (attribute, value) filters to limit the query results
+        :param only_this_type: only search the indexer's doc type
+        :param batch_size: the number of hits fetched (and hydrated) per round trip
+        :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+        :param only: model fields to load when hydrating -- a list for every model or a {model: list} dict
+        :param defer: model fields not to load when hydrating -- a list for every model or a {model: list} dict
+        :param scroll: how long elasticsearch keeps the scroll context alive between batches
+        :return: a generator of models with an additional `es_score` value added, or of `SourceResult`s
+        """
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        res = self.es.search(index=self.indexer.index_name, doc_type=self._get_doc_type(only_this_type), body=body,
+                             scroll=scroll, size=batch_size, params=get_params(hydrate))
+        scroll_id = res.get('_scroll_id')
+        try:
+            while get_response_hits(res):
+                for result in self._make_results(get_response_hits(res), hydrate, only, defer):
+                    yield result
+                res = self.es.scroll(scroll_id, scroll=scroll, params=get_params(hydrate))
+                scroll_id = res.get('_scroll_id', scroll_id)
+        finally:
+            if scroll_id is not None:
+                self.es.clear_scroll(scroll_id=scroll_id, ignore=404)
+
+    def page(self, query: str, filters: dict=None, only_this_type: bool=True, page: int=1, per_page: int=20,
+             hydrate: bool=True, only: [str] or dict=None, defer: [str] or dict=None) -> SearchPage:
+        """performs a from/size paginated search -- meant for ui pages, use `iter_search` to go deep
+
+        :param query: query terms to search by
+        :param filters: named (attribute, value) filters to limit the query results
+        :param only_this_type: only search the indexer's doc type
+        :param page: the 1-based page number
+        :param per_page: the number of hits per page
+        :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+        :param only: model fields to load when hydrating -- a list for every model or a {model: list} dict
+        :param defer: model fields not to load when hydrating -- a list for every model or a {model: list} dict
+        :return: the page, with its results and the total number of hits
+        :raise ValueError: if `per_page` is less than 1
+        """
+        if per_page < 1:
+            raise ValueError('per_page must be at least 1, got {}'.format(per_page))
+        key = self._make_cache_key(only_this_type, 'page', query, filters, page, per_page, hydrate, only, defer)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        body = make_body(self._build_search(query, filters, only_this_type), hydrate)
+        body['from'] = (max(page, 1) - 1) * per_page
+        body['size'] = per_page
+        res = self._timed_search(body, hydrate, only_this_type, query, filters, page=page)
+        results = self._make_results(get_response_hits(res), hydrate, only, defer)
+        return self._set_cached(key, SearchPage(results, res['hits']['total'], max(page, 1), per_page))
+
+    ##
+    # internal methods
+
+    def _build_search(self, query: str, filters: dict=None, only_this_type: bool=True) -> Search:
+        """builds the search object
+
+        :param query: query terms to search by
+        :param filters: named (attribute, value) filters to limit the query results
+        :param only_this_type: only search the indexer's doc type
+        :return: the search
         """
         # build base search object
-        s = Search(using=self.indexer.es).index(self.indexer.index_name)
+        s = Search(using=self.es).index(self.indexer.index_name)
         if only_this_type:
             s = s.doc_type(self.indexer.doc_type_name)
 
@@ -122,41 +248,209 @@ class ModelSearcher(object):
         if filters is not None:
             for attr, value in filters.items():
                 s = s.filter(F({'term': {attr: value}}))
+        return s
+
+    def _make_request(self, query: str, filters: dict=None, only_this_type: bool=True) -> (dict, dict):
+        """builds the multi search request lines of a search
+
+        :param query: query terms to search by
+        :param filters: named (attribute, value) filters to limit the query results
+        :param only_this_type: only search the indexer's doc type
+        :return: the (header, body) of the search
+        """
+        header = {'index': self.indexer.index_name}
+        if only_this_type:
+            header['type'] = self.indexer.doc_type_name
+        return header, self._build_search(query, filters, only_this_type).to_dict()
+
+    def _timed_search(self, body: dict, hydrate: bool, only_this_type: bool, query: str, filters: dict=None,
+                      **info: dict) -> dict:
+        """performs a search request, reporting its duration (see `instrumentation`)
+
+        :param body: the search body -- see `make_body`
+        :param hydrate: the hits will be hydrated -- see `get_params`
+        :param only_this_type: only search the indexer's doc type
+        :param query: the query terms, for the report
+        :param filters: the filters, for the report
+        :param info: additional details for the report
+        :return: the raw response
+        """
+        doc_type = self._get_doc_type(only_this_type)
+        with timed(PHASE_SEARCH, sender=type(self), index=self.indexer.index_name, doc_type=doc_type, query=query,
+                   filters=filters, **info) as stats:
+            res = self.es.search(index=self.indexer.index_name, doc_type=doc_type, body=body,
+                                 params=get_params(hydrate))
+            stats['took'] = res.get('took')
+        return res
+
+    def _make_cache_key(self, only_this_type: bool, *key_parts: object) -> str or None:
+        """creates the cache key of a search -- once, before searching, so the results are stored under the
+        generations they were read at (see `SearchCache`)
+
+        :param only_this_type: only the indexer's doc type is searched
+        :param key_parts: everything else the results depend on
+        :return: the cache key, or None if there is no cache
+        """
+        if self.cache is None:
+            return None
+        return self.cache.make_key(self.indexer.index_name, self._get_doc_type(only_this_type), *key_parts)
 
-        # execute query
-        res = s.execute()
+    def _get_cached(self, key: str or None) -> object:
+        """reads cached results
+
+        :param key: the cache key -- see `_make_cache_key`
+        :return: the results, or None if there is no cache or on a miss
+        """
+        if key is None:
+            return None
+        return self.cache.get(key)
 
-        # build up django query
-        results = {}
-        for hit in res:
-            # get the model
-            dj_type = hit._meta.doc_type
-            model = get_model(dj_type)
+    def _set_cached(self, key: str or None, results: object) -> object:
+        """caches results
 
-            # get the pk
-            pk_name = model._meta.pk.name
-            pk = getattr(hit, pk_name)
+        :param key: the cache key made before searching -- see `_make_cache_key`
+        :param results: the results
+        :return: the results
+        """
+        if key is not None:
+            self.cache.set(key, results)
+        return results
 
-            # get the score
-            score = hit._meta.score
+    def _get_doc_type(self, only_this_type: bool=True) -> str or None:
+        """gets the doc type to search
 
-            # add to mapping
-            results.setdefault(model, {})
-            results[model][pk] = score
+        :param only_this_type: only search the indexer's doc type
+        :return: the indexer's doc type name, or None for all doc types
+        """
+        return self.indexer.doc_type_name if only_this_type else None
 
-        # get queryset
-        querysets = []
-        for model, pk_score in results.items():
-            qs = model.objects.filter(pk__in=pk_score.keys())
-            querysets += list(qs)
+    def _make_results(self, hits: [dict], hydrate: bool, only: [str] or dict=None,
+                      defer: [str] or dict=None) -> list:
+        """turns raw elasticsearch hits into results
 
-        # attach scores to instances
-        for instance in querysets:
-            score = results[type(instance)][instance.pk]
-            instance._meta.es_score = score
+        :param hits: the raw hits
+        :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+        :param only: model fields to load when hydrating
+        :param defer: model fields not to load when hydrating
+        :return: models with an additional `es_score` value added, or `SourceResult`s
+        """
+        if hydrate:
+            return Hydrator(only=only, defer=defer).hydrate(_get_hits(hits))
+        indexers = dict(get_doc_type_indexers(), **{self.indexer.doc_type_name: type(self.indexer)})
+        return make_source_results(hits, indexers)
 
-        # order by score
-        querysets = sorted(querysets, key=lambda i: i._meta.es_score, reverse=True)
 
-        # return
-        return querysets
+##
+# multi searching -- several independent searches in one round trip
+
+def search_many(searches: [tuple], hydrate: bool=True, only: [str] or dict=None,
+                defer: [str] or dict=None) -> [list]:
+    """performs several searches with one multi search request (per client) and hydrates them together
+
+    all hits of all searches are pulled from the database with one query per model
+
+    :param searches: (searcher, query) or (searcher, query, filters) tuples -- searchers are `BasicSearcher`s or
+        `ModelSearcher`s
+    :param hydrate: pull the hits from the database -- if False, lightweight results are built from `_source`
+    :param only: model fields to load when hydrating -- a list for every model or a {model: list} dict
+    :param defer: model fields not to load when hydrating -- a list for every model or a {model: list} dict
+    :return: the results of every search, in the order of `searches`
+    :raise SearchError: if any of the searches failed
+    """
+    # group the searches by client, remembering their positions
+    groups = OrderedDict()
+    for position, search in enumerate(searches):
+        searcher, query = search[:2]
+        filters = search[2] if len(search) > 2 else None
+        groups.setdefault(searcher.es, []).append((position, searcher._make_request(query, filters)))
+
+    # one round trip per client
+    hit_lists = [None] * len(searches)
+    for es, requests in groups.items():
+        body = []
+        for _, (header, search_body) in requests:
+            if hydrate:
+                search_body['_source'] = False
+            body += [header, search_body]
+        with timed(PHASE_SEARCH, searches=len(requests)):
+            res = es.msearch(body, params={'filter_path': MULTI_HYDRATION_FILTER_PATH} if hydrate else {})
+        for (position, _), response in zip(requests, res['responses']):
+            if 'error' in response:
+                logging.error('search %s of multi search failed: %s', position, response['error'])
+                raise SearchError('Search {} failed: {}'.format(position, response['error']))
+            hit_lists[position] = get_response_hits(response)
+
+    if hydrate:
+        return Hydrator(only=only, defer=defer).hydrate_many([_get_hits(hits) for hits in hit_lists])
+
+    indexers = get_doc_type_indexers()
+    for search in searches:
+        if isinstance(search[0], ModelSearcher):
+            indexers = dict(indexers, **{search[0].indexer.doc_type_name: type(search[0].indexer)})
+    return [make_source_results(hits, indexers) for hits in hit_lists]
+
+
+##
+# functions
+
+def get_cache(cache: bool or SearchCache) -> SearchCache or None:
+    """resolves a searcher's cache option
+
+    :param cache: True for the `ES_SEARCH_CACHE` cache (an in-process cache if the setting is missing), False or
+        None for no cache, or a `SearchCache`
+    :return: the cache, or None
+    """
+    if cache is True:
+        return get_search_cache() or _get_process_cache()
+    return cache or None
+
+
+def _get_process_cache() -> SearchCache:
+    """gets the in-process cache used when `ES_SEARCH_CACHE` is not configured
+
+    :return: the cache
+    """
+    global _process_cache
+    if _process_cache is None:
+        _process_cache = SearchCache()
+    return _process_cache
+
+
+def make_body(s: Search, hydrate: bool) -> dict:
+    """creates the request body of a search
+
+    :param s: the search
+    :param hydrate: the hits will be hydrated -- their `_source` is not needed, the pk is the document id
+    :return: the body
+    """
+    body = s.to_dict()
+    if hydrate:
+        body['_source'] = False
+    return body
+
+
+def get_params(hydrate: bool) -> dict:
+    """creates the query string parameters of a search
+
+    :param hydrate: the hits will be hydrated -- the response is filtered down to ids, doc types and scores
+    :return: the parameters
+    """
+    return {'filter_path': HYDRATION_FILTER_PATH} if hydrate else {}
+
+
+def get_response_hits(res: dict) -> [dict]:
+    """gets the raw hits of a search response
+
+    :param res: the search response -- filtered responses leave out empty hit lists
+    :return: the raw hits
+    """
+    return res.get('hits', {}).get('hits', [])
+
+
+def _get_hits(hits: [dict]) -> [(str, str, float)]:
+    """extracts what hydration needs from raw elasticsearch hits
+
+    :param hits: the raw hits
+    :return: (doc type, document id, score) of every hit, in elasticsearch order
+    """
+    return [(hit['_type'], hit['_id'], hit.get('_score')) for hit in hits]
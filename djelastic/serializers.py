@@ -0,0 +1,72 @@
+"""
+request body serializers for the elasticsearch client
+
+the client's default `JSONSerializer` builds a new json encoder for every body and pads it with whitespace. the
+`FastJSONSerializer` reuses one compact encoder and encodes dates, times, decimals and uuids natively. pick the
+serializer per connection in `ES_CONNECTIONS`, e.g.::
+
+    ES_CONNECTIONS = {
+        'default': {'hosts': ['localhost:9200'], 'serializer': 'djelastic.serializers.FastJSONSerializer'},
+    }
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.utils.module_loading import import_string
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+
+
+##
+# objects
+
+class FastJSONSerializer(JSONSerializer):
+    """
+    compact json serializer -- one reusable encoder, no whitespace between tokens, ascii only output
+    """
+
+    # the output is ascii, so its length in characters is its length in bytes (see `bulk.chunk_actions`)
+    ensure_ascii = True
+
+    def __init__(self):
+        """initializes a new serializer
+        """
+        self._encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=self.ensure_ascii,
+                                        default=self.default).encode
+
+    def default(self, data: object) -> object:
+        if isinstance(data, (datetime, date, time)):
+            return data.isoformat()
+        elif isinstance(data, Decimal):
+            return float(data)
+        elif isinstance(data, UUID):
+            return str(data)
+        raise TypeError('Unable to serialize {!r} (type: {})'.format(data, type(data)))
+
+    def dumps(self, data: object) -> str:
+        # strings are sent as they are
+        if isinstance(data, str):
+            return data
+
+        try:
+            return self._encode(data)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(data, e)
+
+
+##
+# functions
+
+def get_serializer(serializer: object or str) -> object or None:
+    """resolves the `serializer` of a connection configuration
+
+    :param serializer: a serializer, a serializer class or the dotted path of one -- or None
+    :return: the serializer, None for the client's default
+    """
+    if isinstance(serializer, str):
+        serializer = import_string(serializer)
+    if isinstance(serializer, type):
+        serializer = serializer()
+    return serializer
@@ -6,6 +6,18 @@ setup(
     version='0.0.1',
     packages=[
         'djelastic',
+        'djelastic.management',
+        'djelastic.management.commands',
+    ],
+    # djelastic.async_transport needs python 3.5+ and djelastic.aio python 3.6+ -- see the README
+    classifiers=[
+        'Framework :: Django',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3.2',
+        'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3.5',
+        'Programming Language :: Python :: 3.6',
     ],
     install_requires=[
         'Django==1.7.1',
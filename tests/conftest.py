@@ -0,0 +1,13 @@
+import sys
+
+from benchmarks.environment import setup_django
+
+
+# the asyncio transport is written with async/await (python 3.5+) -- older interpreters cannot even import it
+collect_ignore = ['test_async_transport.py'] if sys.version_info < (3, 5) else []
+
+
+def pytest_configure(config):
+    # djelastic reads django settings at import and call time -- the benchmark project (in-memory sqlite, no
+    # elasticsearch) serves the tests as well
+    setup_django()
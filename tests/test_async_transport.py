@@ -0,0 +1,131 @@
+import asyncio
+import gzip
+import json
+import unittest
+
+from elasticsearch.exceptions import NotFoundError
+
+from djelastic.async_transport import AsyncTransport
+
+
+class FakeServer(object):
+    """
+    keep-alive http server answering every request with the next canned (status, body) response -- without
+    `keep_alive` it drops every connection after answering, while still letting clients believe it is open
+    """
+
+    def __init__(self, responses, keep_alive=True):
+        self.responses = list(responses)
+        self.keep_alive = keep_alive
+        self.requests = []
+        self.connections = 0
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            method, url = request_line.decode('latin-1').split()[:2]
+            self.requests.append((method, url, body))
+
+            status, data = self.responses.pop(0)
+            data = json.dumps(data).encode('utf-8')
+            writer.write('HTTP/1.1 {} X\r\nContent-Length: {}\r\n\r\n'.format(status, len(data)).encode('latin-1'))
+            writer.write(data)
+            await writer.drain()
+            if not self.keep_alive:
+                break
+        writer.close()
+
+
+class AsyncTransportTestCase(unittest.TestCase):
+
+    def run_against(self, responses, test, keep_alive=True, **kwargs):
+        async def run():
+            server = FakeServer(responses, keep_alive)
+            port = await server.start()
+            transport = AsyncTransport(['127.0.0.1:{}'.format(port)], max_connections=2, **kwargs)
+            try:
+                await test(transport)
+            finally:
+                transport.close()
+                await asyncio.sleep(0)
+                await server.stop()
+            return server
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(run())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test__perform_request(self):
+        async def test(transport):
+            res = await transport.perform_request('POST', '/index/doc/_search', {'size': 1}, {'query': {}})
+            self.assertEqual(res, {'hits': {'hits': []}})
+
+        server = self.run_against([(200, {'hits': {'hits': []}})], test)
+        method, url, body = server.requests[0]
+        self.assertEqual((method, url), ('POST', '/index/doc/_search?size=1'))
+        self.assertEqual(json.loads(body.decode('utf-8')), {'query': {}})
+
+    def test__keep_alive(self):
+        async def test(transport):
+            for _ in range(3):
+                await transport.perform_request('GET', '/')
+
+        server = self.run_against([(200, {})] * 3, test)
+        self.assertEqual(server.connections, 1)
+
+    def test__stale_connection(self):
+        async def test(transport):
+            for _ in range(3):
+                self.assertEqual(await transport.perform_request('GET', '/'), {})
+                # lets the server close the connection it just answered on
+                await asyncio.sleep(0.01)
+
+        # the idle connection closed by the server is replaced once per request
+        server = self.run_against([(200, {})] * 3, test, keep_alive=False)
+        self.assertEqual(len(server.requests), 3)
+        self.assertEqual(server.connections, 3)
+
+    def test__errors(self):
+        async def test(transport):
+            with self.assertRaises(NotFoundError):
+                await transport.perform_request('GET', '/missing')
+            self.assertEqual(await transport.perform_request('GET', '/missing', ignore=(404,)), {'error': 'missing'})
+
+        self.run_against([(404, {'error': 'missing'})] * 2, test)
+
+    def test__bounded_concurrency(self):
+        async def test(transport):
+            await asyncio.gather(*[transport.perform_request('GET', '/') for _ in range(6)])
+
+        server = self.run_against([(200, {})] * 6, test)
+        self.assertLessEqual(server.connections, 2)
+
+    def test__compression(self):
+        async def test(transport):
+            await transport.perform_request('POST', '/_bulk', body='{"index":{}}\n{"title":"a"}\n')
+
+        server = self.run_against([(200, {'items': []})], test, compress_level=1)
+        self.assertEqual(gzip.decompress(server.requests[0][2]), b'{"index":{}}\n{"title":"a"}\n')
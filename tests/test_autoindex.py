@@ -0,0 +1,183 @@
+import threading
+import time
+import unittest
+
+from django.db import transaction
+from elasticsearch import TransportError
+
+from benchmarks.indexers import PlainArticleIndexer
+from djelastic import autoindex
+from djelastic.autoindex import IndexQueue, run_on_commit
+
+
+def make_result(indexed=0, failed=0, errors=()):
+    return {'indexed': indexed, 'deleted': 0, 'skipped': 0, 'failed': failed, 'errors': list(errors)}
+
+
+def make_error(pk, status):
+    return {'index': {'_id': str(pk), 'status': status, 'error': 'error'}}
+
+
+class IndexQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(IndexQueueTestCase, self).setUp()
+        self.calls = []
+        self.results = []
+        self.called = threading.Event()
+        self.reindex_pks = autoindex.reindex_pks
+        autoindex.reindex_pks = self.fake_reindex_pks
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop(timeout=1.0)
+        autoindex.reindex_pks = self.reindex_pks
+        super(IndexQueueTestCase, self).tearDown()
+
+    def make_queue(self, **kwargs):
+        queue = IndexQueue(**kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def fake_reindex_pks(self, indexer_class, pks, chunk_size):
+        """answers with the next prepared result -- an exception is raised, success is the default
+        """
+        self.calls.append((time.time(), sorted(pks), self.queue._backoff))
+        res = self.results.pop(0) if self.results else make_result(len(pks))
+        if len(self.calls) >= self.expected_calls:
+            self.called.set()
+        if isinstance(res, Exception):
+            raise res
+        return res
+
+    def run_queue(self, queue, pks, calls):
+        self.queue, self.expected_calls = queue, calls
+        queue.put(PlainArticleIndexer, pks)
+        self.assertTrue(self.called.wait(5.0))
+
+    def test__retry(self):
+        queue = self.queue = self.make_queue()
+        queue._pending.update(((PlainArticleIndexer, pk), None) for pk in (1, 2, 3))
+        self.expected_calls = 2
+        self.results = [TransportError('N/A', 'unavailable'),
+                        make_result(1, 2, [make_error(2, 503), make_error(3, 400)])]
+
+        # a failed batch goes back to the front of the queue
+        self.assertEqual(queue.drain(), 3)
+        self.assertEqual(queue.stats(), {'queued': 3, 'written': 0, 'retried': 3, 'dropped': 0})
+
+        # only the retryable item is kept, the rejected one is dropped
+        self.assertEqual(queue.drain(), 1)
+        self.assertEqual(list(queue._pending), [(PlainArticleIndexer, 2)])
+        self.assertEqual(queue.stats(), {'queued': 1, 'written': 1, 'retried': 4, 'dropped': 1})
+
+        self.assertEqual(queue.drain(), 0)
+        self.assertEqual([pks for _, pks, _ in self.calls], [[1, 2, 3], [1, 2, 3], [2]])
+
+    def test__unreported_failures(self):
+        queue = self.queue = self.make_queue()
+        queue._pending.update(((PlainArticleIndexer, pk), None) for pk in (1, 2))
+        self.expected_calls = 1
+        self.results = [make_result(0, 2, [make_error(1, 400)])]
+        self.assertEqual(queue.drain(), 2)
+
+    def test__backoff(self):
+        queue = self.make_queue(window=0.01, min_backoff=0.02, max_backoff=0.05)
+        self.results = [TransportError('N/A', 'unavailable')] * 3
+        self.run_queue(queue, [1], 4)
+
+        # the delay doubles after every failure, up to the maximum, and the batch is retried until it succeeds
+        self.assertEqual([backoff for _, _, backoff in self.calls], [0.0, 0.02, 0.04, 0.05])
+        times = [called for called, _, _ in self.calls]
+        self.assertTrue(all(later - earlier >= 0.02 for earlier, later in zip(times, times[1:])))
+        self.assertTrue(self.wait_for(lambda: queue._backoff == 0.0))
+
+    def test__window(self):
+        queue = self.make_queue(window=0.2)
+        self.queue, self.expected_calls = queue, 1
+        queue.put(PlainArticleIndexer, [1, 2])
+        queue.put(PlainArticleIndexer, [2, 3])
+        self.assertTrue(self.called.wait(5.0))
+
+        # rows put within the window are written together, once
+        self.assertEqual([pks for _, pks, _ in self.calls], [[1, 2, 3]])
+
+    def test__full_batch(self):
+        queue = self.make_queue(window=60.0, batch_size=2)
+        self.run_queue(queue, [1, 2, 3], 1)
+        self.assertEqual([pks for _, pks, _ in self.calls], [[1, 2]])
+
+    def test__put_after_stop(self):
+        queue = self.make_queue()
+        queue.stop()
+        queue.put(PlainArticleIndexer, [1, 2])
+        self.assertIsNone(queue._thread)
+        self.assertEqual(queue.stats(), {'queued': 0, 'written': 0, 'retried': 0, 'dropped': 2})
+
+    @staticmethod
+    def wait_for(condition, timeout=5.0):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+class RunOnCommitTestCase(unittest.TestCase):
+
+    def remove_on_commit(self):
+        """takes the django < 1.9 path, hooking the connection
+        """
+        if hasattr(transaction, 'on_commit'):
+            on_commit = transaction.on_commit
+            del transaction.on_commit
+            self.addCleanup(setattr, transaction, 'on_commit', on_commit)
+
+    def test__atomic_block(self):
+        called = []
+        with transaction.atomic():
+            run_on_commit(lambda: called.append(True))
+            self.assertEqual(called, [])
+        self.assertEqual(called, [True])
+
+        run_on_commit(lambda: called.append(False))
+        self.assertEqual(called, [True, False])
+
+    def test__without_on_commit(self):
+        self.remove_on_commit()
+
+        # the function waits for the atomic block to commit
+        called = []
+        with transaction.atomic():
+            run_on_commit(lambda: called.append('outer'))
+            with transaction.atomic():
+                run_on_commit(lambda: called.append('inner'))
+            self.assertEqual(called, [])
+        self.assertEqual(called, ['outer', 'inner'])
+
+    def test__without_on_commit_rollback(self):
+        self.remove_on_commit()
+
+        # a rolled back savepoint discards the functions deferred after it, a rolled back block all of them
+        called = []
+        with transaction.atomic():
+            run_on_commit(lambda: called.append('outer'))
+            try:
+                with transaction.atomic():
+                    run_on_commit(lambda: called.append('inner'))
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(called, ['outer'])
+
+        try:
+            with transaction.atomic():
+                run_on_commit(lambda: called.append('rolled back'))
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            pass
+        self.assertEqual(called, ['outer'])
@@ -0,0 +1,184 @@
+import json
+import time
+import unittest
+from collections import OrderedDict
+
+from benchmarks.models import Article
+from benchmarks.transport import make_client
+from djelastic import fields
+from djelastic.buffer import WriteBuffer
+from djelastic.connections import connections
+from djelastic.indexers import ModelIndexer
+
+
+class BufferedIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+
+    class Meta:
+        model = Article
+        doc_type = 'tests.buffered'
+        write_behind = 60
+
+
+def make_action(doc_id, op_type='index'):
+    return {op_type: {'_index': 'articles', '_type': 'article', '_id': doc_id}}
+
+
+class WriteBufferTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(WriteBufferTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+
+    def get_bulk_lines(self):
+        return [[json.loads(line) for line in body.decode('utf-8').split('\n') if line]
+                for _, url, _, body in self.server.requests if url.endswith('_bulk')]
+
+    def test__coalescing(self):
+        buffer = WriteBuffer(self.es, window=60)
+        buffer.add(make_action(1), {'title': 'first'})
+        buffer.add(make_action(2), {'title': 'other'})
+        buffer.add(make_action('1'), {'title': 'second'})
+        buffer.add(make_action(2, 'delete'))
+        self.assertEqual(len(buffer), 2)
+
+        res = buffer.flush()
+        self.assertEqual((res['success'], res['failed'], res['requeued']), (2, 0, 0))
+        self.assertEqual(self.get_bulk_lines(), [[make_action('1'), {'title': 'second'}, make_action(2, 'delete')]])
+        self.assertEqual(len(buffer), 0)
+
+    def test__max_size(self):
+        buffer = WriteBuffer(self.es, window=60, max_size=2)
+        buffer.add(make_action(1), {'title': 'first'})
+        self.assertEqual(self.get_bulk_lines(), [])
+        buffer.add(make_action(2), {'title': 'second'})
+        self.assertEqual(len(self.get_bulk_lines()), 1)
+        self.assertEqual(len(buffer), 0)
+
+    def test__window(self):
+        buffer = WriteBuffer(self.es, window=0.05)
+        buffer.add(make_action(1), {'title': 'first'})
+        deadline = time.time() + 5
+        while len(buffer) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(self.get_bulk_lines()), 1)
+
+    def test__failed_flush(self):
+        handle = self.server.handle
+
+        def failing(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                res['items'][0]['index'].update(status=503, error='unavailable')
+                res['items'][1]['index'].update(status=400, error='MapperParsingException')
+            return status, res
+        self.server.handle = failing
+
+        buffer = WriteBuffer(self.es, window=60)
+        for doc_id in (1, 2, 3):
+            buffer.add(make_action(doc_id), {'title': 'first'})
+        res = buffer.flush()
+        self.assertEqual((res['success'], res['failed'], res['requeued']), (1, 2, 1))
+        self.assertEqual(list(buffer._pending), [('articles', 'article', '1')])
+
+        self.server.handle = handle
+        self.assertEqual(buffer.flush()['success'], 1)
+
+    def test__failed_flush_to_alias(self):
+        handle = self.server.handle
+
+        def failing(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                # elasticsearch names the index behind the alias the actions were sent to
+                for item in res['items']:
+                    item['index'].update(_index='articles_v2', status=429, error='rejected')
+            return status, res
+        self.server.handle = failing
+
+        buffer = WriteBuffer(self.es, window=60)
+        for doc_id in (1, 2):
+            buffer.add(make_action(doc_id), {'title': 'first'})
+        res = buffer.flush()
+        self.assertEqual((res['failed'], res['requeued']), (2, 2))
+        self.assertEqual(list(buffer._pending), [('articles', 'article', '1'), ('articles', 'article', '2')])
+
+    def test__requeue_unmatched(self):
+        buffer = WriteBuffer(self.es, window=60)
+        sent = OrderedDict([(buffer._make_key(make_action(1)), (make_action(1), {'title': 'first'}))])
+        errors = [{'index': dict(make_action('2')['index'], status=503, error='unavailable')}]
+
+        # failures of actions that were never flushed are logged, not silently dropped
+        with self.assertLogs(level='ERROR') as logs:
+            self.assertEqual(buffer._requeue(sent, errors), 0)
+        self.assertIn('matches no flushed action', logs.output[0])
+
+    def test__requeue_keeps_newer_writes(self):
+        buffer = WriteBuffer(self.es, window=60)
+        sent = OrderedDict((buffer._make_key(make_action(doc_id)), (make_action(doc_id), {'title': 'first'}))
+                           for doc_id in (1, 2))
+        errors = [{'index': dict(make_action(str(doc_id))['index'], status=503)} for doc_id in (1, 2)]
+
+        # the document got written again while the flush was running
+        buffer.add(make_action(1), {'title': 'second'})
+        self.assertEqual(buffer._requeue(sent, errors), 1)
+        self.assertEqual(list(buffer._pending.values()), [
+            (make_action(2), {'title': 'first'}),
+            (make_action(1), {'title': 'second'}),
+        ])
+
+    def test__failed_request(self):
+        handle = self.server.handle
+        self.server.handle = lambda method, url, params=None, body=None: (503, {'error': 'unavailable'}) \
+            if url.endswith('_bulk') else handle(method, url, params, body)
+
+        buffer = WriteBuffer(self.es, window=60)
+        buffer.add(make_action(1), {'title': 'first'})
+        res = buffer.flush()
+        self.assertEqual(res['requeued'], 1)
+
+        self.server.handle = handle
+        res = buffer.flush()
+        self.assertEqual((res['success'], res['requeued'], len(buffer)), (1, 0, 0))
+
+
+class IndexerWriteBufferTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        connections.reset()
+        super(IndexerWriteBufferTestCase, self).tearDown()
+
+    def test__buffer_per_client_and_refresh(self):
+        first, second = make_client(), make_client()
+        connections.add_connection('default', first)
+        indexer = BufferedIndexer()
+        self.assertIs(indexer._get_write_buffer(), BufferedIndexer()._get_write_buffer())
+        self.assertIs(indexer._get_write_buffer().es, first)
+
+        other = BufferedIndexer()
+        other.es = second
+        self.assertIsNot(other._get_write_buffer(), indexer._get_write_buffer())
+        self.assertIs(other._get_write_buffer().es, second)
+
+        BufferedIndexer.Meta.refresh = 'wait_for'
+        try:
+            self.assertEqual(indexer._get_write_buffer().refresh, 'wait_for')
+        finally:
+            del BufferedIndexer.Meta.refresh
+
+    def test__buffered_writes(self):
+        es = make_client()
+        connections.add_connection('default', es)
+        article = Article(pk=1, title='buffered')
+        BufferedIndexer(article).index()
+        article.title = 'changed'
+        BufferedIndexer(article).index()
+        self.assertEqual(es.transport.server.requests, [])
+
+        res = BufferedIndexer().flush()
+        self.assertEqual(res['success'], 1)
+        (_, url, _, body), = es.transport.server.requests
+        self.assertIn(b'"changed"', body)
@@ -0,0 +1,141 @@
+import json
+import unittest
+
+from elasticsearch.serializer import JSONSerializer
+
+from benchmarks.transport import make_client
+from djelastic.bulk import chunk_actions, send_bulk
+
+
+def make_actions(count, op_type='index'):
+    return [({op_type: {'_index': 'articles', '_type': 'article', '_id': i}}, {'title': 'article {}'.format(i)})
+            for i in range(count)]
+
+
+class ChunkActionsTestCase(unittest.TestCase):
+
+    def test__chunk_size(self):
+        chunks = list(chunk_actions(JSONSerializer(), make_actions(5), chunk_size=2))
+        self.assertEqual([len(chunk) for _, chunk in chunks], [2, 2, 1])
+        for body, chunk in chunks:
+            lines = body.split('\n')
+            self.assertEqual(len(lines), len(chunk) * 2 + 1)
+            self.assertEqual(lines[-1], '')
+            self.assertEqual([json.loads(line) for line in lines[::2] if line], chunk)
+
+    def test__max_bytes(self):
+        serializer = JSONSerializer()
+        actions = make_actions(3)
+        size = sum(len(serializer.dumps(part)) + 1 for part in actions[0])
+
+        # an action filling the chunk exactly stays in it, one byte less splits
+        self.assertEqual([len(chunk) for _, chunk in chunk_actions(serializer, actions, max_bytes=size * 2)], [2, 1])
+        self.assertEqual([len(chunk) for _, chunk in chunk_actions(serializer, actions, max_bytes=size * 2 - 1)],
+                         [1, 1, 1])
+
+        # an action larger than the limit still gets a chunk of its own
+        self.assertEqual([len(chunk) for _, chunk in chunk_actions(serializer, actions, max_bytes=1)], [1, 1, 1])
+
+    def test__deletes(self):
+        actions = [({'delete': {'_index': 'articles', '_type': 'article', '_id': 1}}, None)]
+        (body, chunk), = chunk_actions(JSONSerializer(), actions)
+        self.assertEqual(body.count('\n'), 1)
+
+    def test__serialization_errors(self):
+        actions = make_actions(3)
+        actions[1] = (actions[1][0], {'title': object()})
+
+        with self.assertRaises(Exception):
+            list(chunk_actions(JSONSerializer(), actions))
+
+        errors = []
+        chunks = list(chunk_actions(JSONSerializer(), actions, errors=errors))
+        self.assertEqual([action['index']['_id'] for _, chunk in chunks for action in chunk], [0, 2])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['index']['_id'], 1)
+        self.assertEqual(errors[0]['index']['status'], 400)
+
+
+class SendBulkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SendBulkTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+
+    def fail_bulk_requests(self, numbers, status=503):
+        """makes the bulk requests with the given (0 based) numbers fail with `status`
+        """
+        handle, calls = self.server.handle, []
+
+        def failing(method, url, params=None, body=None):
+            if url.endswith('_bulk'):
+                calls.append(url)
+                if len(calls) - 1 in numbers:
+                    return status, {'error': 'unavailable'}
+            return handle(method, url, params, body)
+        self.server.handle = failing
+
+    def get_urls(self):
+        return [url for _, url, _, _ in self.server.requests]
+
+    def test__chunks(self):
+        res = send_bulk(self.es, make_actions(5), chunk_size=2)
+        self.assertEqual(res, {'success': 5, 'failed': 0, 'errors': []})
+        self.assertEqual(self.get_urls(), ['/_bulk'] * 3)
+
+    def test__failed_chunk(self):
+        self.fail_bulk_requests([1])
+        res = send_bulk(self.es, make_actions(5), chunk_size=2)
+        self.assertEqual((res['success'], res['failed']), (3, 2))
+        self.assertEqual([error['index']['_id'] for error in res['errors']], [2, 3])
+        self.assertEqual([error['index']['status'] for error in res['errors']], [503, 503])
+
+    def test__failed_items(self):
+        handle = self.server.handle
+
+        def rejecting(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                res['items'][0]['index'].update(status=400, error='MapperParsingException')
+            return status, res
+        self.server.handle = rejecting
+
+        res = send_bulk(self.es, make_actions(4), chunk_size=2)
+        self.assertEqual((res['success'], res['failed']), (2, 2))
+        self.assertEqual([error['index']['_id'] for error in res['errors']], [0, 2])
+
+    def test__missing_deletes(self):
+        handle = self.server.handle
+
+        def missing(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            for item in res.get('items', []):
+                item['delete'].update(status=404, found=False)
+            return status, res
+        self.server.handle = missing
+
+        res = send_bulk(self.es, [(action, None) for action, _ in make_actions(2, 'delete')])
+        self.assertEqual((res['success'], res['failed']), (2, 0))
+
+    def test__serialization_errors(self):
+        actions = make_actions(3)
+        actions[0] = (actions[0][0], {'title': object()})
+        res = send_bulk(self.es, actions)
+        self.assertEqual((res['success'], res['failed']), (2, 1))
+        self.assertEqual(res['errors'][0]['index']['_id'], 0)
+
+    def test__refresh(self):
+        send_bulk(self.es, make_actions(5), chunk_size=2, refresh=True)
+        self.assertEqual(self.get_urls(), ['/_bulk'] * 3 + ['/articles/_refresh'])
+        self.assertTrue(all('refresh' not in (params or {}) for _, _, params, _ in self.server.requests))
+
+    def test__refresh_after_failed_last_chunk(self):
+        self.fail_bulk_requests([2])
+        res = send_bulk(self.es, make_actions(5), chunk_size=2, refresh=True)
+        self.assertEqual(res['failed'], 1)
+        self.assertEqual(self.get_urls()[-1], '/articles/_refresh')
+
+    def test__no_refresh(self):
+        send_bulk(self.es, make_actions(2))
+        self.assertEqual(self.get_urls(), ['/_bulk'])
@@ -0,0 +1,121 @@
+import time
+import unittest
+
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.models import Article, Author
+from benchmarks.transport import make_client
+from djelastic.cache import LRUCacheBackend, SearchCache, invalidate
+from djelastic.connections import connections
+from djelastic.searchers import BasicSearcher, ModelSearcher
+
+
+class SearchCacheTestCase(unittest.TestCase):
+
+    def test__get_set(self):
+        cache = SearchCache()
+        key = cache.make_key('articles', 'article', 'query', {'status': 'published'})
+        self.assertIsNone(cache.get(key))
+        cache.set(key, ['result'])
+        self.assertEqual(cache.get(key), ['result'])
+        self.assertEqual(cache.make_key('articles', 'article', 'query', {'status': 'published'}), key)
+
+    def test__bump(self):
+        cache = SearchCache()
+        key = cache.make_key('articles', 'article', 'query')
+        index_key = cache.make_key('articles', None, 'query')
+        other_key = cache.make_key('articles', 'author', 'query')
+
+        cache.bump('articles', 'article')
+        self.assertNotEqual(cache.make_key('articles', 'article', 'query'), key)
+        self.assertNotEqual(cache.make_key('articles', None, 'query'), index_key)
+        self.assertEqual(cache.make_key('articles', 'author', 'query'), other_key)
+
+        cache.bump('articles')
+        self.assertNotEqual(cache.make_key('articles', 'author', 'query'), other_key)
+
+    def test__generations_not_evicted(self):
+        cache = SearchCache(LRUCacheBackend(2))
+        cache.set(cache.make_key('articles', 'article', 'query'), ['stale'])
+        cache.bump('articles', 'article')
+        key = cache.make_key('articles', 'article', 'query')
+
+        # results push each other out of the cache, the generations stay -- restarted ones would differ by now
+        for query in ('first', 'second', 'third'):
+            cache.set(cache.make_key('articles', 'article', query), ['result'])
+        self.assertEqual(len(cache.backend._entries), 2)
+        time.sleep(0.01)
+        self.assertEqual(cache.make_key('articles', 'article', 'query'), key)
+        self.assertIsNone(cache.get(key))
+
+    def test__model_keyed_parts(self):
+        cache = SearchCache()
+        key = cache.make_key('articles', None, 'query', {Article: ['title'], Author: ['name']}, None)
+        self.assertEqual(cache.make_key('articles', None, 'query', {Author: ['name'], Article: ['title']}, None), key)
+        self.assertNotEqual(cache.make_key('articles', None, 'query', {Article: ['body']}, None), key)
+
+
+class SearcherCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SearcherCacheTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.indexer = PlainArticleIndexer()
+
+    def tearDown(self):
+        connections.reset()
+        super(SearcherCacheTestCase, self).tearDown()
+
+    def count_searches(self):
+        return len([url for _, url, _, _ in self.server.requests if url.endswith('_search')])
+
+    def write_while_searching(self, doc_type):
+        """makes the next search race a write -- the write lands after elasticsearch read the results
+        """
+        handle = self.server.handle
+
+        def racing(method, url, params=None, body=None):
+            res = handle(method, url, params, body)
+            if url.endswith('_search'):
+                self.server.handle = handle
+                invalidate(self.indexer.index_name, doc_type)
+            return res
+        self.server.handle = racing
+
+    def test__hit(self):
+        searcher = ModelSearcher(self.indexer, cache=SearchCache())
+        searcher.search('query', hydrate=False)
+        searcher.search('query', hydrate=False)
+        self.assertEqual(self.count_searches(), 1)
+
+    def test__write_during_search(self):
+        searcher = ModelSearcher(self.indexer, cache=SearchCache())
+        self.write_while_searching(self.indexer.doc_type_name)
+        searcher.search('query', hydrate=False)
+
+        # the results were read before the write, so the next search must not be served from them
+        searcher.search('query', hydrate=False)
+        self.assertEqual(self.count_searches(), 2)
+        searcher.search('query', hydrate=False)
+        self.assertEqual(self.count_searches(), 2)
+
+    def test__write_during_page(self):
+        searcher = ModelSearcher(self.indexer, cache=SearchCache())
+        self.write_while_searching(self.indexer.doc_type_name)
+        searcher.page('query', hydrate=False)
+        searcher.page('query', hydrate=False)
+        self.assertEqual(self.count_searches(), 2)
+
+    def test__write_during_basic_search(self):
+        searcher = BasicSearcher(index_name=self.indexer.index_name, cache=SearchCache())
+        self.write_while_searching(None)
+        searcher.search('query', hydrate=False)
+        searcher.search('query', hydrate=False)
+        self.assertEqual(self.count_searches(), 2)
+
+    def test__model_keyed_only(self):
+        searcher = ModelSearcher(self.indexer, cache=SearchCache())
+        searcher.search('query', only={Article: ['title']})
+        searcher.search('query', only={Article: ['title']})
+        self.assertEqual(self.count_searches(), 1)
@@ -0,0 +1,99 @@
+import gzip
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.test.utils import override_settings
+
+from benchmarks.transport import make_client
+from djelastic.connections import GzipConnection, connections, get_connection
+from djelastic.errors import ConfigurationError
+
+
+class ConnectionRegistryTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        connections.reset()
+        super(ConnectionRegistryTestCase, self).tearDown()
+
+    def test__shared_client(self):
+        es = get_connection()
+        self.assertIs(get_connection('default'), es)
+        self.assertIs(get_connection(es), es)
+
+    def test__alias(self):
+        with override_settings(ES_CONNECTIONS={'default': {'hosts': ['localhost:9200']}, 'search': 'default'}):
+            self.assertIs(get_connection('search'), get_connection())
+
+    def test__unknown_alias(self):
+        with self.assertRaises(ConfigurationError):
+            get_connection('unknown')
+        with override_settings(ES_CONNECTIONS={'default': 'search', 'search': 'default'}):
+            with self.assertRaises(ConfigurationError):
+                get_connection()
+
+    def test__reset_on_setting_changed(self):
+        es = make_client()
+        connections.add_connection('default', es)
+        self.assertIs(get_connection(), es)
+
+        # clients are created again from the new settings -- and from the restored ones afterwards
+        with override_settings(ES_CONNECTIONS={'default': {'hosts': ['example.com:9200']}}):
+            self.assertEqual(get_connection().transport.hosts, [{'host': 'example.com', 'port': 9200}])
+        self.assertEqual(get_connection().transport.hosts, [{'host': 'localhost', 'port': 9200}])
+
+        # other settings leave the clients alone
+        es = get_connection()
+        with override_settings(ES_INDEX_NAME='other'):
+            self.assertIs(get_connection(), es)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """
+    answers every request with an empty json object, recording its headers and body on the server
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.requests.append((dict((name.lower(), value) for name, value in self.headers.items()), body))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class GzipConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(GzipConnectionTestCase, self).setUp()
+        self.server = HTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(GzipConnectionTestCase, self).tearDown()
+
+    def test__compressed_body(self):
+        body = b'{"index":{}}\n{"title":"article"}\n' * 100
+        connection = GzipConnection('127.0.0.1', self.server.server_port, compress_level=9)
+        status, _, data = connection.perform_request('POST', '/_bulk', body=body)
+        self.assertEqual((status, data), (200, '{}'))
+
+        # the body is sent compressed and says so
+        (headers, sent), = self.server.requests
+        self.assertEqual(headers['content-encoding'], 'gzip')
+        self.assertEqual(headers['accept-encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(sent), body)
+        self.assertLess(len(sent), len(body))
+
+    def test__compress_setting(self):
+        with override_settings(ES_CONNECTIONS={'default': {'hosts': ['localhost:9200'], 'compress': True}}):
+            connection = get_connection().transport.get_connection()
+        self.assertIsInstance(connection, GzipConnection)
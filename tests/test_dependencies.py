@@ -0,0 +1,120 @@
+import unittest
+
+from benchmarks.environment import populate
+from benchmarks.indexers import ArticleIndexer
+from benchmarks.models import Article, Author, Category, Publisher, Tag
+from djelastic import dependencies, fields
+from djelastic.indexers import ModelIndexer
+
+
+class AuthorIndexer(ModelIndexer):
+    __slots__ = ()
+
+    titles = fields.StringField('article.title')
+
+    class Meta:
+        model = Author
+        doc_type = 'tests.author'
+
+
+class RecordingQueue(object):
+    """stands in for the indexing queue, keeping the queued pks by indexer class
+    """
+
+    def __init__(self):
+        self.pks = {}
+
+    def put(self, indexer_class, pks):
+        self.pks.setdefault(indexer_class, set()).update(pks)
+
+
+def delete_rows():
+    for model in (Article, Tag, Category, Publisher, Author):
+        model.objects.all().delete()
+
+
+class DependenciesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(DependenciesTestCase, self).setUp()
+        populate(4, tags_per_article=1)
+        self.articles = list(Article.objects.order_by('pk'))
+        self.queue = RecordingQueue()
+        self.get_index_queue = dependencies.get_index_queue
+        dependencies.get_index_queue = lambda: self.queue
+        dependencies.connect()
+
+    def tearDown(self):
+        dependencies.disconnect()
+        dependencies.get_index_queue = self.get_index_queue
+        delete_rows()
+        super(DependenciesTestCase, self).tearDown()
+
+    def get_queued(self, indexer_class):
+        return self.queue.pks.get(indexer_class, set())
+
+    def forbid_lookups(self):
+        find_dependents = dependencies.find_dependents
+        dependencies.find_dependents = lambda *args: self.fail('dependents looked up')
+        self.addCleanup(setattr, dependencies, 'find_dependents', find_dependents)
+
+    def test__save(self):
+        author = self.articles[0].author
+        author.name = 'renamed'
+        author.save()
+        self.assertEqual(self.get_queued(ArticleIndexer),
+                         set(Article.objects.filter(author=author).values_list('pk', flat=True)))
+
+        # saves updating none of the read attributes are ignored
+        self.queue.pks.clear()
+        author.save(update_fields=['email'])
+        self.assertEqual(self.get_queued(ArticleIndexer), set())
+
+    def test__delete(self):
+        tag = self.articles[0].tags.all()[0]
+        dependents = set(tag.article_set.values_list('pk', flat=True))
+        tag.delete()
+        self.assertEqual(self.get_queued(ArticleIndexer), dependents)
+
+    def test__m2m_changed(self):
+        article, other = self.articles[:2]
+        tag = other.tags.all()[0]
+        article.tags.add(tag)
+        self.assertEqual(self.get_queued(ArticleIndexer), {article.pk})
+
+        self.queue.pks.clear()
+        tag.article_set.remove(other)
+        self.assertEqual(self.get_queued(ArticleIndexer), {other.pk})
+
+        # a clear reindexes the rows linked before it
+        self.queue.pks.clear()
+        tag.article_set.add(other)
+        tag.article_set.clear()
+        self.assertEqual(self.get_queued(ArticleIndexer), {article.pk, other.pk})
+
+    def test__reverse_foreign_key(self):
+        article = self.articles[0]
+        old_author = article.author
+        new_author = Author.objects.exclude(pk=old_author.pk)[0]
+
+        # the parent is read off the saved row, the old parent is read before the save
+        self.forbid_lookups()
+        article.title = 'changed'
+        article.save()
+        self.assertEqual(self.get_queued(AuthorIndexer), {old_author.pk})
+
+        self.queue.pks.clear()
+        article.author = new_author
+        article.save()
+        self.assertEqual(self.get_queued(AuthorIndexer), {old_author.pk, new_author.pk})
+
+    def test__reverse_foreign_key_delete(self):
+        self.forbid_lookups()
+        authors = set(article.author_id for article in self.articles)
+        Article.objects.all().delete()
+        self.assertEqual(self.get_queued(AuthorIndexer), authors)
+
+    def test__get_dependencies(self):
+        self.assertIn((ArticleIndexer, 'tags', frozenset(['name'])), dependencies.get_dependencies(Tag))
+        self.assertIn((AuthorIndexer, 'article', frozenset(['title', 'author'])),
+                      dependencies.get_dependencies(Article))
@@ -1,12 +1,77 @@
 import unittest
+from datetime import date, datetime, timedelta, timezone
 
 from djelastic import fields
 
 
+class SourceTaggedField(fields.IndexableField):
+    __slots__ = ()
+    _type = 'string'
+
+    def to_es(self, value):
+        return '{}:{}'.format(self.source, value)
+
+    def to_python(self, value):
+        return value.split(':', 1)[1]
+
+
+class TaggedStringField(fields.StringField):
+    __slots__ = ()
+
+    def to_es(self, value):
+        return '{}:{}'.format(self.source, value)
+
+
 class FieldsTestCase(unittest.TestCase):
 
     def setUp(self):
         super(FieldsTestCase, self).setUp()
 
     def test__define_mapping(self):
-        pass
+        field = fields.StringField('title', analyzer='snowball', index=None)
+        other = fields.StringField('slug', index='not_analyzed')
+        self.assertEqual(field.define_mapping(), {'type': 'string', 'analyzer': 'snowball'})
+        self.assertEqual(other.define_mapping(), {'type': 'string', 'index': 'not_analyzed'})
+        self.assertEqual(field.analyzer, 'snowball')
+        with self.assertRaises(AttributeError):
+            other.analyzer
+
+    def test__to_es_many(self):
+        self.assertEqual(fields.IntegerField('count').to_es_many(['1', None, 2]), [1, None, 2])
+        self.assertEqual(fields.StringField('title').to_es_many([1, None, 'a']), ['1', None, 'a'])
+        self.assertEqual(fields.DateField('published').to_es_many([date(2015, 1, 2), None]), ['2015-01-02', None])
+
+    def test__many_converters_use_instance(self):
+        # the batch converters go through the single value ones of the field instance
+        field = SourceTaggedField('title')
+        self.assertEqual(field.to_es_many(['a', None]), ['title:a', None])
+        self.assertEqual(field.to_python_many(['title:a', None]), ['a', None])
+
+        # batch converters optimized for a parent class are bypassed once a subclass converts differently
+        field = TaggedStringField('title')
+        self.assertEqual(fields.get_many_converter(field, 'to_es')(['a', 1, None]), ['title:a', 'title:1', None])
+        self.assertEqual(fields.get_many_converter(fields.StringField('title'), 'to_es')([1]), ['1'])
+
+    def test__to_python_many(self):
+        values = ['2015-01-02T03:04:05.678+01:00', '2015-01-02T03:04:05Z', '2015-01-02T03:04:05', '2015-01-02', None]
+        self.assertEqual(fields.DateField('published').to_python_many(values), [
+            datetime(2015, 1, 2, 3, 4, 5, 678000, timezone(timedelta(hours=1))),
+            datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            date(2015, 1, 2),
+            None,
+        ])
+
+    def test__get_converter(self):
+        field = fields.DateField('published')
+        self.assertIs(fields.get_converter(field, 'to_es'), fields.DateField.to_es)
+        self.assertIs(fields.get_converter(field, 'to_python'), fields.DateField.to_python)
+        self.assertIsNone(fields.get_converter(fields.IndexableField('published'), 'to_es'))
+        self.assertIsNone(fields.get_converter(fields.IndexableField('published'), 'to_python'))
+
+    def test__parse_iso8601(self):
+        self.assertEqual(fields.parse_iso8601('2015-01-02T03:04:05.678901+00:00'),
+                         datetime(2015, 1, 2, 3, 4, 5, 678901, timezone.utc))
+        self.assertEqual(fields.parse_iso8601('2015-01-02T03:04-0530').utcoffset(), -timedelta(hours=5, minutes=30))
+        with self.assertRaises(ValueError):
+            fields.parse_iso8601('02/01/2015')
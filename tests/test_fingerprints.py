@@ -0,0 +1,109 @@
+import unittest
+
+from django.test.utils import override_settings
+
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.models import Article
+from benchmarks.transport import make_client
+from djelastic.connections import connections
+from djelastic.fingerprints import (CacheFingerprintStore, DocumentFingerprintStore, get_fingerprint_store,
+                                    get_process_store, make_fingerprint)
+
+
+def make_article(pk, title='title'):
+    return Article(pk=pk, title=title, body='body', word_count=10, rating=1.0)
+
+
+class FingerprintTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(FingerprintTestCase, self).setUp()
+        self.overrides = override_settings(ES_FINGERPRINTS={'BACKEND': 'lru'})
+        self.overrides.enable()
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+
+    def tearDown(self):
+        connections.reset()
+        self.overrides.disable()
+        super(FingerprintTestCase, self).tearDown()
+
+    def get_writes(self):
+        prefix = '/{}/{}/'.format(PlainArticleIndexer.index_name, PlainArticleIndexer.doc_type_name)
+        return [(method, url) for method, url, _, _ in self.server.requests if url.startswith(prefix)]
+
+    def test__unchanged(self):
+        PlainArticleIndexer(make_article(1)).index()
+        self.assertEqual(len(self.get_writes()), 1)
+
+        res = PlainArticleIndexer(make_article(1)).index()
+        self.assertTrue(res['skipped'])
+        self.assertEqual(len(self.get_writes()), 1)
+
+        # a changed document and a forced write are sent
+        PlainArticleIndexer(make_article(1, 'changed')).index()
+        PlainArticleIndexer(make_article(1, 'changed')).index(force=True)
+        self.assertEqual(len(self.get_writes()), 3)
+        self.assertEqual(PlainArticleIndexer.fingerprint_store.stats(),
+                         {'written': 3, 'skipped': 1, 'skip_ratio': 0.25})
+
+    def test__delete(self):
+        PlainArticleIndexer(make_article(1)).index()
+        PlainArticleIndexer(make_article(1)).delete()
+
+        # the document is gone from the index, so creating it again must not be skipped
+        res = PlainArticleIndexer(make_article(1)).index()
+        self.assertNotIn('skipped', res)
+        self.assertEqual([method for method, _ in self.get_writes()], ['PUT', 'DELETE', 'PUT'])
+
+    def test__buffered_delete(self):
+        PlainArticleIndexer(make_article(1)).index()
+        PlainArticleIndexer(make_article(1)).delete(buffered=True)
+        PlainArticleIndexer().flush()
+
+        # the buffered delete removed the document, so writing it again must not be skipped
+        res = PlainArticleIndexer(make_article(1)).index()
+        self.assertNotIn('skipped', res)
+        self.assertEqual([method for method, _ in self.get_writes()], ['PUT', 'PUT'])
+
+    def test__buffered_index(self):
+        PlainArticleIndexer(make_article(1)).index()
+        PlainArticleIndexer(make_article(1, 'changed')).index(buffered=True)
+        PlainArticleIndexer().flush()
+
+        # the buffered write replaced the document, so restoring the first version must not be skipped
+        res = PlainArticleIndexer(make_article(1)).index()
+        self.assertNotIn('skipped', res)
+        self.assertEqual([method for method, _ in self.get_writes()], ['PUT', 'PUT'])
+
+    def test__bulk(self):
+        indexer = PlainArticleIndexer()
+        self.assertEqual(indexer.bulk_index([make_article(pk) for pk in range(1, 4)])['skipped'], 0)
+
+        res = indexer.bulk_index([make_article(1), make_article(2, 'changed'), make_article(3)])
+        self.assertEqual((res['success'], res['skipped']), (1, 2))
+
+        indexer.bulk_delete([1])
+        self.assertEqual(indexer.bulk_index([make_article(1)])['skipped'], 0)
+
+    def test__default_store(self):
+        store = get_fingerprint_store()
+        self.assertIsInstance(store, CacheFingerprintStore)
+        self.assertIs(get_fingerprint_store(), store)
+        self.assertIs(PlainArticleIndexer.fingerprint_store, store)
+        self.assertIsNot(get_process_store(), store)
+
+        # the store follows the setting
+        with override_settings(ES_FINGERPRINTS={'BACKEND': 'document', 'FIELD': 'checksum'}):
+            self.assertIsInstance(get_fingerprint_store(), DocumentFingerprintStore)
+            self.assertEqual(get_fingerprint_store().field, 'checksum')
+            self.assertIn('checksum', PlainArticleIndexer.mapping['properties'])
+        with override_settings(ES_FINGERPRINTS=None):
+            self.assertIsNone(get_fingerprint_store())
+            self.assertIsNone(PlainArticleIndexer.fingerprint_store)
+        self.assertIsInstance(get_fingerprint_store(), CacheFingerprintStore)
+
+    def test__make_fingerprint(self):
+        self.assertEqual(make_fingerprint({'a': 1, 'b': [1, 2]}), make_fingerprint({'b': [1, 2], 'a': 1}))
+        self.assertNotEqual(make_fingerprint({'a': 1}), make_fingerprint({'a': 2}))
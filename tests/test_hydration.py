@@ -0,0 +1,83 @@
+import unittest
+
+from django.db import transaction
+
+from benchmarks.models import Article, Author, Category, Publisher, Tag
+from djelastic.hydration import Hydrator, get_model
+
+
+def create_rows():
+    author = Author.objects.create(name='author', email='author@example.com')
+    publisher = Publisher.objects.create(name='publisher', country='US')
+    category = Category.objects.create(name='category', slug='category')
+    articles = [Article.objects.create(
+        title='article {}'.format(i), subtitle='', slug='article-{}'.format(i), body='', summary='',
+        url='http://example.com', contact='editor@example.com', ip_address='127.0.0.1', word_count=0, view_count=0,
+        comment_count=0, share_count=0, rank=0, rating=0.0, price=0, published='2015-01-01T00:00:00Z',
+        modified='2015-01-01T00:00:00Z', expires='2020-01-01', language='en', status='published', author=author,
+        publisher=publisher, category=category,
+    ) for i in range(3)]
+    return author, articles
+
+
+def delete_rows():
+    for model in (Article, Tag, Category, Publisher, Author):
+        model.objects.all().delete()
+
+
+class HydratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(HydratorTestCase, self).setUp()
+        self.author, self.articles = create_rows()
+
+    def tearDown(self):
+        delete_rows()
+        super(HydratorTestCase, self).tearDown()
+
+    def make_hits(self, articles, score=1.0):
+        return [('benchmarks.article', str(article.pk), score) for article in articles]
+
+    def test__order_and_score(self):
+        hits = self.make_hits(reversed(self.articles)) + [('benchmarks.author', str(self.author.pk), 0.5)]
+        instances = Hydrator().hydrate(hits)
+        self.assertEqual(instances, list(reversed(self.articles)) + [self.author])
+        self.assertEqual([instance.es_score for instance in instances], [1.0, 1.0, 1.0, 0.5])
+
+    def test__missing_rows(self):
+        hits = self.make_hits(self.articles) + [('benchmarks.article', '0', 1.0), ('unknown.doctype', '1', 1.0)]
+        self.assertEqual(Hydrator().hydrate(hits), self.articles)
+
+    def test__hydrate_many(self):
+        first, second = Hydrator().hydrate_many([self.make_hits(self.articles[:2], 1.0),
+                                                 self.make_hits(self.articles[1:], 2.0)])
+        self.assertEqual((first, second), (self.articles[:2], self.articles[1:]))
+
+        # the row hit by both searches carries the score of each search
+        self.assertIsNot(first[1], second[0])
+        self.assertEqual((first[1].es_score, second[0].es_score), (1.0, 2.0))
+
+    def test__only(self):
+        hydrator = Hydrator(only={Article: ['title']})
+        article, author = hydrator.hydrate(self.make_hits(self.articles[:1]) +
+                                           [('benchmarks.author', str(self.author.pk), 1.0)])
+        self.assertEqual((article.__dict__['title'], 'body' in article.__dict__), ('article 0', False))
+        self.assertIn('email', author.__dict__)
+
+    def test__concurrent_in_atomic_block(self):
+        hydrator = Hydrator(concurrent=True)
+        hydrator._fetch_in_thread = lambda model, pks: self.fail('fetched in a thread')
+        hits = self.make_hits(self.articles) + [('benchmarks.author', str(self.author.pk), 1.0)]
+
+        # rows of the open transaction are not visible to the connections of worker threads
+        with transaction.atomic():
+            article = Article.objects.get(pk=self.articles[0].pk)
+            article.title = 'uncommitted'
+            article.save()
+            instances = hydrator.hydrate(hits)
+        self.assertEqual(len(instances), 4)
+        self.assertEqual(instances[0].title, 'uncommitted')
+
+    def test__get_model(self):
+        self.assertIs(get_model('benchmarks.article'), Article)
+        self.assertIsNone(get_model('benchmarks.missing'))
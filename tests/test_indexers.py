@@ -0,0 +1,212 @@
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from benchmarks.environment import populate
+from benchmarks.indexers import ArticleIndexer
+from benchmarks.models import Article, Author, Category, Publisher, Tag
+from benchmarks.transport import make_client
+from djelastic import fields
+from djelastic.connections import connections
+from djelastic.fields import get_converter
+from djelastic.indexers import MANY_RELATIONS, ModelIndexer
+
+
+class MetadataIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+
+    class Meta:
+        model = Article
+        doc_type = 'tests.metadata'
+
+
+class ClassMetadataTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        connections.reset()
+        super(ClassMetadataTestCase, self).tearDown()
+
+    def test__override_settings(self):
+        self.assertEqual(MetadataIndexer.index_name, 'benchmarks')
+        with override_settings(ES_INDEX_NAME='other'):
+            self.assertEqual(MetadataIndexer.index_name, 'other')
+            self.assertEqual(MetadataIndexer().index_name, 'other')
+        self.assertEqual(MetadataIndexer.index_name, 'benchmarks')
+
+    def test__instance_override(self):
+        indexer = MetadataIndexer()
+        indexer.index_name = 'benchmarks_20150101000000'
+        self.assertEqual(indexer.index_name, 'benchmarks_20150101000000')
+        self.assertEqual(MetadataIndexer.index_name, 'benchmarks')
+        with self.assertRaises(AttributeError):
+            indexer.doc_type_name = 'other'
+
+    def test__connection_changes(self):
+        first, second = make_client(), make_client()
+        connections.add_connection('default', first)
+        self.assertIs(MetadataIndexer.es, first)
+        connections.add_connection('default', second)
+        self.assertIs(MetadataIndexer.es, second)
+
+    def test__connection_settings_changes(self):
+        connections.add_connection('default', make_client())
+        with override_settings(ES_CONNECTIONS={'default': {'hosts': ['example.com:9200']}}):
+            self.assertEqual(MetadataIndexer.es.transport.hosts, [{'host': 'example.com', 'port': 9200}])
+
+
+class BootstrapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(BootstrapTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.overrides = override_settings(ES_ENSURE_MAPPINGS=True)
+        self.overrides.enable()
+
+    def tearDown(self):
+        self.overrides.disable()
+        connections.reset()
+        super(BootstrapTestCase, self).tearDown()
+
+    def serve_missing_index(self):
+        """makes the index and the doc type missing until they are created
+        """
+        handle, created = self.server.handle, set()
+
+        def missing(method, url, params=None, body=None):
+            if method == 'HEAD' and url not in created:
+                self.server.requests.append((method, url, params, body))
+                return 404, None
+            if method == 'PUT':
+                created.add(url.replace('/_mapping', ''))
+            return handle(method, url, params, body)
+        self.server.handle = missing
+
+    def get_requests(self):
+        return [(method, url) for method, url, _, _ in self.server.requests]
+
+    def test__once_per_process(self):
+        self.serve_missing_index()
+        MetadataIndexer()
+        self.assertEqual(self.get_requests(), [
+            ('HEAD', '/benchmarks'), ('PUT', '/benchmarks'),
+            ('HEAD', '/benchmarks/tests.metadata'), ('PUT', '/benchmarks/_mapping/tests.metadata'),
+        ])
+
+        # later indexers of the same client, index and doc type find it in the cache
+        self.server.reset()
+        MetadataIndexer()
+        MetadataIndexer(Article())
+        self.assertEqual(self.server.requests, [])
+
+    def test__existing_index(self):
+        MetadataIndexer()
+        self.assertEqual(self.get_requests(), [('HEAD', '/benchmarks'), ('HEAD', '/benchmarks/tests.metadata')])
+        self.server.reset()
+        MetadataIndexer()
+        self.assertEqual(self.server.requests, [])
+
+    def test__per_client(self):
+        MetadataIndexer()
+        other = make_client()
+        connections.add_connection('default', other)
+        MetadataIndexer()
+        self.assertEqual(len(other.transport.server.requests), 2)
+
+
+class AuthorArticleIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+    author = fields.StringField('author.name')
+    category = fields.StringField('category.name')
+
+    class Meta:
+        model = Article
+        doc_type = 'tests.authorarticle'
+
+
+def delete_rows():
+    for model in (Article, Tag, Category, Publisher, Author):
+        model.objects.all().delete()
+
+
+def make_reference_document(indexer, instance):
+    """builds a document field by field, resolving every source on every call -- what the compiled plan replaces
+    """
+    document = {}
+    for doc_key, field in indexer._mapped_fields.items():
+        value = instance
+        if '.' in field.source:
+            name, attr = field.source.split('.')[:2]
+            related = getattr(instance, name)
+            if Article._meta.get_field(name).get_internal_type() in MANY_RELATIONS:
+                value = ' '.join(str(getattr(obj, attr)) for obj in related.all())
+            else:
+                value = getattr(related, attr)
+        else:
+            value = getattr(instance, field.source)
+        if value is not None and get_converter(field, 'to_es') is not None:
+            value = field.to_es(value)
+        document[doc_key] = value
+    document[indexer.model_pk_name] = instance.pk
+    return document
+
+
+class DocumentPlanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(DocumentPlanTestCase, self).setUp()
+        populate(3, tags_per_article=2)
+        self.articles = list(Article.objects.order_by('pk'))
+
+    def tearDown(self):
+        delete_rows()
+        super(DocumentPlanTestCase, self).tearDown()
+
+    def test__same_documents(self):
+        indexer = ArticleIndexer()
+        expected = [make_reference_document(indexer, article) for article in self.articles]
+        self.assertEqual([indexer._make_document(article) for article in self.articles], expected)
+        self.assertEqual(indexer._make_documents(self.articles), expected)
+
+
+class RelatedPathsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(RelatedPathsTestCase, self).setUp()
+        populate(5, tags_per_article=2)
+
+    def tearDown(self):
+        delete_rows()
+        super(RelatedPathsTestCase, self).tearDown()
+
+    def count_queries(self, indexer):
+        """builds the documents of every row of the indexer's queryset
+        """
+        with CaptureQueriesContext(connection) as queries:
+            indexer._make_documents(list(indexer.get_queryset()))
+        return len(queries)
+
+    def test__foreign_keys(self):
+        # the foreign keys are joined into the query
+        select, prefetch = AuthorArticleIndexer()._get_related_paths()
+        self.assertEqual((sorted(select), prefetch), (['author', 'category'], []))
+        self.assertEqual(self.count_queries(AuthorArticleIndexer()), 1)
+
+    def test__many_to_many(self):
+        # one more query prefetches the tags of all rows
+        select, prefetch = ArticleIndexer()._get_related_paths()
+        self.assertEqual((sorted(select), prefetch), (['author', 'category', 'publisher'], ['tags']))
+        self.assertEqual(self.count_queries(ArticleIndexer()), 2)
+
+    def test__without_related_paths(self):
+        # every row costs a query per relationship otherwise
+        indexer = ArticleIndexer()
+        with CaptureQueriesContext(connection) as queries:
+            indexer._make_documents(list(Article.objects.all()))
+        self.assertEqual(len(queries), 1 + 5 * 4)
@@ -0,0 +1,89 @@
+import unittest
+
+from django.test.utils import override_settings
+
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.models import Article
+from benchmarks.transport import make_client
+from djelastic import indexers, instrumentation
+from djelastic.connections import connections
+from djelastic.instrumentation import (PHASE_BULK_CHUNK, PHASE_DOCUMENT, PHASE_INDEX, PHASE_SEARCH, is_enabled,
+                                       operation_timed)
+from djelastic.searchers import ModelSearcher
+
+
+def make_article(pk):
+    return Article(pk=pk, title='article {}'.format(pk), body='body', word_count=10, rating=1.0)
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+        self.es = make_client()
+        connections.add_connection('default', self.es)
+        self.records = []
+
+    def tearDown(self):
+        operation_timed.disconnect(self.receive)
+        connections.reset()
+        super(InstrumentationTestCase, self).tearDown()
+
+    def receive(self, sender, phase, duration, info, **kwargs):
+        self.records.append((sender, phase, info))
+
+    def get_records(self, phase):
+        return [(sender, info) for sender, record_phase, info in self.records if record_phase == phase]
+
+    def test__index_payloads(self):
+        operation_timed.connect(self.receive)
+        PlainArticleIndexer(make_article(1)).index()
+
+        (sender, info), = self.get_records(PHASE_DOCUMENT)
+        self.assertEqual((sender, info), (PlainArticleIndexer, {'count': 1}))
+        (sender, info), = self.get_records(PHASE_INDEX)
+        self.assertEqual((sender, info), (PlainArticleIndexer, {'op': 'index', 'doc_type': 'benchmarks.plainarticle',
+                                                                'id': 1}))
+
+    def test__bulk_payloads(self):
+        operation_timed.connect(self.receive)
+        PlainArticleIndexer().bulk_index([make_article(pk) for pk in range(1, 6)], chunk_size=2)
+
+        # one document record per batch, one chunk record per request
+        self.assertEqual([info['count'] for _, info in self.get_records(PHASE_DOCUMENT)], [2, 2, 1])
+        chunks = [info for _, info in self.get_records(PHASE_BULK_CHUNK)]
+        self.assertEqual([(info['actions'], info['failed']) for info in chunks], [(2, 0), (2, 0), (1, 0)])
+        self.assertTrue(all(info['bytes'] > 0 for info in chunks))
+
+    def test__search_payloads(self):
+        operation_timed.connect(self.receive)
+        ModelSearcher(PlainArticleIndexer()).search('query', filters={'status': 'published'}, hydrate=False)
+        (sender, info), = self.get_records(PHASE_SEARCH)
+        self.assertEqual(sender, ModelSearcher)
+        self.assertEqual(info, {'index': 'benchmarks', 'doc_type': 'benchmarks.plainarticle', 'query': 'query',
+                                'filters': {'status': 'published'}, 'took': 1})
+
+    def test__disabled(self):
+        self.assertFalse(is_enabled(PHASE_DOCUMENT))
+
+        # documents are not built inside the timing context manager while nobody listens
+        timed = indexers.timed
+        indexers.timed = lambda *args, **kwargs: self.fail('timed while disabled')
+        try:
+            document = PlainArticleIndexer()._make_document(make_article(1))
+        finally:
+            indexers.timed = timed
+        self.assertEqual(document['title'], 'article 1')
+
+    def test__slow_log(self):
+        with override_settings(ES_SLOW_LOG={PHASE_DOCUMENT: 0.0}):
+            self.assertTrue(is_enabled(PHASE_DOCUMENT))
+            self.assertFalse(is_enabled(PHASE_INDEX))
+            with self.assertLogs('djelastic.slow', 'WARNING') as logs:
+                PlainArticleIndexer()._make_document(make_article(1))
+            self.assertEqual(len(logs.output), 1)
+            self.assertIn('slow document', logs.output[0])
+
+        # the thresholds are read again once the setting changes
+        self.assertFalse(is_enabled(PHASE_DOCUMENT))
+        self.assertEqual(instrumentation._slow_log, {'config': None})
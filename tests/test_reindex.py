@@ -0,0 +1,587 @@
+import io
+import json
+import os
+import queue
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from importlib import import_module
+
+from django.core.management import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmarks.environment import populate
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.models import Article, Author, Category, Publisher, Tag
+from benchmarks.transport import make_client
+from djelastic import fields, reindex as reindex_module
+from djelastic.aliases import create_versioned_index, get_alias_indices, get_rebuild_alias
+from djelastic.connections import connections
+from djelastic.errors import ConfigurationError, RebuildError, ReindexError
+from djelastic.indexers import ModelIndexer
+from djelastic.reindex import (CheckpointStore, _iter_deleted_pks, get_indexer_label, parallel_reindex,
+                               partition_pks, rebuild, reindex, sync)
+
+
+class RebuildIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+
+    class Meta:
+        model = Article
+        index = 'tests_rebuild'
+        doc_type = 'tests.rebuild'
+        versioned = True
+
+
+def read_body(body):
+    return json.loads(body.decode('utf-8')) if body else {}
+
+
+def install_aliases(server):
+    """makes a fake server keep track of physical indices and their aliases
+
+    :return: {index name: set of aliases}
+    """
+    handle, indices = server.handle, {}
+
+    def handle_aliases(method, url, params=None, body=None):
+        parts = [part for part in url.split('/') if part]
+        if method == 'HEAD' and len(parts) == 1:
+            exists = any(parts[0] == name or parts[0] in aliases for name, aliases in indices.items())
+            return (200 if exists else 404), None
+        if method == 'PUT' and len(parts) == 1:
+            server.requests.append((method, url, params, body))
+            indices[parts[0]] = set(read_body(body).get('aliases', ()))
+            return 200, {'acknowledged': True}
+        if method == 'DELETE' and len(parts) == 1:
+            server.requests.append((method, url, params, body))
+            for name in parts[0].split(','):
+                indices.pop(name, None)
+            return 200, {'acknowledged': True}
+        if method == 'GET' and parts[0] == '_alias':
+            res = dict((name, {'aliases': {parts[1]: {}}}) for name, aliases in indices.items() if parts[1] in aliases)
+            return (200, res) if res else (404, {'error': 'missing'})
+        if method == 'GET' and parts[-1] == '_settings':
+            return 200, {parts[0]: {'settings': {'index': {'number_of_replicas': '2', 'refresh_interval': '30s'}}}}
+        if parts == ['_aliases']:
+            server.requests.append((method, url, params, body))
+            for action in read_body(body)['actions']:
+                (kind, info), = action.items()
+                aliases = indices.setdefault(info['index'], set())
+                if kind == 'add':
+                    aliases.add(info['alias'])
+                else:
+                    aliases.discard(info['alias'])
+            return 200, {'acknowledged': True}
+        return handle(method, url, params, body)
+    server.handle = handle_aliases
+    return indices
+
+
+def run_command(name, *args, **options):
+    """runs a djelastic management command with the defaults of its options -- djelastic is not an installed app
+    of the test project, so `call_command` does not find its commands
+    """
+    command = import_module('djelastic.management.commands.{}'.format(name)).Command()
+    defaults = dict((option.dest, option.default) for option in command.option_list if option.dest)
+    defaults.update(options, skip_checks=True)
+    return command.execute(*args, **defaults)
+
+
+# the commands declare optparse options, which django 1.10+ does not support
+skip_without_option_list = unittest.skipIf(not hasattr(BaseCommand, 'option_list'), 'optparse commands')
+
+
+def delete_rows():
+    for model in (Article, Tag, Category, Publisher, Author):
+        model.objects.all().delete()
+
+
+class ReindexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ReindexTestCase, self).setUp()
+        populate(5, tags_per_article=1)
+        self.pks = list(Article.objects.order_by('pk').values_list('pk', flat=True))
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoints = CheckpointStore(os.path.join(self.tmp_dir, 'state.json'))
+        self.label = get_indexer_label(PlainArticleIndexer)
+
+    def tearDown(self):
+        connections.reset()
+        shutil.rmtree(self.tmp_dir)
+        delete_rows()
+        super(ReindexTestCase, self).tearDown()
+
+    def fail_documents(self, pks):
+        """makes the bulk items of the given pks fail with a 503
+        """
+        handle = self.server.handle
+        pks = set(str(pk) for pk in pks)
+
+        def failing(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                for item in res['items']:
+                    info = item['index']
+                    if str(info['_id']) in pks:
+                        info.update(status=503, error='unavailable')
+            return status, res
+        self.server.handle = failing
+
+    def get_indexed_pks(self):
+        pks = []
+        for _, url, _, body in self.server.requests:
+            if url.endswith('_bulk'):
+                lines = [json.loads(line) for line in body.decode('utf-8').split('\n') if line]
+                pks += [int(line['index']['_id']) for line in lines[::2]]
+        return pks
+
+    def test__checkpoint(self):
+        seen = []
+        reindex(PlainArticleIndexer, chunk_size=2, checkpoints=self.checkpoints,
+                progress=lambda *args: seen.append(self.checkpoints.get(self.label)))
+        self.assertEqual(seen, [self.pks[1], self.pks[3], self.pks[4]])
+
+        # a complete run leaves no checkpoint behind
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+    def test__failed_chunk_keeps_checkpoint(self):
+        self.fail_documents([self.pks[2]])
+        res = reindex(PlainArticleIndexer, chunk_size=2, checkpoints=self.checkpoints)
+        self.assertEqual((res['indexed'], res['failed']), (4, 1))
+
+        # the checkpoint stays before the chunk holding the failed row, even though later chunks succeeded
+        self.assertEqual(res['last_pk'], self.pks[1])
+        self.assertEqual(self.checkpoints.get(self.label), self.pks[1])
+
+    def test__resume(self):
+        self.fail_documents([self.pks[2]])
+        reindex(PlainArticleIndexer, chunk_size=2, checkpoints=self.checkpoints)
+
+        del self.server.handle
+        self.server.reset()
+        res = reindex(PlainArticleIndexer, chunk_size=2, checkpoints=self.checkpoints, resume=True)
+        self.assertEqual((res['indexed'], res['failed']), (3, 0))
+        self.assertEqual(self.get_indexed_pks(), self.pks[2:])
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+    def test__fresh_run_drops_old_checkpoint(self):
+        self.checkpoints.set(self.label, self.pks[3])
+        self.fail_documents(self.pks)
+        reindex(PlainArticleIndexer, chunk_size=2, checkpoints=self.checkpoints)
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+
+class InlinePool(object):
+    """stands in for the worker pool of `parallel_reindex`, running the tasks in the test process -- the in-memory
+    test database is not shared with other processes
+    """
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        # the initializer would drop the fake client, only the progress queue is handed over
+        reindex_module._progress_queue, _ = initargs
+
+    def map_async(self, func, tasks):
+        results = [func(task) for task in tasks]
+        return type('AsyncResult', (), {'ready': lambda self: True, 'get': lambda self: results})()
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def exit_worker(task):
+    """stands in for `_reindex_range` in a real worker process -- the worker dies without a result, like one killed
+    for running out of memory
+    """
+    os._exit(1)
+
+
+class InlineMultiprocessing(object):
+    """stands in for the `multiprocessing` module used by `parallel_reindex`
+    """
+    Pool = InlinePool
+
+    @staticmethod
+    def cpu_count():
+        return 2
+
+    @staticmethod
+    def Manager():
+        return type('Manager', (), {'Queue': lambda self: queue.Queue(), 'list': lambda self: [],
+                                    'shutdown': lambda self: None})()
+
+    @staticmethod
+    def active_children():
+        return []
+
+
+class PartitionTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        delete_rows()
+        super(PartitionTestCase, self).tearDown()
+
+    def get_range_pks(self, ranges):
+        range_pks = []
+        for lower, upper in ranges:
+            queryset = Article.objects.order_by('pk')
+            if lower is not None:
+                queryset = queryset.filter(pk__gt=lower)
+            if upper is not None:
+                queryset = queryset.filter(pk__lte=upper)
+            range_pks.append(list(queryset.values_list('pk', flat=True)))
+        return range_pks
+
+    def test__empty(self):
+        self.assertEqual(partition_pks(Article.objects.all(), 4), [(None, None)])
+
+    def test__single_pk(self):
+        populate(1, tags_per_article=1)
+        self.assertEqual(partition_pks(Article.objects.all(), 4), [(None, None)])
+
+    def test__gaps(self):
+        populate(8, tags_per_article=1)
+        pks = list(Article.objects.order_by('pk').values_list('pk', flat=True))
+        Article.objects.filter(pk__in=pks[1:4]).delete()
+        pks = pks[:1] + pks[4:]
+
+        # every row falls into exactly one range, the ranges hold about the same number of rows
+        ranges = partition_pks(Article.objects.all(), 2)
+        self.assertEqual(ranges, [(None, pks[1]), (pks[1], None)])
+        self.assertEqual(self.get_range_pks(ranges), [pks[:2], pks[2:]])
+
+        # no more ranges than rows
+        ranges = partition_pks(Article.objects.all(), 10)
+        self.assertEqual(self.get_range_pks(ranges), [[pk] for pk in pks])
+
+
+class ParallelReindexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ParallelReindexTestCase, self).setUp()
+        populate(6, tags_per_article=1)
+        self.pks = list(Article.objects.order_by('pk').values_list('pk', flat=True))
+        self.es = make_client()
+        connections.add_connection('default', self.es)
+        self.multiprocessing = reindex_module.multiprocessing
+        reindex_module.multiprocessing = InlineMultiprocessing
+
+    def tearDown(self):
+        reindex_module.multiprocessing = self.multiprocessing
+        reindex_module._progress_queue = None
+        connections.reset()
+        delete_rows()
+        super(ParallelReindexTestCase, self).tearDown()
+
+    def crash_range(self, first_pk):
+        """makes the worker of the range starting at `first_pk` crash after reporting its first row as indexed
+        """
+        reindex = reindex_module.reindex
+
+        def crashing(indexer_class, queryset=None, progress=None, **kwargs):
+            if queryset.order_by('pk').values_list('pk', flat=True)[0] == first_pk:
+                progress(1, 0, queryset.count(), 0.0)
+                raise RuntimeError('worker crashed')
+            return reindex(indexer_class, queryset=queryset, progress=progress, **kwargs)
+        reindex_module.reindex = crashing
+        self.addCleanup(setattr, reindex_module, 'reindex', reindex)
+
+    def test__dead_worker(self):
+        # real worker processes -- the range of the dead worker is never reported, the run must not wait for it
+        reindex_module.multiprocessing = self.multiprocessing
+        reindex_range = reindex_module._reindex_range
+        reindex_module._reindex_range = exit_worker
+        self.addCleanup(setattr, reindex_module, '_reindex_range', reindex_range)
+
+        with self.assertRaisesRegex(ReindexError, 'died'):
+            parallel_reindex(PlainArticleIndexer, workers=2, partitions=2)
+
+    def test__results_added_up(self):
+        seen = []
+        res = parallel_reindex(PlainArticleIndexer, workers=2, partitions=3, chunk_size=1,
+                               progress=lambda *args: seen.append(args[:3]))
+        self.assertEqual((res['indexed'], res['failed'], res['errors']), (6, 0, []))
+        self.assertEqual(seen[-1], (6, 0, 6))
+
+    def test__crashed_worker(self):
+        self.crash_range(self.pks[2])
+        seen = []
+        res = parallel_reindex(PlainArticleIndexer, workers=2, partitions=3, chunk_size=1,
+                               progress=lambda *args: seen.append(args[:3]))
+
+        # the rows of the crashed range not reported as indexed count as failed
+        self.assertEqual((res['indexed'], res['failed']), (5, 1))
+        self.assertEqual(res['errors'], [{'range': (self.pks[1], self.pks[3]), 'error': 'worker crashed'}])
+        self.assertEqual(seen[-1], (5, 1, 6))
+
+
+class RebuildTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(RebuildTestCase, self).setUp()
+        self.overrides = override_settings(ES_REBUILD_CHECK_INTERVAL=0)
+        self.overrides.enable()
+        populate(3, tags_per_article=1)
+        self.es = make_client()
+        self.server = self.es.transport.server
+        self.indices = install_aliases(self.server)
+        connections.add_connection('default', self.es)
+
+    def tearDown(self):
+        connections.reset()
+        delete_rows()
+        self.overrides.disable()
+        super(RebuildTestCase, self).tearDown()
+
+    def get_bulk_actions(self):
+        actions = []
+        for _, url, _, body in self.server.requests:
+            if url.endswith('_bulk'):
+                actions += [json.loads(line) for line in body.decode('utf-8').split('\n') if line][::2]
+        return actions
+
+    def test__rebuild(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+        res = rebuild('tests_rebuild', indexer_classes=[RebuildIndexer])
+        name = res['index']
+        self.assertEqual((res['indexed'], res['failed'], res['old_indices']), (3, 0, ['tests_rebuild_old']))
+
+        # every row is created in the new index only
+        actions = self.get_bulk_actions()
+        self.assertEqual(len(actions), 3)
+        self.assertTrue(all(list(action) == ['create'] and action['create']['_index'] == name for action in actions))
+
+        # the alias moved in one request, the rebuild alias is gone and so is the old index
+        self.assertEqual(get_alias_indices(self.es, 'tests_rebuild'), [name])
+        self.assertEqual(get_alias_indices(self.es, get_rebuild_alias('tests_rebuild')), [])
+        self.assertEqual(list(self.indices), [name])
+        (_, _, _, body), = [request for request in self.server.requests if request[1] == '/_aliases']
+        self.assertEqual(read_body(body)['actions'], [
+            {'remove': {'index': 'tests_rebuild_old', 'alias': 'tests_rebuild'}},
+            {'add': {'index': name, 'alias': 'tests_rebuild'}},
+            {'remove': {'index': name, 'alias': get_rebuild_alias('tests_rebuild')}},
+        ])
+
+    def fail_first_copy(self, status, error):
+        """makes the first item of every bulk request fail
+        """
+        handle = self.server.handle
+
+        def failing(method, url, params=None, body=None):
+            code, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                res['items'][0]['create'].update(status=status, error=error)
+            return code, res
+        self.server.handle = failing
+
+    def test__live_writes_win(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+
+        # the first row got written by a live write while the copy was running
+        self.fail_first_copy(409, 'DocumentAlreadyExistsException')
+        res = rebuild('tests_rebuild', indexer_classes=[RebuildIndexer])
+        self.assertEqual((res['indexed'], res['failed']), (3, 0))
+
+    def test__deleted_during_copy(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+        pks = list(Article.objects.order_by('pk').values_list('pk', flat=True))
+        handle, copied = self.server.handle, []
+
+        def copying(method, url, params=None, body=None):
+            if url.endswith('_bulk') and not copied:
+                # the first row is deleted after the copy read it -- its live delete found nothing to delete
+                Article.objects.filter(pk=pks[0]).delete()
+                copied.extend(pks)
+            if url.endswith('_search') or url.endswith('/scroll'):
+                self.server.requests.append((method, url, params, body))
+                hits = [{'_id': str(pk)} for pk in copied] if url.endswith('_search') else []
+                return 200, {'_scroll_id': 'scroll', 'hits': {'total': len(copied), 'hits': hits}}
+            return handle(method, url, params, body)
+        self.server.handle = copying
+
+        res = rebuild('tests_rebuild', indexer_classes=[RebuildIndexer])
+        self.assertEqual((res['indexed'], res['deleted'], res['failed']), (3, 1, 0))
+
+        # the copied document of the deleted row is gone from the new index before the swap
+        deletes = [action['delete'] for action in self.get_bulk_actions() if 'delete' in action]
+        self.assertEqual([(delete['_index'], delete['_id']) for delete in deletes], [(res['index'], pks[0])])
+        self.assertEqual(get_alias_indices(self.es, 'tests_rebuild'), [res['index']])
+
+    def test__failed_copy(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+        self.fail_first_copy(503, 'unavailable')
+        with self.assertRaises(RebuildError) as context:
+            rebuild('tests_rebuild', indexer_classes=[RebuildIndexer])
+        self.assertEqual((context.exception.result['indexed'], context.exception.result['failed']), (2, 1))
+
+        # the alias still points at the complete old index, the partial new one is gone
+        self.assertEqual(get_alias_indices(self.es, 'tests_rebuild'), ['tests_rebuild_old'])
+        self.assertEqual(list(self.indices), ['tests_rebuild_old'])
+
+    def test__failed_copy_forced(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+        self.fail_first_copy(503, 'unavailable')
+        res = rebuild('tests_rebuild', indexer_classes=[RebuildIndexer], force=True)
+        self.assertEqual(res['failed'], 1)
+        self.assertEqual(get_alias_indices(self.es, 'tests_rebuild'), [res['index']])
+
+    def test__dual_write(self):
+        create_versioned_index(self.es, 'tests_rebuild', name='tests_rebuild_old')
+        create_versioned_index(self.es, get_rebuild_alias('tests_rebuild'), name='tests_rebuild_new')
+        self.server.reset()
+
+        article = Article.objects.all()[0]
+        RebuildIndexer(article).index()
+        self.assertEqual([url for _, url, _, _ in self.server.requests], [
+            '/tests_rebuild/tests.rebuild/{}'.format(article.pk),
+            '/tests_rebuild_new/tests.rebuild/{}'.format(article.pk),
+        ])
+
+        self.server.reset()
+        RebuildIndexer().bulk_index([article])
+        self.assertEqual([action['index']['_index'] for action in self.get_bulk_actions()],
+                         ['tests_rebuild', 'tests_rebuild_new'])
+
+    def test__unversioned_index(self):
+        self.indices['tests_rebuild'] = set()
+        with self.assertRaises(ConfigurationError):
+            rebuild('tests_rebuild', indexer_classes=[RebuildIndexer])
+
+    @skip_without_option_list
+    def test__unversioned_index_command(self):
+        self.indices['tests_rebuild'] = set()
+        with self.assertRaisesRegex(CommandError, 'is an index, not an alias'):
+            run_command('es_reindex', get_indexer_label(RebuildIndexer), rebuild=True, stdout=io.StringIO())
+
+
+class SyncIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+
+    class Meta:
+        model = Article
+        doc_type = 'tests.sync'
+        updated_field = 'modified'
+
+
+class SyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SyncTestCase, self).setUp()
+        populate(5, tags_per_article=1)
+        self.pks = list(Article.objects.order_by('pk').values_list('pk', flat=True))
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoints = CheckpointStore(os.path.join(self.tmp_dir, 'state.json'))
+        self.key = '{}:watermark'.format(get_indexer_label(SyncIndexer))
+        self.overrides = override_settings(ES_SYNC_OVERLAP=0)
+        self.overrides.enable()
+
+    def tearDown(self):
+        self.overrides.disable()
+        connections.reset()
+        shutil.rmtree(self.tmp_dir)
+        delete_rows()
+        super(SyncTestCase, self).tearDown()
+
+    def serve_documents(self, doc_ids):
+        """makes searches scroll through documents with the given ids, in order
+        """
+        handle, batches = self.server.handle, []
+
+        def scrolling(method, url, params=None, body=None):
+            if url.endswith('_search') or url.endswith('/scroll'):
+                self.server.requests.append((method, url, params, body))
+                if url.endswith('_search'):
+                    size = int(params['size'])
+                    batches[:] = [doc_ids[i:i + size] for i in range(0, len(doc_ids), size)]
+                hits = [{'_id': str(doc_id)} for doc_id in (batches.pop(0) if batches else [])]
+                return 200, {'_scroll_id': 'scroll', 'hits': {'total': len(doc_ids), 'hits': hits}}
+            return handle(method, url, params, body)
+        self.server.handle = scrolling
+
+    def set_modified(self, pk, hours):
+        modified = Article.objects.get(pk=pk).modified + timedelta(hours=hours)
+        Article.objects.filter(pk=pk).update(modified=modified)
+        return modified
+
+    def test__iter_deleted_pks(self):
+        Article.objects.filter(pk__in=[self.pks[1], self.pks[4]]).delete()
+        missing = self.pks[-1] + 10
+        self.serve_documents(self.pks + [missing])
+        indexer = SyncIndexer()
+
+        for chunk_size in (1, 2, 10):
+            deleted = list(_iter_deleted_pks(indexer, Article.objects.all(), chunk_size))
+            self.assertEqual(deleted, [self.pks[1], self.pks[4], missing])
+
+    def test__iter_deleted_pks_empty_index(self):
+        self.serve_documents([])
+        self.assertEqual(list(_iter_deleted_pks(SyncIndexer(), Article.objects.all(), 2)), [])
+
+    def test__delete(self):
+        Article.objects.filter(pk=self.pks[0]).delete()
+        self.serve_documents(self.pks)
+        res = sync(SyncIndexer, self.checkpoints, chunk_size=2)
+        self.assertEqual((res['indexed'], res['deleted']), (4, 1))
+
+    def test__watermark(self):
+        latest = self.set_modified(self.pks[0], 1)
+        res = sync(SyncIndexer, self.checkpoints, delete=False)
+        self.assertEqual((res['indexed'], res['watermark']), (5, latest))
+        self.assertEqual(self.checkpoints.get(self.key), latest.isoformat())
+
+        # only rows changed at or after the watermark are synced again
+        res = sync(SyncIndexer, self.checkpoints, delete=False)
+        self.assertEqual(res['indexed'], 1)
+        self.assertEqual(sync(SyncIndexer, self.checkpoints, delete=False, full=True)['indexed'], 5)
+
+        # the overlap covers transactions committing late
+        with override_settings(ES_SYNC_OVERLAP=2 * 3600):
+            self.assertEqual(sync(SyncIndexer, self.checkpoints, delete=False)['indexed'], 5)
+
+    def test__watermark_kept_on_failure(self):
+        latest = self.set_modified(self.pks[0], 1)
+        sync(SyncIndexer, self.checkpoints, delete=False)
+        self.set_modified(self.pks[1], 2)
+
+        handle = self.server.handle
+
+        def failing(method, url, params=None, body=None):
+            status, res = handle(method, url, params, body)
+            if url.endswith('_bulk'):
+                res['items'][0]['index'].update(status=503, error='unavailable')
+            return status, res
+        self.server.handle = failing
+
+        res = sync(SyncIndexer, self.checkpoints, delete=False)
+        self.assertEqual(res['failed'], 1)
+        self.assertEqual(self.checkpoints.get(self.key), latest.isoformat())
+
+    @skip_without_option_list
+    def test__command(self):
+        out = io.StringIO()
+        run_command('es_sync', get_indexer_label(SyncIndexer), state_file=self.checkpoints.path, delete=False,
+                    stdout=out)
+        self.assertIn('5 indexed', out.getvalue())
+        self.assertIsNotNone(self.checkpoints.get(self.key))
+
+    def test__no_updated_field(self):
+        with self.assertRaises(ConfigurationError):
+            sync(PlainArticleIndexer, self.checkpoints)
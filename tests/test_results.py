@@ -0,0 +1,54 @@
+import pickle
+import unittest
+from datetime import datetime, timezone
+
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.models import Article
+from djelastic import fields
+from djelastic.errors import ConfigurationError
+from djelastic.indexers import ModelIndexer
+from djelastic.results import RawSourceResult, get_result_class, make_source_results
+
+
+class ReservedIndexer(ModelIndexer):
+    __slots__ = ()
+
+    title = fields.StringField('title')
+    _score = fields.FloatField('rating')
+
+    class Meta:
+        model = Article
+        doc_type = 'tests.reserved'
+
+
+def make_hit(doc_type, doc_id, source):
+    return {'_index': 'benchmarks', '_type': doc_type, '_id': str(doc_id), '_score': 1.5, '_source': source}
+
+
+class SourceResultTestCase(unittest.TestCase):
+
+    def test__conversion(self):
+        hits = [
+            make_hit(PlainArticleIndexer.doc_type_name, 1, {'id': 1, 'title': 'first', 'word_count': '10',
+                                                            'published': '2015-01-02T03:04:05Z'}),
+            make_hit('unknown', 2, {'title': 'raw'}),
+            make_hit(PlainArticleIndexer.doc_type_name, 3, {'id': 3, 'title': 'third'}),
+        ]
+        first, raw, third = make_source_results(hits, {PlainArticleIndexer.doc_type_name: PlainArticleIndexer})
+        self.assertIsInstance(first, get_result_class(PlainArticleIndexer))
+        self.assertEqual((first._id, first._score, first.title, first.word_count), ('1', 1.5, 'first', 10))
+        self.assertEqual(first.published, datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual((third.id, third.rating), (3, None))
+        self.assertIsInstance(raw, RawSourceResult)
+        self.assertEqual(raw._source, {'title': 'raw'})
+
+    def test__pickle(self):
+        hit = make_hit(PlainArticleIndexer.doc_type_name, 1, {'id': 1, 'title': 'first'})
+        result, = make_source_results([hit], {PlainArticleIndexer.doc_type_name: PlainArticleIndexer})
+        restored = pickle.loads(pickle.dumps(result))
+        self.assertIs(type(restored), type(result))
+        self.assertEqual((restored._id, restored.title), ('1', 'first'))
+
+    def test__reserved_field_names(self):
+        with self.assertRaises(ConfigurationError):
+            get_result_class(ReservedIndexer)
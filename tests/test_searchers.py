@@ -0,0 +1,238 @@
+import json
+import unittest
+
+from benchmarks.indexers import PlainArticleIndexer
+from benchmarks.transport import make_client
+from djelastic.connections import connections
+from djelastic.errors import SearchError
+from djelastic.searchers import HYDRATION_FILTER_PATH, BasicSearcher, ModelSearcher, search_many
+
+
+def read_body(body):
+    return json.loads(body.decode('utf-8')) if body else {}
+
+
+def make_hit(pk, doc_type='benchmarks.plainarticle'):
+    return {'_index': 'benchmarks', '_type': doc_type, '_id': str(pk), '_score': 1.0,
+            '_source': {'title': 'article {}'.format(pk)}}
+
+
+class ModelSearcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(ModelSearcherTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.searcher = ModelSearcher(PlainArticleIndexer())
+
+    def tearDown(self):
+        connections.reset()
+        super(ModelSearcherTestCase, self).tearDown()
+
+    def serve_pages(self, pages):
+        """makes the search and the scrolls after it answer with one page of hits each, then with empty pages --
+        the scroll context is gone by the time it is cleared
+        """
+        handle, pages = self.server.handle, list(pages)
+
+        def scrolling(method, url, params=None, body=None):
+            if method == 'DELETE':
+                self.server.requests.append((method, url, params, body))
+                return 404, {'error': 'missing'}
+            if url.endswith('_search') or url == '/_search/scroll':
+                self.server.requests.append((method, url, params, body))
+                hits = pages.pop(0) if pages else []
+                return 200, {'_scroll_id': 'scroll', 'hits': {'total': 0, 'hits': hits}}
+            return handle(method, url, params, body)
+        self.server.handle = scrolling
+
+    def get_urls(self, method=None):
+        return [url for request_method, url, _, _ in self.server.requests if method in (None, request_method)]
+
+    def test__iter_search(self):
+        self.serve_pages([[make_hit(1), make_hit(2)], [make_hit(3)]])
+        results = list(self.searcher.iter_search('query', batch_size=2, hydrate=False))
+        self.assertEqual([result._id for result in results], ['1', '2', '3'])
+        self.assertEqual([result.title for result in results], ['article 1', 'article 2', 'article 3'])
+
+        # the scroll stops at the first empty page and is cleared
+        self.assertEqual(self.get_urls(), [
+            '/benchmarks/benchmarks.plainarticle/_search', '/_search/scroll', '/_search/scroll',
+            '/_search/scroll/scroll',
+        ])
+        _, _, params, _ = self.server.requests[0]
+        self.assertEqual(params['size'], '2')
+        self.assertIn('scroll', params)
+
+    def test__iter_search_closed_early(self):
+        self.serve_pages([[make_hit(1), make_hit(2)], [make_hit(3)]])
+        results = self.searcher.iter_search('query', batch_size=2, hydrate=False)
+        self.assertEqual(next(results)._id, '1')
+        results.close()
+
+        # the scroll context is released without fetching further pages, a missing one is ignored
+        self.assertEqual(self.get_urls(), ['/benchmarks/benchmarks.plainarticle/_search', '/_search/scroll/scroll'])
+        self.assertEqual(self.get_urls('DELETE'), ['/_search/scroll/scroll'])
+
+    def test__iter_search_no_hits(self):
+        self.serve_pages([])
+        self.assertEqual(list(self.searcher.iter_search('query', hydrate=False)), [])
+        self.assertEqual(self.get_urls('DELETE'), ['/_search/scroll/scroll'])
+
+    def test__page(self):
+        self.server.hits = [make_hit(pk) for pk in range(1, 6)]
+        page = self.searcher.page('query', page=3, per_page=2, hydrate=False)
+        self.assertEqual((page.total, page.number, page.per_page, page.num_pages), (5, 3, 2, 3))
+        self.assertEqual((page.has_previous, page.has_next), (True, False))
+
+        _, _, _, body = self.server.requests[-1]
+        self.assertEqual((read_body(body)['from'], read_body(body)['size']), (4, 2))
+
+        # pages before the first one are the first one
+        page = self.searcher.page('query', page=0, per_page=2, hydrate=False)
+        self.assertEqual((page.number, page.has_previous, page.has_next), (1, False, True))
+        _, _, _, body = self.server.requests[-1]
+        self.assertEqual(read_body(body)['from'], 0)
+
+    def test__page_size(self):
+        for per_page in (0, -1):
+            with self.assertRaises(ValueError):
+                self.searcher.page('query', per_page=per_page, hydrate=False)
+
+
+class HydrationPayloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(HydrationPayloadTestCase, self).setUp()
+        self.es = make_client()
+        self.server = self.es.transport.server
+        connections.add_connection('default', self.es)
+        self.searcher = ModelSearcher(PlainArticleIndexer())
+
+    def tearDown(self):
+        connections.reset()
+        super(HydrationPayloadTestCase, self).tearDown()
+
+    def get_search(self):
+        (_, _, params, body), = [request for request in self.server.requests if request[1].endswith('_search')]
+        self.server.reset()
+        return params or {}, read_body(body)
+
+    def assert_hydration_payload(self):
+        params, body = self.get_search()
+        self.assertEqual(params.get('filter_path'), HYDRATION_FILTER_PATH)
+        self.assertIs(body['_source'], False)
+
+    def test__hydrated(self):
+        # hydrated searches only ask for the ids, doc types and scores of the hits
+        self.searcher.search('query')
+        self.assert_hydration_payload()
+        self.searcher.page('query')
+        self.assert_hydration_payload()
+        list(self.searcher.iter_search('query'))
+        self.assert_hydration_payload()
+        BasicSearcher().search('query')
+        self.assert_hydration_payload()
+
+    def test__not_hydrated(self):
+        # results built from the source need all of it
+        self.searcher.search('query', hydrate=False)
+        params, body = self.get_search()
+        self.assertNotIn('filter_path', params)
+        self.assertNotIn('_source', body)
+
+
+def get_query(search):
+    """finds the query terms of a search body, filtered or not
+    """
+    if isinstance(search, dict):
+        if '_all' in search:
+            return search['_all']
+        search = list(search.values())
+    if isinstance(search, list):
+        for value in search:
+            query = get_query(value)
+            if query is not None:
+                return query
+    return None
+
+
+def answer_by_query(server, errors=()):
+    """makes a fake server answer every search of a multi search with one hit named after its query
+
+    :param errors: the queries answered with an error
+    """
+    handle = server.handle
+
+    def answering(method, url, params=None, body=None):
+        if not url.endswith('_msearch'):
+            return handle(method, url, params, body)
+        server.requests.append((method, url, params, body))
+        lines = [json.loads(line) for line in body.decode('utf-8').split('\n') if line]
+        responses = []
+        for header, search in zip(lines[::2], lines[1::2]):
+            query = get_query(search)
+            if query in errors:
+                responses.append({'error': 'failed'})
+            else:
+                responses.append({'hits': {'total': 1, 'hits': [make_hit(query)]}})
+        return 200, {'responses': responses}
+    server.handle = answering
+
+
+class SearchManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(SearchManyTestCase, self).setUp()
+        self.es = make_client()
+        self.other_es = make_client()
+        answer_by_query(self.es.transport.server)
+        answer_by_query(self.other_es.transport.server, errors=['broken'])
+        connections.add_connection('default', self.es)
+        self.indexer = PlainArticleIndexer()
+
+    def tearDown(self):
+        connections.reset()
+        super(SearchManyTestCase, self).tearDown()
+
+    def get_msearch_bodies(self, es):
+        return [[json.loads(line) for line in body.decode('utf-8').split('\n') if line]
+                for _, url, _, body in es.transport.server.requests if url.endswith('_msearch')]
+
+    def test__grouped_per_client(self):
+        searches = [
+            (ModelSearcher(self.indexer), 'a'),
+            (ModelSearcher(self.indexer, es=self.other_es), 'b', {'status': 'published'}),
+            (BasicSearcher(), 'c'),
+            (ModelSearcher(self.indexer, es=self.other_es), 'd'),
+        ]
+        results = search_many(searches, hydrate=False)
+
+        # the results follow the order of the searches, whichever client answered them
+        self.assertEqual([[result._id for result in hits] for hits in results], [['a'], ['b'], ['c'], ['d']])
+
+        # one multi search per client, holding its searches in order
+        bodies = self.get_msearch_bodies(self.es)
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(bodies[0][0], {'index': self.indexer.index_name, 'type': self.indexer.doc_type_name})
+        self.assertEqual(bodies[0][2], {'index': 'benchmarks'})
+        self.assertEqual([get_query(search) for search in bodies[0][1::2]], ['a', 'c'])
+        bodies = self.get_msearch_bodies(self.other_es)
+        self.assertEqual([get_query(search) for search in bodies[0][1::2]], ['b', 'd'])
+        self.assertEqual(len(bodies), 1)
+
+    def test__hydrated(self):
+        # the hit has no row
+        self.assertEqual(search_many([(ModelSearcher(self.indexer), '0')]), [[]])
+
+        # hydrated searches only ask for what hydration needs
+        (_, _, params, _), = self.es.transport.server.requests
+        self.assertIn('responses.hits.hits._id', params['filter_path'])
+        self.assertIn('responses.error', params['filter_path'])
+        self.assertFalse(self.get_msearch_bodies(self.es)[0][1]['_source'])
+
+    def test__error(self):
+        searches = [(ModelSearcher(self.indexer), 'a'), (ModelSearcher(self.indexer, es=self.other_es), 'broken')]
+        with self.assertRaisesRegex(SearchError, 'Search 1 failed'):
+            search_many(searches, hydrate=False)
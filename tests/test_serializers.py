@@ -0,0 +1,54 @@
+import json
+import unittest
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from uuid import UUID
+
+from elasticsearch.exceptions import SerializationError
+
+from djelastic.serializers import FastJSONSerializer, get_serializer
+
+
+class FastJSONSerializerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(FastJSONSerializerTestCase, self).setUp()
+        self.serializer = FastJSONSerializer()
+
+    def test__compact(self):
+        self.assertEqual(self.serializer.dumps({'a': [1, 2]}), '{"a":[1,2]}')
+        self.assertEqual(self.serializer.dumps('{"a": 1}'), '{"a": 1}')
+
+    def test__types(self):
+        data = {
+            'price': Decimal('9.99'),
+            'day': date(2015, 1, 2),
+            'published': datetime(2015, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            'at': time(3, 4, 5),
+            'uuid': UUID('12345678123456781234567812345678'),
+        }
+        self.assertEqual(json.loads(self.serializer.dumps(data)), {
+            'price': 9.99,
+            'day': '2015-01-02',
+            'published': '2015-01-02T03:04:05+00:00',
+            'at': '03:04:05',
+            'uuid': '12345678-1234-5678-1234-567812345678',
+        })
+
+    def test__non_ascii(self):
+        # the output is ascii, so its length in characters is its length in bytes
+        dumped = self.serializer.dumps({'title': 'café ☕'})
+        self.assertEqual(dumped, '{"title":"caf\\u00e9 \\u2615"}')
+        self.assertEqual(len(dumped), len(dumped.encode('utf-8')))
+        self.assertEqual(json.loads(dumped), {'title': 'café ☕'})
+
+    def test__unknown_type(self):
+        with self.assertRaises(SerializationError) as context:
+            self.serializer.dumps({'value': object()})
+        self.assertIsInstance(context.exception.args[1], TypeError)
+
+    def test__get_serializer(self):
+        self.assertIsInstance(get_serializer('djelastic.serializers.FastJSONSerializer'), FastJSONSerializer)
+        self.assertIsInstance(get_serializer(FastJSONSerializer), FastJSONSerializer)
+        self.assertIs(get_serializer(self.serializer), self.serializer)
+        self.assertIsNone(get_serializer(None))